@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the constructs and helpers of pySUT
+
+Times (best and median of several runs) and peak memory (tracemalloc, in a
+separate run, with a breakdown by phase, see pysut.instrument) of every
+construct and of the main helpers, on synthetic multiregional SUTs of
+increasing size (see pysut.synthetic). Results are saved as JSON, and can
+be compared with the results of another version, or of the thread mode
+(see pysut.parallel):
+
+    python benchmarks/run_benchmarks.py --scales small medium mrio \\
+        --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+    python benchmarks/run_benchmarks.py --threads 4 --compare results.json
+
+Runs offline, with numpy and scipy only.
+"""
+from __future__ import division, print_function
+import argparse
+import copy
+import datetime
+import json
+import os
+import platform
+import sys
+import tracemalloc
+from timeit import default_timer
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import pysut  # noqa: E402
+from pysut import instrument, parallel  # noqa: E402
+from pysut.synthetic import synthetic_sut  # noqa: E402
+from pysut.pySUT import aggregate_regions_vectorised, matrix_norm  # noqa: E402
+
+# regions, products (= industries) per region, extensions; without
+# exclusive secondary products, so that V is invertible for ctc
+SCALES = {'small': (2, 10, 5),
+          'medium': (5, 40, 20),
+          'mrio': (20, 50, 100)}
+
+
+def cases(sut):
+    """ Benchmarked calls, as name -> function of a fresh SUT """
+    regions = sut.regions
+    AV = np.arange(regions) // 2 + 1
+    Z = sut.U.dot(sut.E_bar.T)
+    F_con = sut.F.dot(sut.E_bar.T)
+    return [
+        ('btc', lambda s: s.btc()),
+        ('ctc', lambda s: s.ctc()),
+        ('itc', lambda s: s.itc()),
+        ('esc', lambda s: s.esc()),
+        ('lsc', lambda s: s.lsc()),
+        ('pc_agg', lambda s: s.pc_agg()),
+        ('psc_agg', lambda s: s.psc_agg()),
+        ('aac_agg', lambda s: s.aac_agg()),
+        ('build_E_bar', lambda s: s.build_E_bar()),
+        ('build_mr_Xi', lambda s: s.build_mr_Xi()),
+        ('build_mr_Gamma', lambda s: s.build_mr_Gamma()),
+        ('aggregate_regions', lambda s: s.aggregate_regions(AV)),
+        ('aggregate_regions_vectorised',
+         lambda s: aggregate_regions_vectorised(s.U, AV=AV)),
+        ('matrix_norm', lambda s: matrix_norm(Z, s.V, F_con))]
+
+
+def measure(function, sut, repeat=5, min_time=0.2):
+    """ Times and peak memory of function(copy of sut)
+
+    Runs at least once and at most repeat times, stopping after min_time
+    seconds. The copy of the SUT is made outside of the measurements.
+    """
+    times = []
+    while len(times) < repeat and sum(times) < min_time or not times:
+        s = copy.deepcopy(sut)
+        start = default_timer()
+        function(s)
+        times.append(default_timer() - start)
+
+    s = copy.deepcopy(sut)
+    tracemalloc.start()
+    try:
+        with instrument.profile(memory=False) as prof:
+            function(s)
+        __, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    phases = dict(('{}.{}'.format(*key), row)
+                  for key, row in prof.summary().items())
+    return {'time_min': min(times), 'time_median': float(np.median(times)),
+            'runs': len(times), 'peak_memory': peak, 'phases': phases}
+
+
+def run(scales=('small', 'medium'), names=None, repeat=5, seed=0,
+        threads=1):
+    """ Run the benchmarks, return results as a JSON-serializable dict
+
+    With threads > 1, in the thread mode with this number of workers.
+    """
+    results = []
+    for scale in scales:
+        regions, products, extensions = SCALES[scale]
+        sut = synthetic_sut(regions, products, extensions=extensions,
+                            seed=seed)
+        for name, function in cases(sut):
+            if names and name not in names:
+                continue
+            entry = {'name': name, 'scale': scale, 'regions': regions,
+                     'products': regions * products,
+                     'extensions': extensions}
+            try:
+                with parallel.threads(threads):
+                    entry.update(measure(function, sut, repeat))
+            except Exception as error:  # record, keep benchmarking the rest
+                entry['error'] = '{}: {}'.format(type(error).__name__, error)
+            results.append(entry)
+            print(format_entry(entry))
+    return {'meta': {'pysut': pysut.__version__,
+                     'python': platform.python_version(),
+                     'numpy': np.__version__,
+                     'scipy': scipy.__version__,
+                     'threads': threads,
+                     'platform': platform.platform(),
+                     'date': datetime.datetime.now().isoformat()},
+            'results': results}
+
+
+def format_entry(entry, reference=None):
+    """ One line of text for a benchmark result """
+    line = '{:<30} {:<7}'.format(entry['name'], entry['scale'])
+    if 'error' in entry:
+        return line + ' ' + entry['error']
+    line += ' {:>10.4f} s {:>10.1f} MiB'.format(entry['time_min'],
+                                                entry['peak_memory'] / 2**20)
+    if reference is not None and 'error' not in reference:
+        line += '   x{:.2f} time, x{:.2f} memory'.format(
+            entry['time_min'] / reference['time_min'],
+            entry['peak_memory'] / max(reference['peak_memory'], 1))
+    return line
+
+
+def compare(results, reference):
+    """ Print results next to their ratio to reference results """
+    ref = dict(((r['name'], r['scale']), r) for r in reference['results'])
+    for entry in results['results']:
+        print(format_entry(entry, ref.get((entry['name'], entry['scale']))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'],
+                        choices=sorted(SCALES))
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=1,
+                        help='number of workers of the thread mode')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='compare with earlier results')
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.only, args.repeat, args.seed,
+                  args.threads)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+        print('\nCompared with {} ({})'.format(args.compare,
+                                               reference['meta']['date']))
+        compare(results, reference)
+
+
+if __name__ == '__main__':
+    main()
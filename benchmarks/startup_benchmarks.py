@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Startup time of pysut and of its command line interface
+
+Each case runs in a fresh interpreter, as in a short-lived batch job, and
+its wall time (including interpreter startup) is measured several times:
+
+    python benchmarks/startup_benchmarks.py --output startup.json
+
+Besides the times, the results record which heavy modules each case
+imports.
+"""
+from __future__ import division, print_function
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+HEAVY = ('numpy', 'scipy.sparse', 'scipy.sparse.linalg', 'tracemalloc')
+
+
+def cases(table):
+    """ name -> python arguments of each case """
+    probe = ('import sys; print(",".join(m for m in {!r} if m in sys.modules))'
+             .format(HEAVY))
+    return [
+        ('python', ['-c', 'pass']),
+        ('import pysut', ['-c', 'import pysut; ' + probe]),
+        ('import SupplyUseTable',
+         ['-c', 'from pysut import SupplyUseTable; ' + probe]),
+        ('cli --help', ['-m', 'pysut', '--help']),
+        ('cli info', ['-m', 'pysut', 'info', table]),
+        ('cli run esc', ['-m', 'pysut', 'run', '-q', table, 'esc', '-o',
+                         os.path.join(os.path.dirname(table), 'esc.npz')]),
+        ('cli run btc footprints',
+         ['-m', 'pysut', 'run', '-q', table, 'btc', 'footprints', '-o',
+          os.path.join(os.path.dirname(table), 'btc.npz')])]
+
+
+def measure(arguments, repeat=10):
+    """ Wall times of python with arguments, and its last output line """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    times = []
+    for __ in range(repeat):
+        start = default_timer()
+        output = subprocess.check_output([sys.executable] + arguments,
+                                         env=env, stderr=subprocess.STDOUT)
+        times.append(default_timer() - start)
+    times.sort()
+    lines = output.decode().strip().splitlines()
+    return {'time_min': times[0], 'time_median': times[len(times) // 2],
+            'runs': repeat, 'output': lines[-1] if lines else ''}
+
+
+def run(repeat=10, regions=2, products=10):
+    directory = tempfile.mkdtemp()
+    table = os.path.join(directory, 'table.npz')
+    sys.path.insert(0, ROOT)
+    from pysut.synthetic import synthetic_sut
+    synthetic_sut(regions, products, seed=0).save(table)
+
+    results = []
+    for name, arguments in cases(table):
+        entry = {'name': name}
+        entry.update(measure(arguments, repeat))
+        if not name.startswith('import'):
+            entry.pop('output')
+        results.append(entry)
+        print('{:<25} {:>8.3f} s  {}'.format(name, entry['time_min'],
+                                             entry.get('output', '')))
+    return {'meta': {'python': platform.python_version(),
+                     'platform': platform.platform(),
+                     'date': datetime.datetime.now().isoformat(),
+                     'table': [regions, products]},
+            'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='save the results to this JSON file')
+    args = parser.parse_args(argv)
+    results = run(args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,24 @@
 """
 This is the pySUT package.
 """
+import sys
 
 __version__ = '1.1'
 
-from .pySUT import SupplyUseTable
+
+def __getattr__(name):
+    """ Import SupplyUseTable on first use
+
+    Importing pysut (e.g. for the command line interface) then does not load
+    numpy and scipy until they are needed.
+    """
+    if name == 'SupplyUseTable':
+        from .pySUT import SupplyUseTable
+        globals()['SupplyUseTable'] = SupplyUseTable
+        return SupplyUseTable
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
+
+
+if sys.version_info < (3, 7):  # no lazy module attributes
+    from .pySUT import SupplyUseTable
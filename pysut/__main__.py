@@ -0,0 +1,8 @@
+"""
+Command line interface: python -m pysut, see pysut.cli
+"""
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Command line interface of pySUT
+
+Runs a list of operations on a table saved with SupplyUseTable.save, and
+writes the results to an npz file:
+
+    pysut info table.npz
+    pysut run table.npz btc footprints -o results.npz
+    pysut run table.npz aggregate=1,1,2 save=aggregated.npz esc footprints
+
+Operations are applied in the given order:
+
+    btc, ctc, itc, esc, lsc, pc_agg, psc_agg, aac_agg
+                     run the construct; its A and S are written as
+                     '<construct>.A' and '<construct>.S' (with --flows, also
+                     Z and F_con)
+    footprints       footprints (by region) of the last construct, written
+                     as '<construct>.footprints'
+    aggregate=AV     aggregate regions (region n into region AV[n], see
+                     SupplyUseTable.transform); E_bar, Xi and Gamma are
+                     rebuilt, PHI and PSI dropped
+    save=PATH        save the table in its current state
+
+Only the modules needed for the requested operations are imported: numpy
+and scipy are loaded with the table, and the sparse solvers only by the
+constructs and footprints that use them.
+
+"""
+
+from __future__ import division, print_function
+import argparse
+import sys
+
+CONSTRUCTS = ('btc', 'ctc', 'itc', 'esc', 'lsc', 'pc_agg', 'psc_agg',
+              'aac_agg')
+
+
+def parse_operation(text):
+    """ (name, argument) of an operation given as 'name' or 'name=argument' """
+    name, __, argument = text.partition('=')
+    if name in CONSTRUCTS or name == 'footprints':
+        if argument:
+            raise ValueError('Error: {} takes no argument.'.format(name))
+    elif name in ('aggregate', 'save'):
+        if not argument:
+            raise ValueError('Error: {} needs an argument, as {}=...'
+                             .format(name, name))
+    else:
+        raise ValueError('Error: unknown operation {}.'.format(name))
+    return name, argument or None
+
+
+def run(sut, operations, flows=False, log=print):
+    """ Apply operations (see parse_operation) to sut, return the results
+
+    Returns
+    -------
+    dict of result name -> array, e.g. 'btc.A'
+
+    """
+    results = {}
+    last = None
+    for name, argument in operations:
+        if name in CONSTRUCTS:
+            result = getattr(sut, name)()
+            A, S = result[0], result[3 if name == 'psc_agg' else 1]
+            results[name + '.A'], results[name + '.S'] = A, S
+            if flows:
+                results[name + '.Z'], results[name + '.F_con'] = \
+                    result[-2], result[-1]
+            last = (name, A, S)
+            log('{}: A {}, S {}'.format(name, A.shape, S.shape))
+        elif name == 'footprints':
+            if last is None:
+                raise ValueError('Error: footprints need a construct first.')
+            D = sut.footprints(last[1], last[2])
+            results[last[0] + '.footprints'] = D
+            log('footprints of {}: {}'.format(last[0], D.shape))
+        elif name == 'aggregate':
+            AV = [int(x) for x in argument.split(',')]
+            mappings = [m for m in ('E_bar', 'Xi', 'Gamma')
+                        if getattr(sut, m) is not None]
+            sut.transform().aggregate_regions(AV).apply()
+            # Mappings do not aggregate: rebuild them from the new tables
+            sut.E_bar = sut.Xi = sut.Gamma = sut.PHI = sut.PSI = None
+            if mappings:
+                sut.build_E_bar()
+            if 'Xi' in mappings:
+                sut.build_mr_Xi()
+            if 'Gamma' in mappings:
+                sut.build_mr_Gamma()
+            last = None
+            log('aggregated into {} regions: V {}'.format(max(AV),
+                                                        sut.V.shape))
+        elif name == 'save':
+            sut.save(argument)
+            log('saved table to {}'.format(argument))
+    return results
+
+
+def info(sut, log=print):
+    """ Print the dimensions and the state of the tables of sut """
+    import numpy as np
+    tables = sut.diagnostics()['tables']
+    for record in tables:
+        log('{:<6} {:>8} x {:<8} nnz {:<10} {}{}{}'.format(
+            record['table'], record['rows'], record['cols'], record['nnz'],
+            'sparse' if record['sparse'] else 'dense',
+            '' if record['consistent'] else ', INCONSISTENT',
+            ', {} NaN'.format(record['nan']) if record['nan'] else ''))
+    log('regions: {}'.format(sut.regions))
+    if sut.Y is not None:
+        log('max. market imbalance: {:.3g}'.format(
+            np.abs(sut.market_balance()).max()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='pysut', description='Constructs, aggregations and footprints'
+        ' of supply and use tables saved as npz (SupplyUseTable.save).')
+    commands = parser.add_subparsers(dest='command')
+
+    p_info = commands.add_parser('info', help='dimensions of a saved table')
+    p_info.add_argument('table', help='npz file of the table')
+
+    p_run = commands.add_parser('run', help='run operations on a table',
+                                description=__doc__[
+                                    __doc__.index('Operations'):
+                                    __doc__.index('Only the modules')],
+                                formatter_class=argparse.
+                                RawDescriptionHelpFormatter)
+    p_run.add_argument('table', help='npz file of the table')
+    p_run.add_argument('operations', nargs='+', metavar='OPERATION',
+                       help='construct name, footprints, aggregate=AV or'
+                            ' save=PATH')
+    p_run.add_argument('-o', '--output',
+                       help='npz file for the results (default:'
+                            ' <table>_results.npz)')
+    p_run.add_argument('--flows', action='store_true',
+                       help='also write the flows Z and F_con')
+    p_run.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                       help='evaluate the constructs in N threads (see'
+                            ' pysut.parallel)')
+    p_run.add_argument('-q', '--quiet', action='store_true')
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    if args.command == 'run':
+        try:
+            operations = [parse_operation(x) for x in args.operations]
+        except ValueError as error:
+            parser.error(str(error))
+
+    from .pySUT import SupplyUseTable
+    sut = SupplyUseTable.load(args.table)
+    if args.command == 'info':
+        info(sut)
+        return 0
+
+    log = (lambda message: None) if args.quiet else print
+    from . import parallel
+    try:
+        with parallel.threads(args.jobs):
+            results = run(sut, operations, args.flows, log)
+    except ValueError as error:
+        print('pysut: {}'.format(error), file=sys.stderr)
+        return 1
+    if results:
+        import numpy as np
+        output = args.output or (args.table[:-4] if args.table.endswith(
+            '.npz') else args.table) + '_results.npz'
+        np.savez(output, **results)
+        log('results written to {}'.format(output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
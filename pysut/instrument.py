@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of constructs: structured events for time, memory and nnz
+
+The constructs and their main helpers report what they do as events: one
+event per phase (e.g. 'sparse' conversion, allocation 'product',
+'normalization', 'restore') with its wall time, peak allocation and the
+number of non-zeros of its result, and point events such as the residual
+of each iteration of the alternative technologies of aac_agg.
+
+Instrumentation is opt-in. Without registered callbacks, phases cost a
+single check and nothing is measured. To record events, either register a
+callback (e.g. to pass events on to a scheduler or to logging):
+
+    >>> instrument.add_callback(instrument.log_event)
+
+or profile a block of code:
+
+    >>> with instrument.profile() as prof:
+    ...     sut.btc()
+    >>> prof.summary()
+
+Peak allocations are only measured while tracemalloc is tracing (profile
+starts it by default). tracemalloc is only imported once instrumentation
+is enabled, to keep the import of pysut light.
+
+dependencies:
+    numpy >= 1.9
+    scipy >= 0.14
+
+"""
+
+from __future__ import division, print_function
+import functools
+import logging
+import threading
+from collections import namedtuple, OrderedDict
+from timeit import default_timer
+
+import numpy as np
+from scipy import sparse as sp
+
+Event = namedtuple('Event', ['name', 'construct', 'time', 'peak', 'nnz',
+                             'data'])
+Event.__doc__ = """ Instrumentation event
+
+name:      phase or event name, e.g. 'product' or 'residual'
+construct: name of the enclosing construct (or helper), or None
+time:      wall time of the phase in s (None for point events)
+peak:      peak allocation during the phase above its start, in bytes
+           (None if tracemalloc is not tracing)
+nnz:       number of non-zeros of the results of the phase (None if not
+           recorded)
+data:      dict of further values, e.g. {'iteration': 3, 'residual': 0.1}
+"""
+
+_callbacks = []
+_local = threading.local()  # stack of open phases, per thread
+
+
+def add_callback(callback):
+    """ Register a function that is called with every Event """
+    if callback not in _callbacks:
+        _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    """ Unregister a function registered with add_callback """
+    if callback in _callbacks:
+        _callbacks.remove(callback)
+
+
+def enabled():
+    """ True if any callback is registered, i.e. events are recorded """
+    return bool(_callbacks)
+
+
+def log_event(event, level=logging.INFO):
+    """ Callback passing events on to logging """
+    logging.log(level, 'pysut %s', _format(event))
+
+
+def emit(name, **data):
+    """ Send a point event (without duration) to all callbacks """
+    if _callbacks:
+        _dispatch(Event(name, _current_construct(), None, None, None, data))
+
+
+def nnz(*arrays):
+    """ Total number of non-zeros of dense or sparse arrays (None skipped) """
+    total = 0
+    for X in arrays:
+        if X is None:
+            continue
+        total += X.nnz if sp.issparse(X) else int(np.count_nonzero(X))
+    return total
+
+
+class Phase(object):
+
+    """ Context manager timing a phase, see phase() """
+
+    def __init__(self, name, construct=None, data=None):
+        self.name = name
+        self.construct = construct
+        self.data = data or {}
+        self.nnz = None
+        self._inner_peak = 0
+
+    def record(self, *arrays, **data):
+        """ Record the non-zeros of the results of the phase, and data """
+        self.nnz = (self.nnz or 0) + nnz(*arrays)
+        self.data.update(data)
+
+    def __enter__(self):
+        import tracemalloc
+        stack = _stack()
+        if self.construct is None:
+            self.construct = _current_construct()
+        self._tracing = tracemalloc.is_tracing()
+        if self._tracing:
+            self._start, self._outer_peak = tracemalloc.get_traced_memory()
+            _reset_peak()
+        stack.append(self)
+        self._t0 = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        import tracemalloc
+        elapsed = default_timer() - self._t0
+        stack = _stack()
+        stack.pop()
+        peak = None
+        if self._tracing and tracemalloc.is_tracing():
+            __, top = tracemalloc.get_traced_memory()
+            top = max(top, self._inner_peak)
+            peak = max(top - self._start, 0)
+            # Let the enclosing phase see this peak (reset for this phase)
+            if stack:
+                stack[-1]._inner_peak = max(stack[-1]._inner_peak, top,
+                                            self._outer_peak)
+        if exc_type is not None:
+            self.data['error'] = exc_type.__name__
+        _dispatch(Event(self.name, self.construct, elapsed, peak, self.nnz,
+                        self.data))
+        return False
+
+
+class _NoPhase(object):
+
+    """ Phase when instrumentation is off: does nothing """
+
+    def record(self, *arrays, **data):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name, construct=None, **data):
+    """ Context manager recording a phase, if instrumentation is enabled
+
+    Args
+    ----
+    name:      name of the phase, e.g. 'product'
+    construct: name of the construct; default: that of the enclosing phase
+    data:      further values to report with the event
+
+    The context manager has a method record(*arrays, **data), to report the
+    non-zeros of the results of the phase (only computed if enabled).
+    """
+    if not _callbacks:
+        return _NO_PHASE
+    return Phase(name, construct, data)
+
+
+def instrumented(function):
+    """ Decorator recording a whole construct (or helper) as a phase
+
+    The phase is named 'total', and its construct is the name of the
+    function, which is also the construct of all phases within it.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _callbacks:
+            return function(*args, **kwargs)
+        with Phase('total', function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class Profile(object):
+
+    """ Collected events, see profile() """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.events = []
+        self._started = False
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def __enter__(self):
+        import tracemalloc
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        add_callback(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        remove_callback(self)
+        if self._started:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started = False
+        return False
+
+    def summary(self):
+        """ Totals per (construct, phase): calls, time, max peak, nnz
+
+        Returns
+        -------
+        OrderedDict of (construct, name) -> dict with keys 'calls', 'time',
+        'peak' and 'nnz', in order of first occurrence
+        """
+        table = OrderedDict()
+        for e in self.events:
+            if e.time is None:
+                continue
+            row = table.setdefault((e.construct, e.name), {
+                'calls': 0, 'time': 0., 'peak': None, 'nnz': None})
+            row['calls'] += 1
+            row['time'] += e.time
+            if e.peak is not None:
+                row['peak'] = max(row['peak'] or 0, e.peak)
+            if e.nnz is not None:
+                row['nnz'] = (row['nnz'] or 0) + e.nnz
+        return table
+
+    def report(self):
+        """ Summary as text, one line per (construct, phase) """
+        lines = ['{:<20} {:<16} {:>6} {:>10} {:>12} {:>12}'.format(
+            'construct', 'phase', 'calls', 'time [s]', 'peak [B]', 'nnz')]
+        for (construct, name), row in self.summary().items():
+            lines.append('{:<20} {:<16} {:>6} {:>10.4f} {:>12} {:>12}'.format(
+                str(construct), name, row['calls'], row['time'],
+                '-' if row['peak'] is None else row['peak'],
+                '-' if row['nnz'] is None else row['nnz']))
+        return '\n'.join(lines)
+
+
+def profile(memory=True):
+    """ Context manager collecting all events of a block of code
+
+    Args
+    ----
+    memory: trace allocations (tracemalloc) during the block, to record
+            peak allocations (slower)
+
+    Returns
+    -------
+    Profile, with the list of events and summary() and report() methods
+    """
+    return Profile(memory)
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _current_construct():
+    stack = _stack()
+    return stack[-1].construct if stack else None
+
+
+def _reset_peak():
+    """ Restart the measurement of the peak (Python 3.9 and later) """
+    import tracemalloc
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+def _dispatch(event):
+    for callback in list(_callbacks):
+        callback(event)
+
+
+def _format(event):
+    parts = [event.name if event.construct is None else
+             '{}.{}'.format(event.construct, event.name)]
+    if event.time is not None:
+        parts.append('time={:.6f}s'.format(event.time))
+    if event.peak is not None:
+        parts.append('peak={}B'.format(event.peak))
+    if event.nnz is not None:
+        parts.append('nnz={}'.format(event.nnz))
+    parts.extend('{}={}'.format(k, v) for k, v in sorted(event.data.items()))
+    return ' '.join(parts)
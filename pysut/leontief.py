@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+"""
+Leontief systems of constructed input-output models
+
+Footprints and multipliers for the A and S matrices returned by the
+constructs of SupplyUseTable (btc, ctc, itc, esc, lsc, pc_agg, psc_agg,
+aac_agg). The Leontief inverse (I - A)^-1 is never computed explicitly:
+I - A is factorized once (sparse LU) and all quantities are obtained by
+solving against this factorization.
+
+dependencies:
+    numpy >= 1.9
+    scipy >= 0.14
+
+"""
+
+from __future__ import division, print_function
+import logging
+from collections import OrderedDict
+import numpy as np
+from scipy import sparse as sp
+from scipy.sparse import linalg as sl
+
+from .pySUT import aggregate_within_regions, _dense
+
+
+class LeontiefSystem(object):
+
+    """ Factorized Leontief system (I - A) of a construct
+
+    Attributes
+    ----------
+    A : Normalized technical requirements [com, com], as sparse csc matrix
+        (solved in float64, whatever the precision of the construct).
+        Must be square, i.e. obtained with keep_size=True.
+    S : Normalized, constructed extensions [ext, com], or None
+    block_size : number of right-hand sides (e.g. final demand columns)
+        solved at once. Bounds the memory of intermediate results to
+        com * block_size values.
+    index : LabelIndex of the products (optional), to select columns by
+        label rather than by position
+    cache_size : number of columns of the Leontief inverse kept in memory
+        by self.leontief_columns (least recently used are dropped first)
+    max_rank : maximum number of columns of A changed by self.update
+        before I - A is factorized anew
+    precision : 'double' (default) to factorize I - A in float64, or
+        'mixed' to factorize it in float32 (half the memory of the factors)
+        and refine each solution iteratively against the float64 A, see
+        self._base_solve. Switches to 'double' if refinement fails.
+    refine_tol : relative backward error at which refinement stops
+    max_refine : maximum number of refinement steps per solve
+    refinement_steps : number of refinement steps of the last solve in
+        mixed precision (None otherwise)
+
+    """
+
+    def __init__(self, A, S=None, block_size=256, index=None,
+                 cache_size=1024, max_rank=64, precision='double',
+                 refine_tol=1e-13, max_refine=20):
+        A = sp.csc_matrix(A, dtype=np.float64)
+        if A.shape[0] != A.shape[1]:
+            raise ValueError('Error: A is not square. Run the construct with'
+                             ' keep_size=True.')
+        if S is not None and S.shape[0] == 0:  # no stressors (np.empty(0))
+            S = None
+        if S is not None and S.shape[1] != A.shape[0]:
+            raise ValueError('Error: S has {} columns, A has {} products.'
+                             .format(S.shape[1], A.shape[0]))
+        self.A = A
+        self.S = S
+        self.block_size = block_size
+        self.index = index
+        self.cache_size = cache_size
+        self.max_rank = max_rank
+        if precision not in ('double', 'mixed'):
+            raise ValueError("Error: precision must be 'double' or 'mixed',"
+                             " not {}.".format(precision))
+        self.precision = precision
+        self.refine_tol = refine_tol
+        self.max_refine = max_refine
+        self.refinement_steps = None
+        self._lu = None
+        self._columns = OrderedDict()  # product -> [L[:, j], (S L)[:, j]]
+
+        # Low-rank update of the factorized system, see self.update:
+        # A = A0 + D E^T, where E selects the changed columns
+        self._A0 = A
+        self._changed = None   # [changed columns, new columns of A]
+        self._smw = None       # [changed columns, D, W, capacitance, Z]
+
+    @classmethod
+    def from_construct(cls, result, **kwargs):
+        """ Leontief system of the tuple returned by a construct method
+
+        Picks A and S from the output of btc, ctc, itc, esc, lsc, pc_agg,
+        aac_agg (A first, S second) or psc_agg (A first, S fourth).
+        """
+        if len(result) == 8:
+            return cls(result[0], result[3], **kwargs)
+        return cls(result[0], result[1], **kwargs)
+
+    @property
+    def size(self):
+        """ Number of products in the system """
+        return self.A.shape[0]
+
+    @property
+    def lu(self):
+        """ Sparse LU factorization of I - A0, computed once, on first use
+
+        A0 is A before any low-rank update (see self.update). In mixed
+        precision, the factors are computed and stored in float32.
+        """
+        if self._lu is None:
+            IA = sp.csc_matrix(sp.identity(self.size, format='csc') - self._A0)
+            if self.precision == 'mixed':
+                IA = IA.astype(np.float32)
+            try:
+                self._lu = sl.splu(IA)
+            except RuntimeError:
+                raise ValueError('Error: I - A is singular, the Leontief'
+                                 ' system has no solution.')
+        return self._lu
+
+    def _solve(self, B, trans='N'):
+        """ Solve (I - A) X = B, or (I - A)^T X = B if trans is 'T'
+
+        If columns of A were updated since the factorization, the solution
+        for I - A0 is corrected with the Sherman-Morrison-Woodbury formula:
+        with I - A = (I - A0) - D E^T and W = (I - A0)^-1 D,
+
+            (I - A)^-1 B = X0 + W (I - E^T W)^-1 E^T X0
+
+        and for the transposed system, with Z = (I - A0)^-T E,
+
+            (I - A)^-T B = X0 + Z (I - E^T W)^-T D^T X0
+        """
+        X = self._base_solve(B, trans)
+        if self._smw is None:
+            return X
+        cols, D, W, cap, Z = self._smw
+        if trans == 'N':
+            return X + W.dot(np.linalg.solve(cap, X[cols]))
+        if Z is None:
+            E = np.zeros((self.size, len(cols)))
+            E[cols, np.arange(len(cols))] = 1
+            Z = self._smw[4] = self._base_solve(E, 'T')
+        return X + Z.dot(np.linalg.solve(cap.T, D.T.dot(X)))
+
+    def _base_solve(self, B, trans='N'):
+        """ Solve (I - A0) X = B (or its transpose) with the factorization
+
+        In mixed precision, the float32 solution is refined in float64:
+
+            R = B - (I - A0) X,   X = X + (I - A0)^-1 R
+
+        with the residual R computed against the float64 A0 and the
+        correction solved with the float32 factors, until the relative
+        backward error |R| / (|I - A0| |X| + |B|) is below refine_tol. If
+        it does not get there within max_refine steps, or stagnates, I - A0
+        is factorized again in float64 and precision becomes 'double'.
+        """
+        if self.precision != 'mixed':
+            return self.lu.solve(B, trans=trans)
+        B = np.asarray(B, dtype=np.float64)
+        A0 = self._A0.T if trans == 'T' else self._A0
+        norm_IA = 1 + abs(A0).sum(axis=1).max()  # bound of |I - A0|_inf
+        X = self.lu.solve(B.astype(np.float32), trans=trans)
+        X = X.astype(np.float64)
+        previous = np.inf
+        for step in range(self.max_refine + 1):
+            R = B - X + A0.dot(X)
+            residual = np.abs(R).max()
+            scale = norm_IA * np.abs(X).max() + np.abs(B).max()
+            if residual <= self.refine_tol * scale:
+                self.refinement_steps = step
+                return X
+            if residual > 0.5 * previous:  # stagnation
+                break
+            previous = residual
+            if step < self.max_refine:
+                X += self.lu.solve(R.astype(np.float32), trans=trans)
+        logging.warning("Iterative refinement did not converge, I - A is"
+                        " factorized in float64")
+        self.precision = 'double'
+        self.refinement_steps = None
+        self._lu = None
+        return self.lu.solve(B, trans=trans)
+
+    def update(self, products, A_cols, S=None):
+        """ Replace columns of A (and optionally S) without refactorizing
+
+        Changing k columns of A is a rank-k update of I - A. Instead of a new
+        factorization, k solves against the existing one are enough to
+        correct all later solves (Sherman-Morrison-Woodbury, see
+        self._solve). Once more than max_rank columns differ from the
+        factorized A, or if the update is singular, I - A is factorized
+        anew.
+
+        Args
+        ----
+        products : positions (or labels) of the changed columns
+        A_cols :   new columns of A [com, len(products)]
+        S :        new S [ext, com] (optional)
+
+        """
+        cols = self._positions(products)
+        A_cols = _dense(A_cols, float).reshape((self.size, len(cols)))
+        if S is not None:
+            self.S = S
+        self._columns.clear()
+
+        # Merge with earlier updates
+        new = OrderedDict()
+        if self._changed is not None:
+            for j, a in zip(self._changed[0], self._changed[1].T):
+                new[j] = a
+        for j, a in zip(cols.tolist(), A_cols.T):
+            new[j] = a
+        cols = np.array(list(new.keys()), dtype=np.intp)
+        A_cols = np.column_stack(list(new.values()))
+
+        # Updated A: columns of A0 outside cols, plus the new columns
+        keep = np.ones(self.size)
+        keep[cols] = 0
+        P = sp.csc_matrix((np.ones(len(cols)), (np.arange(len(cols)), cols)),
+                          shape=(len(cols), self.size))
+        self.A = sp.csc_matrix(self._A0 * sp.diags(keep) +
+                               sp.csc_matrix(A_cols) * P)
+
+        if len(cols) > self.max_rank:
+            self._refactorize()
+            return
+        D = A_cols - self._A0[:, cols].toarray()
+        W = self._base_solve(D)
+        cap = np.eye(len(cols)) - W[cols, :]
+        if np.linalg.cond(cap) > 1 / np.finfo(float).eps:
+            self._refactorize()
+            return
+        self._changed = [cols, A_cols]
+        self._smw = [cols, D, W, cap, None]
+
+    def set_extensions(self, S):
+        """ Replace S, e.g. with added rows, keeping the factorization of I - A
+
+        Cached columns of (I - A)^-1 are kept; their multipliers are
+        recomputed with the new S when next needed.
+        """
+        if S is not None and S.shape[0] == 0:  # no stressors (np.empty(0))
+            S = None
+        if S is not None and S.shape[1] != self.size:
+            raise ValueError('Error: S has {} columns, A has {} products.'
+                             .format(S.shape[1], self.size))
+        self.S = S
+        for entry in self._columns.values():
+            entry[1] = None
+
+    def _refactorize(self):
+        """ Make the current A the factorized one, dropping all updates """
+        self._A0 = self.A
+        self._lu = None
+        self._changed = None
+        self._smw = None
+
+    def _blocks(self, ncols):
+        """ Slices of at most block_size columns """
+        step = max(int(self.block_size), 1)
+        for start in range(0, ncols, step):
+            yield slice(start, min(start + step, ncols))
+
+    def solve(self, Y):
+        """ Total output x = (I - A)^-1 Y
+
+        Args
+        ----
+        Y : final demand [com] or [com, fd], dense or sparse
+
+        Returns
+        -------
+        x : total output, same shape as Y, dense
+        """
+        if Y.ndim == 1:
+            return self._solve(np.asarray(Y, dtype=float))
+        X = np.empty(Y.shape)
+        for blk in self._blocks(Y.shape[1]):
+            X[:, blk] = self._solve(_dense(Y[:, blk], float))
+        return X
+
+    def footprints(self, Y, FY=None, regions=None):
+        """ Consumption-based footprints D = S (I - A)^-1 Y + FY
+
+        All final demand columns are solved against the same factorization,
+        block_size columns at a time, and only the footprints (not the total
+        outputs) of each block are kept.
+
+        Args
+        ----
+        Y :       final demand [com, fd]
+        FY :      direct extensions of final demand [ext, fd] (optional)
+        regions : if not None, number of regions. The footprints of the
+                  final demand categories of each consuming region are then
+                  summed (fd must be a true multiple of regions).
+
+        Returns
+        -------
+        D : footprints [ext, fd], or [ext, regions] if regions is given
+
+        """
+        if self.S is None:
+            raise ValueError('Error: no extensions (S) in this system,'
+                             ' footprints cannot be computed.')
+        Y = Y.reshape((-1, 1)) if Y.ndim == 1 else Y
+        D = np.empty((self.S.shape[0], Y.shape[1]))
+        for blk in self._blocks(Y.shape[1]):
+            D[:, blk] = _dense(self.S.dot(self._solve(_dense(Y[:, blk],
+                                                             float))))
+        if FY is not None:
+            D += _dense(FY).reshape(D.shape)
+        if regions is not None:
+            if D.shape[1] % regions:
+                raise ValueError('Error: number of final demand categories is'
+                                 ' not a true multiple of the number of'
+                                 ' regions.')
+            D = aggregate_within_regions(D, regions, axis=1)
+        return D
+
+    def multipliers(self, rows=None, C=None):
+        """ Multipliers M = S (I - A)^-1 of selected stressors or impacts
+
+        Instead of the Leontief inverse (one solve per product), solves the
+        transposed system (I - A)^T m_k = s_k, i.e. one solve per stressor
+        (or impact) k, against the cached factorization.
+
+        Args
+        ----
+        rows : positions of the stressors (rows of S) of interest.
+               Default: all stressors.
+        C :    characterization matrix [impact, ext] (optional). Stressors
+               are first characterized (C S), so that all stressors
+               contributing to the same impact category are solved in one
+               go. If rows is given, C only covers these rows [impact, rows].
+
+        Returns
+        -------
+        M : multipliers [rows, com], or [impact, com] if C is given
+
+        """
+        if self.S is None:
+            raise ValueError('Error: no extensions (S) in this system,'
+                             ' multipliers cannot be computed.')
+        B = self.S if rows is None else self.S[rows, :]
+        if C is not None:
+            B = C.dot(B)
+        B = _dense(B, float)
+        M = np.empty(B.shape)
+        for blk in self._blocks(B.shape[0]):
+            M[blk, :] = self._solve(B[blk, :].T.copy(), 'T').T
+        return M
+
+    def _positions(self, products):
+        """ Positions of products given by position or by label """
+        if self.index is None:
+            return np.asarray(products, dtype=np.intp).reshape(-1)
+        return self.index.positions(products)
+
+    def _cached_columns(self, cols):
+        """ Cache entries of the given products, solving for missing ones
+
+        Missing columns of (I - A)^-1 are obtained together, by solving for
+        the corresponding unit vectors, and enter the cache as most
+        recently used.
+        """
+        found = {}
+        for j in set(cols.tolist()):
+            entry = self._columns.pop(j, None)
+            if entry is not None:
+                self._columns[j] = entry  # re-insert as most recently used
+                found[j] = entry
+        missing = [j for j in set(cols.tolist()) if j not in found]
+        if missing:
+            E = np.zeros((self.size, len(missing)))
+            E[missing, np.arange(len(missing))] = 1
+            X = self.solve(E)
+            for k, j in enumerate(missing):
+                found[j] = [X[:, k].copy(), None]
+                self._columns[j] = found[j]
+            while len(self._columns) > self.cache_size:
+                self._columns.popitem(last=False)
+        return found
+
+    def leontief_columns(self, products):
+        """ Selected columns of the Leontief inverse (I - A)^-1
+
+        Cradle-to-gate requirements of products, i.e. the total output of
+        each product needed to deliver one unit of each selected product.
+        Computed columns are cached (see cache_size), so that repeated
+        queries for the same products do not solve again.
+
+        Args
+        ----
+        products : list of product positions, or of product labels if the
+                   system has a label index
+
+        Returns
+        -------
+        L : [com, len(products)]
+
+        """
+        cols = self._positions(products)
+        found = self._cached_columns(cols)
+        return np.column_stack([found[j][0] for j in cols]
+                               ) if cols.size else np.empty((self.size, 0))
+
+    def multiplier_columns(self, products):
+        """ Selected columns of the multipliers S (I - A)^-1
+
+        Cradle-to-gate extensions of one unit of each selected product.
+        Cached like self.leontief_columns.
+
+        Returns
+        -------
+        M : [ext, len(products)]
+
+        """
+        if self.S is None:
+            raise ValueError('Error: no extensions (S) in this system,'
+                             ' multipliers cannot be computed.')
+        cols = self._positions(products)
+        found = self._cached_columns(cols)
+        for j in found:
+            if found[j][1] is None:
+                found[j][1] = _dense(self.S.dot(found[j][0])).reshape(-1)
+        return np.column_stack([found[j][1] for j in cols]
+                               ) if cols.size else np.empty((self.S.shape[0], 0))
+
+
+def footprints(A, S, Y, FY=None, regions=None, block_size=256):
+    """ Consumption-based footprints S (I - A)^-1 Y + FY of a construct
+
+    Convenience wrapper around LeontiefSystem.footprints, see there. To
+    compute footprints of several final demands with the same A, keep a
+    LeontiefSystem (or use SupplyUseTable.leontief) to factorize only once.
+    """
+    return LeontiefSystem(A, S, block_size).footprints(Y, FY, regions)
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Monte Carlo propagation of uncertainty through constructs and footprints
+
+Uncertainty in the supply (V), use (U) and extension (F) tables is
+propagated by sampling perturbed tables. Only the stored non-zero entries
+are perturbed, so all samples share the sparsity pattern of the original
+tables. This pattern, together with E_bar (and Xi), fixes the structure of
+the construct: each constructed flow is a fixed linear combination of
+entries of U, V and F. These combinations are computed once, as sparse
+operators acting on the non-zero values of the tables, and a whole batch of
+samples is then constructed with a few sparse matrix products.
+
+Statistics of the results are accumulated online (running mean and
+variance, and a reservoir sample for quantiles), so that the individual
+samples never need to be kept.
+
+dependencies:
+    numpy >= 1.9
+    scipy >= 0.14
+
+"""
+
+from __future__ import division, print_function
+import logging
+import numpy as np
+from scipy import sparse as sp
+
+from .leontief import LeontiefSystem
+
+
+class OnlineStatistics(object):
+
+    """ Running statistics of array-valued samples
+
+    Mean and variance are updated batch by batch (Chan et al.'s parallel
+    form of Welford's algorithm). Quantiles are estimated from a uniform
+    reservoir sample of at most sketch_size samples, which is exact as long
+    as fewer samples have been seen.
+
+    Attributes
+    ----------
+    n :     number of samples seen
+    mean :  running mean, array of the shape of one sample
+    """
+
+    def __init__(self, shape, sketch_size=256, seed=None):
+        self.shape = tuple(np.atleast_1d(shape))
+        self.n = 0
+        self.mean = np.zeros(self.shape)
+        self._m2 = np.zeros(self.shape)
+        self.sketch_size = sketch_size
+        self._reservoir = np.empty((sketch_size,) + self.shape)
+        self._random = np.random.RandomState(seed)
+
+    def update(self, batch):
+        """ Add a batch of samples [samples, *shape] """
+        batch = np.asarray(batch, dtype=float).reshape((-1,) + self.shape)
+        nb = batch.shape[0]
+        if nb == 0:
+            return
+        mean_b = batch.mean(axis=0)
+        m2_b = ((batch - mean_b) ** 2).sum(axis=0)
+        n = self.n + nb
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * nb / n
+        self._m2 = self._m2 + m2_b + delta ** 2 * self.n * nb / n
+
+        # Reservoir sampling (algorithm R)
+        for k in range(nb):
+            t = self.n + k
+            if t < self.sketch_size:
+                self._reservoir[t] = batch[k]
+            else:
+                r = self._random.randint(0, t + 1)
+                if r < self.sketch_size:
+                    self._reservoir[r] = batch[k]
+        self.n = n
+
+    @property
+    def variance(self):
+        """ Sample variance (ddof=1) """
+        if self.n < 2:
+            return np.full(self.shape, np.nan)
+        return self._m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        """ Sample standard deviation (ddof=1) """
+        return np.sqrt(self.variance)
+
+    def quantile(self, q):
+        """ Estimated quantile(s) q (between 0 and 1) of the samples """
+        kept = min(self.n, self.sketch_size)
+        return np.percentile(self._reservoir[:kept], np.multiply(q, 100),
+                             axis=0)
+
+
+class MonteCarlo(object):
+
+    """ Vectorized Monte Carlo simulation of a construct and its footprints
+
+    Supported constructs are those allocating by primary production:
+
+        esc, lsc:  Z = U E_bar'
+        btc:       Z = (U - V_tild) E_bar'
+        psc_agg:   Z = (U - Xi V_tild) E_bar'
+
+    Each non-zero entry of U, V and F is multiplied by an independent,
+    lognormally distributed factor with mean 1 and the coefficient of
+    variation given for the table.
+
+    Attributes
+    ----------
+    sut :       the SupplyUseTable
+    construct : 'esc', 'lsc', 'btc' or 'psc_agg'
+    cv :        dict of coefficients of variation, for 'U', 'V' and 'F'
+    batch_size: number of samples constructed at once
+
+    """
+
+    def __init__(self, sut, construct='btc', cv=0.1, seed=None,
+                 batch_size=100):
+        if construct not in ('esc', 'lsc', 'btc', 'psc_agg'):
+            raise ValueError('Error: Monte Carlo simulation is not available'
+                             ' for construct {}.'.format(construct))
+        if not isinstance(cv, dict):
+            cv = {'U': cv, 'V': cv, 'F': cv}
+        self.sut = sut
+        self.construct = construct
+        self.cv = cv
+        self.batch_size = batch_size
+        self._random = np.random.RandomState(seed)
+        self._prepare()
+
+    def _prepare(self):
+        """ Sparsity patterns and construct operators, computed once """
+        sut = self.sut
+        com = sut.V.shape[0]
+        if sut.E_bar is None and (com == sut.V.shape[1]):
+            logging.warning("Assuming primary production is on diagonal")
+            E = sp.identity(com, format='csc')
+        else:
+            E = sp.csc_matrix(sut.E_bar)
+
+        U = sp.coo_matrix(sut.U)
+        V = sp.coo_matrix(sut.V)
+        self._U, self._V = U, V
+        # Stressors F are perturbed; the characterization C is applied to
+        # each sample (see SupplyUseTable.characterize)
+        self._F = sp.coo_matrix(sut.F) if sut.F is not None else None
+
+        # Entries of V that are secondary production (V_tild)
+        secondary = 1 - np.asarray(E[V.row, V.col]).reshape(-1)
+
+        # Flows: Z = L_U U E' + L_V (V o secondary) E'
+        terms = [(sp.identity(com, format='csc'), U.row, U.col,
+                  np.ones(U.nnz), 'U')]
+        if self.construct == 'btc':
+            terms.append((sp.identity(com, format='csc'), V.row, V.col,
+                          -secondary, 'V'))
+        elif self.construct == 'psc_agg':
+            terms.append((sp.csc_matrix(sut.Xi), V.row, V.col, -secondary,
+                          'V'))
+        self._Z = _Operators(terms, E.T.tocsr(), com)
+
+        # Normalization vector, linear in the entries of V
+        if self.construct == 'esc':
+            norm = sp.coo_matrix((np.ones(V.nnz), (V.row, np.arange(V.nnz))),
+                                 shape=(com, V.nnz))
+        elif self.construct == 'lsc':
+            # E_bar g: sum of the outputs of all primary producers
+            norm = E * sp.coo_matrix((np.ones(V.nnz),
+                                      (V.col, np.arange(V.nnz))),
+                                     shape=(E.shape[1], V.nnz))
+        else:
+            norm = sp.coo_matrix((1 - secondary, (V.row, np.arange(V.nnz))),
+                                 shape=(com, V.nnz))
+        self._norm = sp.csr_matrix(norm)
+
+        # Constructed extensions: F_con = F E', or C F E', or both stacked
+        if self._F is not None:
+            F = self._F
+            L = sp.identity(F.shape[0], format='csc')
+            if sut.C is not None:
+                C = sp.csc_matrix(sut.C)
+                L = sp.vstack([L, C], format='csc') if sut.keep_stressors \
+                    else C
+            self._n_ext = L.shape[0]
+            self._Fcon = _Operators([(L, F.row, F.col, np.ones(F.nnz), 'F')],
+                                    E.T.tocsr(), com)
+
+    def _factors(self, table, nnz, n):
+        """ Lognormal factors with mean 1 [nnz, n] """
+        cv = self.cv.get(table, 0)
+        if not cv:
+            return np.ones((nnz, n))
+        sigma = np.sqrt(np.log(1 + cv ** 2))
+        return np.exp(sigma * self._random.standard_normal((nnz, n)) -
+                      sigma ** 2 / 2)
+
+    def construct_batch(self, n):
+        """ Construct n samples at once
+
+        Returns
+        -------
+        A_values : [nnz(A), n] values of A on the pattern (self.A_pattern)
+        S_values : [nnz(S), n] values of S on its pattern, or None
+        """
+        data = {'U': self._U.data[:, None] * self._factors('U', self._U.nnz, n),
+                'V': self._V.data[:, None] * self._factors('V', self._V.nnz, n)}
+        norm_inv = self._norm.dot(data['V'])
+        nonzero = norm_inv != 0
+        norm_inv[nonzero] = 1 / norm_inv[nonzero]
+
+        A_values = self._Z.apply(data) * norm_inv[self._Z.cols]
+        S_values = None
+        if self._F is not None:
+            data['F'] = self._F.data[:, None] * self._factors('F',
+                                                              self._F.nnz, n)
+            S_values = self._Fcon.apply(data) * norm_inv[self._Fcon.cols]
+        return A_values, S_values
+
+    @property
+    def A_pattern(self):
+        """ Row and column positions of the values of A """
+        return self._Z.rows, self._Z.cols
+
+    @property
+    def S_pattern(self):
+        """ Row and column positions of the values of S """
+        return self._Fcon.rows, self._Fcon.cols
+
+    def samples(self, n):
+        """ Generator of n sampled constructs (A, S) as sparse matrices """
+        com = self.sut.V.shape[0]
+        done = 0
+        while done < n:
+            nb = min(self.batch_size, n - done)
+            A_values, S_values = self.construct_batch(nb)
+            for k in range(nb):
+                A = sp.csc_matrix((A_values[:, k], self.A_pattern),
+                                  shape=(com, com))
+                S = None
+                if S_values is not None:
+                    S = sp.csr_matrix((S_values[:, k], self.S_pattern),
+                                      shape=(self._n_ext, com))
+                yield A, S
+            done += nb
+
+    def run(self, n, Y=None, FY=None, by_region=True, track_S=False,
+            sketch_size=256):
+        """ Propagate n samples to footprints, accumulating statistics
+
+        Args
+        ----
+        n :         number of samples
+        Y, FY :     final demand and its extensions (default: from the SUT)
+        by_region : sum footprints per consuming region (sut.regions)
+        track_S :   also accumulate statistics of S
+        sketch_size: reservoir size for quantiles
+
+        Returns
+        -------
+        dict of OnlineStatistics, with key 'footprints' (and 'S')
+
+        """
+        if track_S and self._F is None:
+            raise ValueError('Error: no extensions F: S cannot be tracked.')
+        sut = self.sut
+        Y = sut.Y if Y is None else Y
+        FY = sut.FY_alloc if FY is None else FY
+        regions = sut.regions if by_region else None
+        stats = {}
+        for A, S in self.samples(n):
+            D = LeontiefSystem(A, S).footprints(Y, FY, regions)
+            if 'footprints' not in stats:
+                stats['footprints'] = OnlineStatistics(
+                    D.shape, sketch_size, self._random.randint(2 ** 31))
+                if track_S:
+                    stats['S'] = OnlineStatistics(
+                        S.shape, sketch_size, self._random.randint(2 ** 31))
+            stats['footprints'].update(D[None])
+            if track_S:
+                stats['S'].update(S.toarray()[None])
+        return stats
+
+
+class _Operators(object):
+
+    """ Linear map from the non-zero values of tables to constructed flows
+
+    Each term (L, rows, cols, weights, table) stands for L X R, where X has
+    the values of the table at (rows, cols), multiplied by weights. The
+    result is stored on its own sparsity pattern (self.rows, self.cols),
+    and self.apply maps a batch of table values to a batch of values on
+    this pattern with one sparse product per table.
+    """
+
+    def __init__(self, terms, R, ncols):
+        keys, parts = [], []
+        for L, rows, cols, weights, table in terms:
+            i, j, p, w = _bilinear_entries(sp.csc_matrix(L), rows, cols,
+                                           weights, R)
+            keys.append(i.astype(np.int64) * ncols + j)
+            parts.append((p, w, table, len(rows)))
+        pattern, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        self.rows = pattern // ncols
+        self.cols = pattern % ncols
+        self.maps = []
+        start = 0
+        for (p, w, table, nnz), k in zip(parts, keys):
+            pos = inverse[start:start + len(k)]
+            start += len(k)
+            self.maps.append((table, sp.csr_matrix(
+                (w, (pos, p)), shape=(len(pattern), nnz))))
+
+    def apply(self, data):
+        """ Constructed values [pattern, samples] from table values """
+        return sum(M.dot(data[table]) for table, M in self.maps)
+
+
+def _bilinear_entries(L, rows, cols, weights, R):
+    """ Entries of L X R contributed by each stored value p of X
+
+    Value p, at (rows[p], cols[p]), contributes weights[p] * L[i, rows[p]] *
+    R[cols[p], j] to entry (i, j) of L X R.
+
+    Returns
+    -------
+    i, j, p, w : target row, target column, source value and weight of
+                 each contribution
+    """
+    # Expand over the non-zeros of the columns rows[p] of L (csc)
+    counts = np.diff(L.indptr)[rows]
+    pos = _ranges(L.indptr[rows], counts)
+    p = np.repeat(np.arange(len(rows)), counts)
+    i = L.indices[pos]
+    w = np.repeat(weights, counts) * L.data[pos]
+
+    # Expand over the non-zeros of the rows cols[p] of R (csr)
+    counts = np.diff(R.indptr)[cols[p]]
+    pos = _ranges(R.indptr[cols[p]], counts)
+    p = np.repeat(p, counts)
+    i = np.repeat(i, counts)
+    j = R.indices[pos]
+    w = np.repeat(w, counts) * R.data[pos]
+    keep = w != 0
+    return i[keep], j[keep], p[keep], w[keep]
+
+
+def _ranges(starts, counts):
+    """ Concatenation of np.arange(s, s + c) for all starts s, counts c """
+    total = counts.sum()
+    offsets = np.cumsum(counts) - counts
+    return np.arange(total) - np.repeat(offsets, counts) + \
+        np.repeat(starts, counts)
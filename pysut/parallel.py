@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Thread-parallel evaluation of the constructs
+
+The sparse products of the constructs run in a single thread, while dense
+products (numpy.dot) use all the threads of the BLAS library. In the
+thread mode, independent parts of a construct are evaluated concurrently
+in a pool of threads:
+
+    + the allocation of U and F (see pySUT.stacked_product), split into
+      blocks of rows balanced by their number of non-zeros
+    + the application of alternative technologies to U and F in aac_agg,
+      split into blocks of rows
+    + the three normalizations of psc_agg
+
+scipy releases the GIL in its sparse products, so that the threads run in
+parallel. The mode is opt-in, for a block of code:
+
+    >>> with parallel.threads(4):
+    ...     sut.psc_agg()
+
+To avoid oversubscription, the BLAS library is limited to cpu_count //
+workers threads within the block (or blas_threads). The limit is set with
+threadpoolctl, if installed, and applies to the whole process (threads of
+the pool and the calling thread), as BLAS libraries do not have a limit per
+thread. Without threadpoolctl (pip install pysut[threads]), the BLAS
+threads are not limited, with a warning if blas_threads is given.
+
+Results are the same as without the thread mode, up to the rounding of
+sums split over blocks. Peak allocations recorded by pysut.instrument mix
+the allocations of concurrent phases.
+
+dependencies:
+    numpy >= 1.9
+    scipy >= 0.14
+    threadpoolctl (optional, to limit BLAS threads)
+
+"""
+
+from __future__ import division, print_function
+import functools
+import logging
+import os
+import threading
+import warnings
+
+import numpy as np
+from scipy import sparse as sp
+
+from . import instrument
+
+_pool = None     # ThreadPoolExecutor of the thread mode, see threads()
+_workers = 1
+_local = threading.local()  # marks the threads of the pool
+
+
+def enabled():
+    """ True if the thread mode is on and the caller is not a worker """
+    return _pool is not None and not getattr(_local, 'worker', False)
+
+
+def workers():
+    """ Number of threads of the thread mode (1 if it is off) """
+    return _workers if enabled() else 1
+
+
+def blas_control():
+    """ threadpoolctl.threadpool_limits, or None if not installed """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:  # optional: BLAS threads are then not limited
+        return None
+    return threadpool_limits
+
+
+def run(*functions):
+    """ Results of functions without arguments, evaluated concurrently
+
+    Evaluated in order in the calling thread if the thread mode is off, or
+    if called from a worker (no nested parallelism). Exceptions are raised
+    in the calling thread.
+    """
+    if not enabled() or len(functions) < 2:
+        return [f() for f in functions]
+    construct = instrument._current_construct()
+    futures = [_pool.submit(_call, f, construct, k)
+               for k, f in enumerate(functions)]
+    return [future.result() for future in futures]
+
+
+def map_rows(function, X):
+    """ function(X), evaluated concurrently on blocks of rows of X
+
+    function must act row by row (row i of its result depends only on row i
+    of X, as for a product X * B) and return a dense array or sparse matrix.
+    The results of the blocks are stacked back. Blocks of csr matrices have
+    about the same number of non-zeros.
+    """
+    rows = X.shape[0]
+    n = min(workers(), rows)
+    if n < 2:
+        return function(X)
+    if sp.isspmatrix_csr(X):
+        bounds = np.searchsorted(X.indptr, np.linspace(0, X.nnz, n + 1))
+        bounds[0], bounds[-1] = 0, rows
+        bounds = np.unique(bounds)
+    else:
+        bounds = np.linspace(0, rows, n + 1).astype(int)
+    results = run(*[functools.partial(function, X[a:b])
+                    for a, b in zip(bounds[:-1], bounds[1:])])
+    if any(sp.issparse(R) for R in results):
+        return sp.vstack(results, format=results[0].format)
+    return np.vstack(results)
+
+
+class Threads(object):
+
+    """ Context manager of the thread mode, see threads() """
+
+    def __init__(self, workers=None, blas_threads=None):
+        cpus = os.cpu_count() or 1
+        self.workers = cpus if workers is None else int(workers)
+        if self.workers < 1:
+            raise ValueError('Error: the number of workers must be positive.')
+        self._requested = blas_threads is not None
+        self.blas_threads = blas_threads
+        if blas_threads is None:
+            self.blas_threads = max(1, cpus // self.workers)
+        self._limits = None
+
+    def __enter__(self):
+        global _pool, _workers
+        threadpool_limits = blas_control()
+        if threadpool_limits is not None:
+            self._limits = threadpool_limits(limits=self.blas_threads,
+                                             user_api='blas')
+        elif self._requested:
+            warnings.warn('threadpoolctl is not installed: the number of BLAS'
+                          ' threads cannot be limited to {}.'
+                          .format(self.blas_threads), RuntimeWarning)
+        else:
+            logging.debug('threadpoolctl is not installed: BLAS threads are'
+                          ' not limited.')
+        self._previous = (_pool, _workers)
+        self._pool = None
+        if self.workers > 1:
+            # Imported here, to keep the import of pysut light
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(self.workers)
+        _pool, _workers = self._pool, self.workers
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _pool, _workers
+        _pool, _workers = self._previous
+        if self._pool is not None:
+            self._pool.shutdown()
+        if self._limits is not None:
+            self._limits.restore_original_limits()
+            self._limits = None
+        return False
+
+
+def threads(workers=None, blas_threads=None):
+    """ Context manager evaluating constructs in a pool of threads
+
+    Args
+    ----
+    workers:      number of threads (default: number of CPUs); 1 evaluates
+                  everything in the calling thread, with the BLAS limit
+    blas_threads: number of BLAS threads within the block (default:
+                  number of CPUs // workers); requires threadpoolctl,
+                  without it a RuntimeWarning is issued if given
+
+    Returns
+    -------
+    Threads, with attributes workers and blas_threads
+    """
+    return Threads(workers, blas_threads)
+
+
+def _call(function, construct, index):
+    """ function() in a worker, as a phase of construct """
+    _local.worker = True
+    try:
+        with instrument.phase('worker', construct, worker=index):
+            return function()
+    finally:
+        _local.worker = False
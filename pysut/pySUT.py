@@ -24,10 +24,15 @@ Repository for this class, documentation, and tutorials: https://github.com/stef
 """
 
 from __future__ import division, print_function
+import copy
+import functools
 import logging
+from timeit import default_timer
 import numpy as np
 from scipy import sparse as sp
-from scipy.sparse import linalg as sl
+
+from . import instrument
+from . import parallel
 
 
 class SupplyUseTable(object):
@@ -42,10 +47,21 @@ class SupplyUseTable(object):
     F : Extensions: type by industry
     FY: Extensions: type by end-use category
     TL: Trade link (for MRIO models)
+    C : Characterization matrix: impact by extension type (optional)
+        + if present, the constructs allocate C F instead of F, and the
+          footprints use C FY: S and footprints are in impact space, with
+          much fewer rows than F
+        + with keep_stressors=True, both F and C F are allocated, stacked
+          (stressors first)
+        + see self.characterize, self.F_alloc and self.FY_alloc
     l_pro: Labels of products
     l_ind: Labels of industries
     l_ext: Labels of extensions
-
+    l_imp: Labels of impacts (rows of C)
+        + one row per entry, one column per label level (by convention
+          region first, then name, for multiregional SUT)
+        + indexed for fast label-based selection, see self.pro_index,
+          self.select_products and self.sub_table
 
     unit : Unit for each row of V,U, and y (product unit)
     version : string
@@ -55,6 +71,17 @@ class SupplyUseTable(object):
     name : string, optional
         Name of the SUT, default is 'SUT'
     regions: Number of regions, for multiregional SUT
+    dtype : Storage precision of the flow tables V, U, Y, F and FY, e.g.
+        np.float32 to halve their memory (default None: keep as given).
+        + sums and normalizations are accumulated in float64
+        + construct outputs are returned in this dtype
+        + see self.set_precision, self.astype and self.precision_report
+
+    Derived quantities (V_bar, V_tild, F_alloc, label indices, Leontief
+    systems, ...) are cached until the tables they depend on are
+    re-assigned (self.V = V_new). Edits of the arrays in place
+    (self.V[0, 1] = x, or through a region_view) are not detected: call
+    self.clear_cache() after them.
 
     E_bar : Mapping of primary production
         + product-by-industry matrix of 0 or 1
@@ -88,12 +115,23 @@ class SupplyUseTable(object):
         + Can be automatically generated by self.build_mr_Gamma for simple,
           multi-regional cases
 
+    keep_allocations: keep the allocation of extensions of each construct
+        run, so that self.extensions reallocates other extensions without
+        running the construct again (default False: nothing is kept)
+        + the kept operators (e.g. V^-1 for ctc) take memory until
+          self.clear_allocations() or self.clear_cache() is called
+        + they are valid until U, V, E_bar, Xi, PHI, PSI or Gamma are
+          re-assigned; call self.clear_allocations() after editing them in
+          place
+
     """
 
 
     def __init__(self, V=None, U=None, Y=None, F=None, FY=None, TL=None,
                  unit=None, version=None, year=None, name='SUT', regions=1,
-                 E_bar=None, Xi=None, PHI=None, PSI=None, Gamma=None):
+                 E_bar=None, Xi=None, PHI=None, PSI=None, Gamma=None,
+                 dtype=None, C=None, keep_stressors=False,
+                 keep_allocations=False):
         """ Basic initialisation and dimension check methods """
 
         self.V = V          # optional
@@ -105,6 +143,20 @@ class SupplyUseTable(object):
         self.l_pro = None
         self.l_ind = None
         self.l_ext = None
+        self.l_imp = None
+
+        # Characterization of extensions, see self.characterize
+        self._check_characterization(C)
+        self.C = C
+        self.keep_stressors = keep_stressors
+
+        # Allocations of extensions of the constructs, see self.extensions
+        self.keep_allocations = keep_allocations
+
+        # Positions kept by self.remove_products_industries(..., drop=True),
+        # as boolean masks over the original products and industries
+        self.kept_products = None
+        self.kept_industries = None
 
         self.name = name  # optional
         self.regions = regions # Number of regions, for multiregional SUT
@@ -118,62 +170,43 @@ class SupplyUseTable(object):
         self.PSI = PSI
         self.Gamma = Gamma
 
+        self._cache = {}  # derived quantities, see self._cached()
+
+        self.dtype = None
+        if dtype is not None:
+            self.set_precision(dtype)
+
     def return_version_info(self):
         return str('Class SupplyUseTable. Version 1.1. Last change: May 9th, 2015.  Check https://github.com/stefanpauliuk/pySUT for latest version.')
 
     def dimension_check(self):
         """ This method checks which variables are present and checks whether data types and dimensions match
+
+        Works on dense and sparse tables. See also self.diagnostics.
         """
         # Compile a little report on the presence and dimensions of the elements in the SUT
         DimReport = str('<br><b> Checking dimensions of SUT structure</b><br>')
-        if self.V is not None:
-            DimReport += str('Supply table is present with ' + str(len(self.V)) +
-                             ' rows (products) and ' + str(len(self.V[0])) + ' columns (industries).<br>')
-        else:
-            DimReport += str('Supply table is not present.<br>')
-        if self.U is not None:
-            DimReport += str('Use table is present with ' + str(len(self.U)) +
-                             ' rows (products) and ' + str(len(self.U[0])) + ' columns (industries).<br>')
-        else:
-            DimReport += str('Use table is not present.<br>')
-        if self.Y is not None:
-            if len(self.Y.shape) == 1:  # if Y is a true vector
-                DimReport += str('Final demand is present with ' + str(len(self.Y)) +
-                                 ' rows (products) and 1 column (FD categories).<br>')
+        for X, title, verb, rows, cols in (
+                (self.V, 'Supply table', 'is', 'products', 'industries'),
+                (self.U, 'Use table', 'is', 'products', 'industries'),
+                (self.Y, 'Final demand', 'is', 'products', 'FD categories'),
+                (self.F, 'Industry extensions', 'are', 'stressors', 'industries'),
+                (self.FY, 'FD extensions', 'are', 'stressors', 'FD categories'),
+                (self.TL, 'Trade link', 'is', 'products', 'regions')):
+            if X is None:
+                DimReport += '{} {} not present.<br>'.format(title, verb)
+            elif len(X.shape) == 1:  # if X is a true vector
+                DimReport += '{} {} present with {} rows ({}) and 1 column ({}).<br>'.format(
+                    title, verb, X.shape[0], rows, cols)
             else:
-                DimReport += str('Final demand is present with ' + str(len(self.Y)) +
-                                 ' rows (products) and ' + str(len(self.Y[0])) + ' columns (FD categories).<br>')
-        else:
-            DimReport += str('Final demand is not present.<br>')
-        if self.F is not None:
-            DimReport += str('Industry extensions are present with ' + str(len(self.F)) +
-                             ' rows (stressors) and ' + str(len(self.F[0])) + ' columns (industries).<br>')
-        else:
-            DimReport += str('Industry extensions are not present.<br>')
-        if self.FY is not None:
-            DimReport += str('FD extensions are present with ' + str(len(self.FY)) +
-                             ' rows (stressors) and ' + str(len(self.FY[0])) + ' columns (FD categories).<br>')
-        else:
-            DimReport += str('FD extensions are not present.<br>')
-        if self.TL is not None:
-            DimReport += str('Trade link is present with ' + str(len(self.TL)) +
-                             ' rows (products) and ' + str(len(self.TL[0])) + ' columns (regions).<br>')
-        else:
-            DimReport += str('Trade link is not present.<br>')
+                DimReport += '{} {} present with {} rows ({}) and {} columns ({}).<br>'.format(
+                    title, verb, X.shape[0], rows, X.shape[1], cols)
 
         # for most operations, especially the constructs, U and V are required to
         # be present and have correct dimensions. We check for this:
-        if self.U is not None:
-            if self.V is not None:
-                if len(self.V) == len(self.U):
-                    if len(self.V[0]) == len(self.U[0]):
-                        StatusFlag = 1  # V and U have proper dimensions
-                    else:
-                        StatusFlag = 0
-                else:
-                    StatusFlag = 0
-            else:
-                StatusFlag = 0
+        if self.U is not None and self.V is not None and \
+                self.U.shape == self.V.shape:
+            StatusFlag = 1  # V and U have proper dimensions
         else:
             StatusFlag = 0
 
@@ -183,36 +216,116 @@ class SupplyUseTable(object):
         """ This method computes total industrial supply and total industrial use, and compares the two
         ResultVector = U.e */ V.e
         """
-        return self.U.sum(axis=1) / self.V.sum(axis=1)
+        return _sums(self.U, 1) / _sums(self.V, 1)
 
     def supply_diag_check(self):
         """ to apply the BTC, we need to have a non-zero diagonal for each producing sector.
-        Determine which sectors produce: """
-        SupplySum_i = self.g
-        SupplySum_p = self.q
-        SupplyDiag = self.V.diagonal()
-        SupplyDiag_Eval = np.zeros((self.V.shape[0], 7))
-        for m in range(0, self.V.shape[0]):
-            if SupplySum_p[m] != 0:
-                if SupplySum_i[m] != 0:
-                    if SupplyDiag[m] != 0:
-                        SupplyDiag_Eval[m, 0] = 1  # Non-zero supply by main producer. Normal situation, OK
-                    else:
-                        SupplyDiag_Eval[m, 1] = 1  # No supply by apparent main producer, problem
-                else:
-                    # Product only produced by other sectors, this sector is empty
-                    SupplyDiag_Eval[m, 2] = 1
-            else:
-                if SupplySum_i[m] != 0:
-                    # product not produced, apparent main sector produces only other products
-                    SupplyDiag_Eval[m, 3] = 1
-                else:
-                    SupplyDiag_Eval[m, 4] = 1  # Product not produced and main sector is empty
-            SupplyDiag_Eval[m, 5] = SupplySum_p[m]
-            SupplyDiag_Eval[m, 6] = SupplySum_i[m]
+        Determine which sectors produce.
 
+        Returns an array [com, 7]: one of the first five columns is 1 for
+        each product (see _diag_status), followed by total product output
+        and total output of the apparent main producer (same position).
+        """
+        SupplySum_p = _sums(self.V, 1)
+        SupplySum_i = _sums(self.V, 0)
+        status = _diag_status(SupplySum_p, SupplySum_i, self.V.diagonal())
+        SupplyDiag_Eval = np.zeros((self.V.shape[0], 7))
+        SupplyDiag_Eval[np.arange(len(status)), status] = 1
+        SupplyDiag_Eval[:, 5] = SupplySum_p
+        SupplyDiag_Eval[:, 6] = SupplySum_i
         return SupplyDiag_Eval
 
+    def diagnostics(self):
+        """ Vectorized validation of the SUT, for dense and sparse tables
+
+        One pass over the tables, with no per-product loops and no dense
+        intermediates for sparse tables.
+
+        Returns
+        -------
+        dict of structured arrays:
+
+        'tables':     one record per table present (V, U, Y, F, FY, TL, E_bar)
+                      table, rows, cols, sparse, nnz, nan (number of NaN),
+                      negative (number of negative entries), consistent
+                      (dimensions agree with V and with the other tables)
+        'products':   one record per product (row of V)
+                      q (total output), use (intermediate use), final_demand,
+                      balance (q - use - final_demand, NaN if no Y),
+                      producers (number of supplying industries),
+                      diag_status (see _diag_status, -1 if V is not square)
+        'industries': one record per industry (column of V)
+                      g (total output), products (number of supplied
+                      products), secondary (number of secondary products,
+                      -1 if E_bar is unknown and V is not square)
+
+        """
+        V = self.V
+        com, ind = V.shape
+        fd = None if self.Y is None else (
+            1 if self.Y.ndim == 1 else self.Y.shape[1])
+        ext = None if self.F is None else self.F.shape[0]
+        expected = {'V': (com, ind), 'U': (com, ind), 'Y': (com, fd),
+                    'F': (ext, ind), 'FY': (ext, fd),
+                    'TL': (com, self.regions), 'E_bar': (com, ind)}
+
+        tables = []
+        for name in ('V', 'U', 'Y', 'F', 'FY', 'TL', 'E_bar'):
+            X = getattr(self, name)
+            if X is None:
+                continue
+            shape = X.shape if X.ndim == 2 else X.shape + (1,)
+            data = X.data if sp.issparse(X) else X
+            tables.append((name, shape[0], shape[1], sp.issparse(X),
+                           _count_nonzero(X),
+                           np.count_nonzero(np.isnan(data)),
+                           np.count_nonzero(data < 0),
+                           shape == expected[name]))
+        tables = np.array(tables, dtype=[
+            ('table', 'U5'), ('rows', np.intp), ('cols', np.intp),
+            ('sparse', bool), ('nnz', np.intp), ('nan', np.intp),
+            ('negative', np.intp), ('consistent', bool)])
+
+        products = np.zeros(com, dtype=[
+            ('q', np.float64), ('use', np.float64),
+            ('final_demand', np.float64), ('balance', np.float64),
+            ('producers', np.intp), ('diag_status', np.int8)])
+        industries = np.zeros(ind, dtype=[
+            ('g', np.float64), ('products', np.intp), ('secondary', np.intp)])
+
+        q, g = _sums(V, 1), _sums(V, 0)
+        products['q'] = q
+        products['producers'] = _count_nonzero(V, 1)
+        if self.U is not None:
+            products['use'] = _sums(self.U, 1)
+        if self.Y is not None:
+            products['final_demand'] = (self.Y if self.Y.ndim == 1
+                                        else _sums(self.Y, 1))
+            products['balance'] = q - products['use'] - \
+                products['final_demand']
+        else:
+            products['balance'] = np.nan
+        if com == ind:
+            products['diag_status'] = _diag_status(q, g, V.diagonal())
+        else:
+            products['diag_status'] = -1
+
+        industries['g'] = g
+        industries['products'] = _count_nonzero(V, 0)
+        if self.E_bar is not None:
+            primary = (V.multiply(self.E_bar) if sp.issparse(V)
+                       else V * self.E_bar)
+            industries['secondary'] = industries['products'] - \
+                _count_nonzero(primary, 0)
+        elif com == ind:
+            industries['secondary'] = industries['products'] - \
+                (V.diagonal() != 0)
+        else:
+            industries['secondary'] = -1
+
+        return {'tables': tables, 'products': products,
+                'industries': industries}
+
     def _check_secondary_prod(self, full_debug=False):
         """ Diagnostic of primary and secondary productions
 
@@ -221,31 +334,48 @@ class SupplyUseTable(object):
         productions that are of smaller magnitude than their associated
         secondary productions.
 
+        Primary and secondary maxima of each industry are read in one pass
+        over the stored entries of V (dense or sparse), without building
+        V_bar and V_tild.
+
         Args:
         -----
-        * full_debug: Output a table to further examine a summary of "strange"
-          primary-secondary coproduction patterns
+        * full_debug: Also log each industry with a "strange"
+          primary-secondary coproduction pattern, with labels if present
 
         Returns:
         -------
-        * strange: None, or an array of secondary productions that surpass
-          their associated primary production in magnitude.
+        * strange: structured array with one record per industry whose
+          largest secondary production surpasses its largest primary
+          production: industry, main_product, main_amount, max_product,
+          max_amount (main_product is -1 if the industry has no primary
+          production). Sort or filter it like any numpy array, e.g.
+          np.sort(strange, order='max_amount').
 
         """
+        V = sp.coo_matrix(self.V)
+        if self.E_bar is None:
+            if V.shape[0] != V.shape[1]:
+                raise ValueError('Error: E_bar is needed to tell primary from'
+                                 ' secondary production of a rectangular'
+                                 ' supply table.')
+            primary = V.row == V.col
+            offdiag_tot = 0
+            exclus = np.zeros(V.shape[0], dtype=bool)
+        else:
+            E_bar = self.E_bar
+            primary = np.asarray(E_bar[V.row, V.col]).reshape(-1) != 0
+            offdiag_tot = 0
+            if E_bar.shape[0] == E_bar.shape[1]:
+                offdiag_tot = E_bar.sum() - E_bar.diagonal().sum()
+            exclus = (_sums(E_bar, 1) == 0) & (_sums(V, 1) != 0)
 
-        # Default
-        strange = None
         # check how many off diagonal primary poducts we have
-        if self.E_bar.shape[0] == self.E_bar.shape[1]:
-            offdiag = self.E_bar - ddiag(self.E_bar)
-
-            offdiag_tot = np.sum(offdiag)
-            if  offdiag_tot > 0:
-                msg = "Found {} off-diagonal primary productions"
-                logging.info(msg.format(offdiag_tot))
+        if offdiag_tot > 0:
+            msg = "Found {} off-diagonal primary productions"
+            logging.info(msg.format(offdiag_tot))
 
         # Check how many exclusive secondary products
-        exclus = (self.E_bar.sum(1) == 0) & (self.q != 0)
         exclus_tot = np.sum(exclus)
         if exclus_tot > 0:
             msg = "Found {} exclusive secondary products."
@@ -253,32 +383,39 @@ class SupplyUseTable(object):
 
         # Check how many secondary products are produced in greater amount than
         # their associated primary product
-        big_sec = np.max(self.V_bar, 0) < np.max(self.V_tild, 0)
-        big_sec_tot = np.sum(big_sec)
-        if big_sec_tot > 0:
+        main_product, main_amount = _column_max(
+            V.row[primary], V.col[primary], V.data[primary], V.shape[1])
+        max_product, max_amount = _column_max(
+            V.row[~primary], V.col[~primary], V.data[~primary], V.shape[1])
+        big_sec = np.flatnonzero(main_amount < max_amount)
+
+        strange = np.zeros(len(big_sec), dtype=[
+            ('industry', np.intp), ('main_product', np.intp),
+            ('main_amount', np.float64), ('max_product', np.intp),
+            ('max_amount', np.float64)])
+        strange['industry'] = big_sec
+        strange['main_product'] = main_product[big_sec]
+        strange['main_amount'] = main_amount[big_sec]
+        strange['max_product'] = max_product[big_sec]
+        strange['max_amount'] = max_amount[big_sec]
+
+        if len(big_sec) > 0:
             msg = ("Found {} secondary products that are produced in greater"
                    "amount than their primary product")
-            logging.info(msg.format(big_sec_tot))
+            logging.info(msg.format(len(big_sec)))
 
             if full_debug:
-                bo_bar = np.argmax(self.V_bar[:, big_sec], axis=0)
-                bo_all = np.argmax(self.V[:, big_sec], axis=0)
-                header = np.array(["Country",
-                                   "Industry",
-                                   "main product",
-                                   "amount",
-                                   "max product",
-                                   "amount"])
-                strange = np.row_stack([header,
-                                np.column_stack([self.l_ind[big_sec, 0:2],
-                                                   self.l_pro[bo_bar,1],
-                                                   self.V_bar[bo_bar, big_sec],
-                                                   self.l_pro[bo_all,1],
-                                                   self.V[bo_all, big_sec]])])
+                for row in strange:
+                    logging.info("Industry {}: main product {} ({}), max"
+                                 " product {} ({})".format(
+                                     self._label(self.l_ind, row['industry']),
+                                     self._label(self.l_pro, row['main_product']),
+                                     row['main_amount'],
+                                     self._label(self.l_pro, row['max_product']),
+                                     row['max_amount']))
 
         return strange
 
-
             # q_bar_glo = aggregate_regions_vectorised(
             #                         self.V_bar(), regions=self.regions).sum(1)
             # q_glo = aggregate_regions_vectorised(
@@ -294,6 +431,13 @@ class SupplyUseTable(object):
 
 
 
+    @staticmethod
+    def _label(labels, position):
+        """ Label of a product or industry for messages, or its position """
+        if labels is None or position < 0:
+            return position
+        return tuple(np.atleast_1d(labels[position]))
+
     """
     Basic computations, row sum, col sum, etc.
     """
@@ -301,30 +445,100 @@ class SupplyUseTable(object):
     @property
     def q(self):
         """ Vector of total product output, calculate from V, as property"""
-        return self.V.sum(axis=1)
+        return self.V.sum(axis=1, dtype=_acc_dtype(self.V))
 
     @property
     def g(self):
         """ Vector of total industry output, calculate from V, as property"""
-        return self.V.sum(axis=0)
+        return self.V.sum(axis=0, dtype=_acc_dtype(self.V))
 
     @property
     def V_bar(self):
         """
         Table of primary production, calculated from V and E_bar, as property
+
+        Cached until V or E_bar are re-assigned (see self._cached); call
+        self.clear_cache() after editing V or E_bar in place. Treat the
+        returned array as read-only.
         """
-        if self.E_bar is None and (self.V.shape[0] == self.V.shape[1]):
-            logging.warning("Assuming primary production is on diagonal")
-            return ddiag(self.V)
-        else:
-            return self.V * self.E_bar
+        def build():
+            if self.E_bar is None and (self.V.shape[0] == self.V.shape[1]):
+                logging.warning("Assuming primary production is on diagonal")
+                return ddiag(self.V)
+            else:
+                return self.V * self.E_bar
+        return self._cached('V_bar', (self.V, self.E_bar), build)
 
     @property
     def V_tild(self):
         """
         Table of secondary production, calculated from V, as property
+
+        Cached until V or E_bar are re-assigned, or self.clear_cache() is
+        called; treat as read-only.
+        """
+        return self._cached('V_tild', (self.V, self.E_bar),
+                            lambda: self.V - self.V_bar)
+
+    @property
+    def F_alloc(self):
+        """
+        Extensions of industries as allocated by the constructs, as property:
+        F, or C F, or both stacked if keep_stressors (see self.characterize)
+
+        Cached until F, C or keep_stressors are re-assigned.
+        """
+        return self._cached('F_alloc', (self.F, self.C, self.keep_stressors),
+                            lambda: self.characterized(self.F))
+
+    @property
+    def FY_alloc(self):
+        """ Extensions of final demand matching F_alloc, as property """
+        return self._cached('FY_alloc', (self.FY, self.C, self.keep_stressors),
+                            lambda: self.characterized(self.FY))
+
+    def characterize(self, C, labels=None, keep_stressors=False):
+        """ Allocate impacts C F in the constructs, instead of extensions F
+
+        With few impact categories and many stressors, this makes the
+        allocation of extensions in all constructs (including the
+        alternative technologies of aac_agg) correspondingly cheaper.
+
+        Args
+        ----
+        C :      characterization matrix [impact, ext], dense or sparse, or
+                 None to allocate F again
+        labels : labels of the impacts (l_imp, optional)
+        keep_stressors : allocate both F and C F, stacked; S then has
+                 ext + impact rows
+
         """
-        return self.V - self.V_bar
+        self._check_characterization(C)
+        self.C = C
+        self.l_imp = labels
+        self.keep_stressors = keep_stressors
+
+    def _check_characterization(self, C):
+        """ Raise a ValueError if C [impact, ext] does not match F """
+        if C is None:
+            return
+        if np.ndim(C) != 2:
+            raise ValueError('Error: C must be a 2-dimensional matrix'
+                             ' [impact, ext].')
+        if self.F is not None and C.shape[1] != self.F.shape[0]:
+            raise ValueError('Error: C has {} columns, F has {} rows.'
+                             .format(C.shape[1], self.F.shape[0]))
+
+    def characterized(self, X):
+        """ Extension rows X [ext, ...] as allocated: X, C X or both stacked """
+        if self.C is None or X is None:
+            return X
+        CX = _mul(self.C, X)
+        if not self.keep_stressors:
+            return _dense(CX) if not sp.issparse(X) else CX
+        if sp.issparse(X) or sp.issparse(CX):
+            return sp.vstack([X, CX], format='csr')
+        return np.vstack([X, CX])
 
 
     def g_V(self):
@@ -337,39 +551,444 @@ class SupplyUseTable(object):
         logging.warning("Planned deprecation of q_V(), use property 'q' instead")
         return self.q
 
-    def return_diag_V(self):
-        """ Returns the diagonal of the supply table in matrix form : V^              """
+    def return_diag_V(self, form='dense'):
+        """ Returns the diagonal of the supply table in matrix form : V^
+
+        Args
+        ----
+        form: 'dense' for a dense [com, com] array (default), 'dia' for a
+              sparse dia_matrix, or 'vector' for the diagonal as 1-d array
+
+        Works for dense and sparse V.
+        """
         if self.V.shape[0] != self.V.shape[1]:
             raise ValueError(
                 'Error: Supply table is not square, there is no proper diagonal of that matrix.')
-        else:
-            Result_Array = np.zeros((self.V.shape[0], self.V.shape[0]))
-            for m in range(0, self.V.shape[0]):
-                Result_Array[m, m] = self.V[m, m]
-            return Result_Array
-
-    def return_offdiag_V(self):
-        """   Returns the off-diagonal of the supply table in matrix form : V_offdiag              """
+        d = np.asarray(self.V.diagonal())
+        if form == 'vector':
+            return d
+        elif form == 'dia':
+            return sp.dia_matrix((d[None, :], [0]), shape=self.V.shape)
+        elif form == 'dense':
+            return np.diag(d)
+        raise ValueError("Error: form must be 'dense', 'dia' or 'vector'.")
+
+    def return_offdiag_V(self, inplace=False):
+        """   Returns the off-diagonal of the supply table in matrix form : V_offdiag
+
+        Dense or sparse, like V. With inplace=True, the diagonal is removed
+        from V itself (no copy) and V is returned.
+        """
         if self.V.shape[0] != self.V.shape[1]:
             raise ValueError(
                 'Error: Supply table is not square, there is no proper diagonal of that matrix.')
+        if sp.issparse(self.V):
+            # Drop the stored diagonal entries, no change of sparsity structure
+            V = self.V.tocoo()
+            keep = V.row != V.col
+            Result_Array = sp.coo_matrix(
+                (V.data[keep], (V.row[keep], V.col[keep])),
+                shape=V.shape).asformat(self.V.format)
+            if inplace:
+                self.V = Result_Array
         else:
-            Result_Array = self.V.copy()
-            for m in range(0, self.V.shape[0]):
-                Result_Array[m, m] = 0
-            return Result_Array
+            Result_Array = self.V if inplace else self.V.copy()
+            np.fill_diagonal(Result_Array, 0)
+        if inplace:
+            self.clear_cache()
+        return Result_Array
 
     def market_balance(self):
         """ Returns the market balance of the SUT."""
         if self.Y is not None:
             if len(self.Y.shape) == 1:  # if Y is a true vector
-                return self.V.sum(axis=1) - self.U.sum(axis=1) - self.Y
+                return _sums(self.V, 1) - _sums(self.U, 1) - self.Y
             else:  # if Y is an array
-                return self.V.sum(axis=1) - self.U.sum(axis=1) - self.Y.sum(axis=1)
+                return _sums(self.V, 1) - _sums(self.U, 1) - _sums(self.Y, 1)
         else:
             raise ValueError(
                 'Error: There is no final demand; the market balance cannot be computed.')
 
+    def _cached(self, key, deps, build):
+        """ Return a derived quantity, rebuilding it only if its inputs changed
+
+        The cache entry is valid as long as each object in deps is the very
+        same object (identity, not equality) as when the entry was built.
+        Re-assigning an attribute (e.g. self.V = V_new) therefore invalidates
+        all quantities derived from it. In-place modifications cannot be
+        detected this way: call self.clear_cache() after editing arrays in
+        place.
+
+        Args
+        ----
+        key:   name of the cached quantity
+        deps:  tuple of objects the quantity is derived from
+        build: function without arguments that computes the quantity
+
+        """
+        entry = self._cache.get(key)
+        if entry is not None and len(entry[0]) == len(deps) and \
+                all(a is b for a, b in zip(entry[0], deps)):
+            return entry[1]
+        value = build()
+        self._cache[key] = (deps, value)
+        return value
+
+    def clear_cache(self, keep=()):
+        """ Drop all cached derived quantities (V_bar, label indices, etc.)
+
+        Needed after in-place modifications of the tables or labels.
+
+        Args
+        ----
+        keep: keys of cached quantities to keep, e.g. ('leontief',)
+        """
+        for key in list(self._cache):
+            if key not in keep:
+                del self._cache[key]
+
+    """
+    Storage precision
+    """
+
+    def set_precision(self, dtype):
+        """ Store the flow tables (V, U, Y, F, FY) in the given dtype
+
+        With a reduced precision (e.g. np.float32), the tables take half the
+        memory. Sums and normalizations are still accumulated in float64,
+        and the sparse products of the constructs are computed in float64;
+        only the stored tables and the construct outputs are rounded.
+
+        Args
+        ----
+        dtype: floating point dtype, e.g. np.float32 or np.float64
+
+        """
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'f':
+            raise ValueError('Error: precision must be a floating point dtype,'
+                             ' not {}.'.format(dtype))
+        for name in ('V', 'U', 'Y', 'F', 'FY'):
+            X = getattr(self, name)
+            if X is not None and X.dtype != dtype:
+                setattr(self, name, X.astype(dtype))
+        self.dtype = dtype
+        self.clear_cache()
+
+    def astype(self, dtype):
+        """ Copy of the SUT with flow tables stored in the given dtype
+
+        Tables already in this dtype, labels and all other attributes are
+        shared with this SUT, not copied.
+        """
+        other = copy.copy(self)
+        other._cache = {}
+        other.set_precision(dtype)
+        return other
+
+    def _emit(self, result):
+        """ Cast the floating point arrays of a construct output to self.dtype """
+        if self.dtype is None:
+            return result
+        return tuple(X.astype(self.dtype, copy=False)
+                     if np.issubdtype(X.dtype, np.floating) else X
+                     for X in result)
+
+    """
+    Saving and loading
+    """
+
+    _TABLES = ('V', 'U', 'Y', 'F', 'FY', 'TL', 'E_bar', 'Xi', 'PHI', 'PSI',
+               'Gamma', 'C')
+    _LABELS = ('l_pro', 'l_ind', 'l_ext', 'l_imp')
+    _META = ('name', 'regions', 'unit', 'year', 'version', 'keep_stressors',
+             'keep_allocations')
+
+    def save(self, path, compressed=True):
+        """ Save the tables, labels and metadata of the SUT to an npz file
+
+        Dense and sparse tables are stored as they are (sparse ones by their
+        components), without pickling. Labels are stored column by column,
+        each with its own dtype, so that numeric labels (e.g. years or
+        codes) load as numbers; columns that mix types (or hold None) are
+        stored as strings. Labels load as object arrays of the same shape.
+
+        Args
+        ----
+        path:       file name, '.npz' is appended if missing
+        compressed: compress the file (smaller, slower to write)
+
+        """
+        arrays = {}
+        for name in self._TABLES:
+            X = getattr(self, name)
+            if X is None:
+                continue
+            if sp.issparse(X):
+                X = X.asformat(X.format if X.format in ('csr', 'csc')
+                               else 'csr')
+                arrays[name + '.data'] = X.data
+                arrays[name + '.indices'] = X.indices
+                arrays[name + '.indptr'] = X.indptr
+                arrays[name + '.shape'] = np.array(X.shape)
+                arrays[name + '.format'] = np.array(X.format)
+            else:
+                arrays[name] = np.asarray(X)
+        for name in self._LABELS:
+            labels = getattr(self, name)
+            if labels is None:
+                continue
+            labels = np.asarray(labels, dtype=object)
+            arrays[name + '.shape'] = np.array(labels.shape)
+            columns = labels.reshape(labels.shape[0],
+                                     int(np.prod(labels.shape[1:]))).T
+            for j, column in enumerate(columns):
+                values = column.tolist()
+                stored = np.asarray(values)
+                if stored.dtype == object or \
+                        len(set(type(v) for v in values)) > 1:
+                    stored = np.asarray([str(v) for v in values])
+                arrays['{}.{}'.format(name, j)] = stored
+        for name in self._META:
+            if getattr(self, name) is not None:
+                arrays['meta.' + name] = np.asarray(getattr(self, name))
+        if self.dtype is not None:
+            arrays['meta.dtype'] = np.array(np.dtype(self.dtype).str)
+        (np.savez_compressed if compressed else np.savez)(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """ SupplyUseTable saved with self.save """
+        sut = cls()
+        with np.load(path, allow_pickle=False) as f:
+            keys = set(f.files)
+            for name in cls._TABLES:
+                if name in keys:
+                    setattr(sut, name, f[name])
+                elif name + '.format' in keys:
+                    matrix = getattr(sp, str(f[name + '.format']) + '_matrix')
+                    setattr(sut, name, matrix(
+                        (f[name + '.data'], f[name + '.indices'],
+                         f[name + '.indptr']),
+                        shape=tuple(f[name + '.shape'])))
+            for name in cls._LABELS:
+                if name + '.shape' in keys:
+                    shape = tuple(f[name + '.shape'])
+                    labels = np.empty((shape[0], int(np.prod(shape[1:]))),
+                                      dtype=object)
+                    for j in range(labels.shape[1]):
+                        labels[:, j] = f['{}.{}'.format(name, j)].tolist()
+                    setattr(sut, name, labels.reshape(shape))
+                elif name in keys:  # labels saved as strings
+                    setattr(sut, name, f[name].astype(object))
+            for name in cls._META:
+                if 'meta.' + name in keys:
+                    value = f['meta.' + name]
+                    setattr(sut, name, value.item() if value.ndim == 0
+                            else value)
+            if 'meta.dtype' in keys:
+                sut.dtype = np.dtype(str(f['meta.dtype']))
+        return sut
+
+    """
+    Label index and label-based selection
+    """
+
+    @property
+    def pro_index(self):
+        """ LabelIndex of the product labels l_pro, built once and cached """
+        return self._cached('pro_index', (self.l_pro,),
+                            lambda: LabelIndex(self.l_pro, name='l_pro'))
+
+    @property
+    def ind_index(self):
+        """ LabelIndex of the industry labels l_ind, built once and cached """
+        return self._cached('ind_index', (self.l_ind,),
+                            lambda: LabelIndex(self.l_ind, name='l_ind'))
+
+    @property
+    def ext_index(self):
+        """ LabelIndex of the extension labels l_ext, built once and cached """
+        return self._cached('ext_index', (self.l_ext,),
+                            lambda: LabelIndex(self.l_ext, name='l_ext'))
+
+    @property
+    def alloc_index(self):
+        """ LabelIndex of the rows of F_alloc (and of the S of constructs)
+
+        l_ext, or once characterized l_imp, or both stacked if keep_stressors
+        (see self.characterize), built once and cached
+        """
+        def build():
+            if self.C is None:
+                return LabelIndex(self.l_ext, name='l_ext')
+            if not self.keep_stressors:
+                return LabelIndex(self.l_imp, name='l_imp')
+            l_ext = LabelIndex(self.l_ext, name='l_ext').labels
+            l_imp = LabelIndex(self.l_imp, name='l_imp').labels
+            if l_ext.shape[1] != l_imp.shape[1]:
+                raise ValueError('Error: l_ext and l_imp have different'
+                                 ' numbers of label columns.')
+            return LabelIndex(np.vstack([l_ext, l_imp]))
+        return self._cached('alloc_index', (self.l_ext, self.l_imp, self.C,
+                                            self.keep_stressors), build)
+
+    def select_products(self, **criteria):
+        """ Positions of all products matching the label criteria
+
+        Example: sut.select_products(region='NO', name=['steel', 'iron'])
+
+        Returns
+        -------
+            Sorted integer array of row positions in V, U, Y and TL
+        """
+        return self.pro_index.select(**criteria)
+
+    def select_industries(self, **criteria):
+        """ Positions of all industries matching the label criteria
+
+        Returns
+        -------
+            Sorted integer array of column positions in V, U and F
+        """
+        return self.ind_index.select(**criteria)
+
+    def select_extensions(self, **criteria):
+        """ Positions of all extensions matching the label criteria
+
+        Returns
+        -------
+            Sorted integer array of row positions in F and FY
+        """
+        return self.ext_index.select(**criteria)
+
+    def sub_table(self, name, rows=None, cols=None):
+        """ Select rows and columns of V, U, F or Y by position or by label
+
+        Args
+        ----
+        name: 'V', 'U', 'F' or 'Y'
+        rows: None (all rows), an array of positions, or a dict of label
+              criteria for the row axis (products for V, U, Y; extensions
+              for F)
+        cols: None (all columns), an array of positions, or a dict of label
+              criteria for the column axis (industries for V, U, F). Only
+              positions are accepted for the columns of Y.
+
+        Returns
+        -------
+            The selected block of the table. If both selections are regularly
+            spaced (e.g. one region of a MRIO, or the same product in each
+            region), this is a zero-copy view of the table: modifying it
+            modifies the table. Otherwise, it is a copy.
+
+        """
+        # Label indices, looked up only for selections by label
+        row_index = {'V': 'pro_index', 'U': 'pro_index', 'Y': 'pro_index',
+                     'F': 'ext_index'}
+        col_index = {'V': 'ind_index', 'U': 'ind_index', 'F': 'ind_index'}
+        if name not in row_index:
+            raise ValueError("Error: sub_table only supports V, U, F and Y.")
+        X = getattr(self, name)
+
+        if isinstance(rows, dict):
+            rows = getattr(self, row_index[name]).select(**rows)
+        if isinstance(cols, dict):
+            if name not in col_index:
+                raise ValueError('Error: only positions are accepted for the'
+                                 ' columns of {}.'.format(name))
+            cols = getattr(self, col_index[name]).select(**cols)
+
+        rows = slice(None) if rows is None else _as_slice(rows)
+        cols = slice(None) if cols is None else _as_slice(cols)
+        return _take(X, rows, cols)
+
+    def region_view(self, regions):
+        """ Lightweight SupplyUseTable of one region or a group of regions
+
+        All tables of the returned SUT are selections of the tables of this
+        SUT: products, industries and final demand categories of the chosen
+        regions. For dense tables and a single region or a block of
+        consecutive regions, these are views (no data is copied, and
+        modifications propagate to this SUT). For sparse tables, or
+        scattered regions, only the selected entries are copied.
+
+        Cached derived quantities that are computed element by element
+        (V_bar, V_tild) are passed on to the view instead of being
+        recomputed. Quantities that involve summation over other regions
+        (q, g, constructs) are not: for the view, they only account for
+        flows within the selected regions.
+
+        The view has the settings of this SUT: characterization (C, l_imp,
+        keep_stressors), precision (dtype) and keep_allocations.
+
+        Args
+        ----
+        regions: index (0-based) of a region, list of indices, or slice
+
+        Returns
+        -------
+        SupplyUseTable restricted to the selected regions
+
+        """
+        all_regions = np.arange(self.regions)
+        sel = np.atleast_1d(all_regions[regions])
+
+        def positions(size):
+            """ Selected positions along an axis of given size """
+            if size % self.regions:
+                raise ValueError('Error: dimension of length {} is not a true'
+                                 ' multiple of the number of regions.'
+                                 .format(size))
+            per_region = size // self.regions
+            pos = (sel[:, None] * per_region + np.arange(per_region)).ravel()
+            return _as_slice(pos)
+
+        pro = positions(self.V.shape[0])
+        ind = positions(self.V.shape[1])
+        reg = _as_slice(sel)
+        fd = None
+        if self.Y is not None and self.Y.ndim == 2:
+            fd = positions(self.Y.shape[1])
+        everything = slice(None)
+
+        def take(X, rows, cols):
+            if X is None:
+                return None
+            return _take(X, rows, cols)
+
+        view = SupplyUseTable(
+            V=take(self.V, pro, ind),
+            U=take(self.U, pro, ind),
+            Y=take(self.Y, pro, fd),
+            F=take(self.F, everything, ind),
+            FY=take(self.FY, everything, fd),
+            TL=take(self.TL, pro, reg),
+            unit=(self.unit if np.ndim(self.unit) == 0
+                  else take(np.asarray(self.unit), pro, None)),
+            version=self.version, year=self.year, name=self.name,
+            regions=len(sel),
+            E_bar=take(self.E_bar, pro, ind),
+            Xi=take(self.Xi, pro, pro),
+            PHI=take(self.PHI, ind, pro),
+            PSI=take(self.PSI, pro, ind),
+            Gamma=take(self.Gamma, ind, pro),
+            dtype=self.dtype, C=self.C, keep_stressors=self.keep_stressors,
+            keep_allocations=self.keep_allocations)
+        view.l_pro = take(self.l_pro, pro, None)
+        view.l_ind = take(self.l_ind, ind, None)
+        view.l_ext = self.l_ext
+        view.l_imp = self.l_imp
+
+        # Share element-wise derived quantities, if up to date
+        for key in ('V_bar', 'V_tild'):
+            entry = self._cache.get(key)
+            if entry is not None and entry[0][0] is self.V and \
+                    entry[0][1] is self.E_bar:
+                view._cache[key] = ((view.V, view.E_bar),
+                                    _take(entry[1], pro, ind))
+        return view
+
     """
     Aggregation, removal, and re-arrangement methods
     """
@@ -384,22 +1003,32 @@ class SupplyUseTable(object):
             Rearrange_Matrix[Position_Vector[m].item(0),m] = 1 # place 1 in aggregation matrix at [PositionVector[m],m], so that column m is aggregated with Positionvector[m] in the aggregated matrix
         return Rearrange_Matrix
 
+    def transform(self):
+        """ Start a lazy chain of aggregation, re-sorting and removal steps
+
+        Returns a TransformationChain: steps are recorded, composed into one
+        sparse operator per axis, and applied to all tables at once by its
+        apply() method, e.g.
+
+            sut.transform().aggregate_products(PA).rearrange_products(PR)\
+                .aggregate_regions(AV).apply()
+        """
+        return TransformationChain(self)
+
     def aggregate_rearrange_products(self, PA, PR):
         """ multiplies an aggregation matrix PA from the left to V, U, and Y, rearranges the rows in columns of V, U, and Y according to the sorting matrix PR
         Equations: 
         X_aggregated = PA * X, where X = U, V, or Y (and also TL)
         X_rearranged = PR * X_aggregated * PR', where X = U, V
         Y_rearranged = PR * Y_aggregated (and also TL)
+
+        If PA only selects or re-sorts products (one 1 per row), labels,
+        units and mappings are selected and re-sorted along with the tables,
+        as by rearrange_products; after a true aggregation they are left
+        unchanged.
         """
-        self.V = np.dot(PR, np.dot(np.dot(PA, self.V), PR.transpose()))
-        self.U = np.dot(PR, np.dot(np.dot(PA, self.U), PR.transpose()))
-        if self.Y is not None:
-            self.Y = np.dot(PR, np.dot(PA, self.Y))
-        if self.F is not None:
-            self.F = np.dot(self.F, PR.transpose())
-        # No changes apply to FY
-        if self.TL is not None:
-            self.TL = np.dot(PR, np.dot(PA, self.TL))
+        # Composed into one sparse operator per axis, applied once
+        self.transform().aggregate_rearrange_products(PA, PR).apply()
 
         return 'Products were aggregated. Products and industries were resorted successfully.'
 
@@ -407,14 +1036,14 @@ class SupplyUseTable(object):
         """ multiplies an aggregation matrix PA from the left to V, U, and Y
         Equations: 
         X_aggregated = PA * X, where X = U, V, or Y (and also TL)
+
+        If PA only selects or re-sorts products (one 1 per row), l_pro,
+        units and the product rows of the mappings (E_bar, Xi, PHI, PSI,
+        Gamma) are selected and re-sorted along with the tables; after a
+        true aggregation they are left unchanged.
         """
-        self.V = np.dot(PA, self.V)
-        self.U = np.dot(PA, self.U)
-        if self.Y is not None:
-            self.Y = np.dot(PA, self.Y)
         # No changes apply to F and FY
-        if self.TL is not None:
-            self.TL = np.dot(PA, self.TL)
+        self.transform().aggregate_products(PA).apply()
 
         return 'Products were aggregated.'
 
@@ -423,16 +1052,16 @@ class SupplyUseTable(object):
         Equations:
         X_rearranged = PR * X * PR', where X = U, V
         Y_rearranged = PR * Y (and also TL)
+
+        PR can also be a position vector, as for build_Aggregation_Matrix:
+        PR[m] is the new position of old product (and industry) m.
+        Permutations (position vectors, or sorting
+        matrices detected as such) are applied by indexing, or for sparse
+        tables by relabelling indices, and labels, units and mappings
+        (E_bar, Xi, PHI, PSI, Gamma) are re-sorted consistently.
         """
-        self.V = np.dot(PR, np.dot(self.V, PR.transpose()))
-        self.U = np.dot(PR, np.dot(self.U, PR.transpose()))
-        if self.Y is not None:
-            self.Y = np.dot(PR, self.Y)
-        if self.F is not None:
-            self.F = np.dot(self.F, PR.transpose())
         # No changes apply to FY
-        if self.TL is not None:
-            self.TL = np.dot(PR, self.TL)
+        self.transform().rearrange_products(PR).apply()
 
         return 'Products and industries were resorted successfully.'
 
@@ -455,7 +1084,14 @@ class SupplyUseTable(object):
                         # if the number of final demand categories is a true multiple of the
                         # number of regions
                         if int(FDPerRegion) == FDPerRegion:
-                            print('Everything has proper dimensions. Aggregating SUT.')
+                            # integer sizes, to be used as shapes and indices
+                            ProdsPerRegion = int(ProdsPerRegion)
+                            IndusPerRegion = int(IndusPerRegion)
+                            FDPerRegion = int(FDPerRegion)
+                            instrument.emit(
+                                'aggregate_regions',
+                                status='Everything has proper dimensions.'
+                                       ' Aggregating SUT.')
                             NewSupply = np.zeros(
                                 (ProdsPerRegion * max(AV), IndusPerRegion * max(AV)))
                             NewUse = np.zeros((ProdsPerRegion * max(AV), IndusPerRegion * max(AV)))
@@ -522,10 +1158,21 @@ class SupplyUseTable(object):
             ExitComment = 'Problem with the sorting vector. It needs to contain all natural numbers from 1,2,3,... to its maximum value.'
         return ExitFlag, ExitComment
 
-    def remove_products_industries(self, RPV, RIV):
+    def remove_products_industries(self, RPV, RIV, drop=False):
         """ This method sets the products with the indices in the remove-product-vector RPV to zero.
         Likewise for the industries in the remove-industy-vector RIV
+
+        With drop=True, the products and industries are dropped instead of
+        zeroed: all tables (V, U, Y, TL, F), labels, units and mappings
+        (E_bar, Xi, PHI, PSI, Gamma) shrink, with one gather per table. The
+        original positions of what is left are recorded in
+        self.kept_products and self.kept_industries, and results can be
+        brought back to the original shape with self.restore_removed.
+        Dropping can break the equal size of regions (self.regions).
         """
+        if drop:
+            return self._drop_products_industries(RPV, RIV)
+
         # First: remove products from U, V, and Y:
         for x in RPV:
             self.U[x, :] = 0
@@ -542,9 +1189,72 @@ class SupplyUseTable(object):
             self.U[:, x] = 0
             self.V[:, x] = 0
             self.F[:, x] = 0
+        self.clear_cache()
+
+        return 'Products and industries were removed successfully.'
+
+    def _drop_products_industries(self, RPV, RIV):
+        """ Drop products and industries from all tables, see
+        self.remove_products_industries """
+        com, ind = self.V.shape
+        keep_pro = np.ones(com, dtype=bool)
+        keep_pro[np.asarray(RPV, dtype=np.intp)] = False
+        keep_ind = np.ones(ind, dtype=bool)
+        keep_ind[np.asarray(RIV, dtype=np.intp)] = False
+        pro, ind = np.flatnonzero(keep_pro), np.flatnonzero(keep_ind)
+
+        def take(X, rows, cols):
+            if X is None:
+                return None
+            return _take(X, rows, cols)
+
+        self.V = take(self.V, pro, ind)
+        self.U = take(self.U, pro, ind)
+        self.Y = take(self.Y, pro, None)
+        self.TL = take(self.TL, pro, None)
+        self.F = take(self.F, None, ind)
+        # No changes to FY
+        self.E_bar = take(self.E_bar, pro, ind)
+        self.Xi = take(self.Xi, pro, pro)
+        self.PHI = take(self.PHI, ind, pro)
+        self.PSI = take(self.PSI, pro, ind)
+        self.Gamma = take(self.Gamma, ind, pro)
+        if np.ndim(self.unit) > 0:
+            self.unit = take(np.asarray(self.unit), pro, None)
+        self.l_pro = take(self.l_pro, pro, None)
+        self.l_ind = take(self.l_ind, ind, None)
+
+        # Compose with earlier drops
+        for name, keep in (('kept_products', keep_pro),
+                           ('kept_industries', keep_ind)):
+            mask = getattr(self, name)
+            if mask is None:
+                mask = keep
+            else:
+                mask = mask.copy()
+                mask[mask] = keep
+            setattr(self, name, mask)
+        self.clear_cache()
 
         return 'Products and industries were removed successfully.'
 
+    def restore_removed(self, X, rows=None, cols=None):
+        """ Restore the original size of a result after dropping products or
+        industries (self.remove_products_industries with drop=True)
+
+        Dropped rows and columns are filled with zeros.
+
+        Args
+        ----
+        X :    2-d result, e.g. A of a construct
+        rows : 'products', 'industries' or None (rows not restored)
+        cols : 'products', 'industries' or None (columns not restored)
+
+        """
+        masks = {'products': self.kept_products,
+                 'industries': self.kept_industries, None: None}
+        return restore_size(X, nn_in=masks[rows], nn_out=masks[cols])
+
     """
     Modify tables
     """
@@ -742,24 +1452,42 @@ class SupplyUseTable(object):
 
 
     def add_ones_to_diagonal(self):
-        """ This method adds ones where there is a zero on the diagonal of V. This is needed for simple applications of the BTC."""
+        """ This method adds ones where there is a zero on the diagonal of V. This is needed for simple applications of the BTC.
+
+        Dense V is modified in place; sparse V is replaced by V plus a
+        sparse diagonal of the missing ones.
+        """
         if self.V.shape[0] != self.V.shape[1]:
             return 'Error: Supply table is not square, there is no proper diagonal of that matrix.'
         else:
-            for m in range(0, self.V.shape[0]):
-                if self.V[m, m] == 0:
-                    self.V[m, m] = 1
+            empty = np.asarray(self.V.diagonal()) == 0
+            if sp.issparse(self.V):
+                self.V = (self.V + sp.diags(empty.astype(self.V.dtype))
+                          ).asformat(self.V.format)
+            else:
+                m = np.flatnonzero(empty)
+                self.V[m, m] = 1
+            self.clear_cache()
 
     def clear_non_diag_supply(self):
-        """ This method allows for simple application of the BTC. It removes all sectors that do not produce their respective main product."""
+        """ This method allows for simple application of the BTC. It removes all sectors that do not produce their respective main product.
+
+        Dense V and U are modified in place; sparse ones are replaced by
+        copies without the removed columns (as explicit entries).
+        """
         if self.V.shape[0] != self.V.shape[1]:
             raise ValueError(
                 'Error: Supply table is not square, there is no proper diagonal of that matrix.')
         else:
-            for m in range(0, self.V.shape[0]):
-                if self.V[m, m] == 0:
-                    self.V[:, m] = 0
-                    self.U[:, m] = 0
+            empty = np.asarray(self.V.diagonal()) == 0
+            for name in ('V', 'U'):
+                X = getattr(self, name)
+                if sp.issparse(X):
+                    setattr(self, name, (X * sp.diags((~empty).astype(X.dtype))
+                                         ).asformat(X.format))
+                else:
+                    X[:, empty] = 0
+            self.clear_cache()
 
     """
     Constructs. Below, it is always assumed that U and V are present. For the industrial stressorts, F must be present as well.
@@ -773,23 +1501,30 @@ class SupplyUseTable(object):
         A_BTC = (U - Xi * V_offdiag)V_diag_inv """
         if Xi == None:
             Xi = np.ones((self.V.shape))
-        self.A_BTC = np.dot(
-            (self.U - Xi * self.return_offdiag_V()), np.linalg.inv(self.return_diag_V()))
+        self.A_BTC = (self.U - Xi * self.return_offdiag_V()) * self._diag_V_inv()
         return self.A_BTC
 
     def Build_BTC_Am_matrix(self):
         """ returns use part of BTC construct: Am = UV^-1. Used to re-construct the SUT from the BTC-IO model """
-        return np.dot(self.U, np.linalg.inv(self.return_diag_V()))
+        return self.U * self._diag_V_inv()
 
     def Build_BTC_Ab_matrix(self):
         """ returns use part of BTC construct: Ab = VoffdiagV^-1. Used to re-construct the SUT from the BTC-IO model """
-        return np.dot(self.return_offdiag_V(), np.linalg.inv(self.return_diag_V()))
+        return self.return_offdiag_V() * self._diag_V_inv()
 
     def Build_BTC_S(self):
         """Returns stressor coefficient matrix for the BTC construct."""
-        self.S_BTC = np.dot(self.F, np.linalg.inv(self.return_diag_V()))
+        self.S_BTC = self.F_alloc * self._diag_V_inv()
         return self.S_BTC
 
+    def _diag_V_inv(self):
+        """ Inverse of the diagonal of V, as vector: post-multiplying by it
+        is the same as by np.linalg.inv(self.return_diag_V()) """
+        d = self.return_diag_V(form='vector')
+        if np.any(d == 0):
+            raise np.linalg.LinAlgError('Singular matrix')
+        return 1 / d
+
     """ Commodity technology construct (CTC)"""
 
     def Build_CTC_A_matrix_ixi(self):
@@ -830,7 +1565,7 @@ class SupplyUseTable(object):
 
     def Build_CTC_cxc_S(self):
         """Returns stressor coefficient matrix for the CTC cxc construct. S = F V^-1"""
-        self.S_CTC_cxc = np.dot(self.F, np.linalg.inv(self.V))
+        self.S_CTC_cxc = np.dot(self.F_alloc, np.linalg.inv(self.V))
         return self.S_CTC_cxc
 
     """ Industry technology construct (ITC)"""
@@ -841,13 +1576,9 @@ class SupplyUseTable(object):
         Equation taken from Miller and Blair (2009), chapter 5, Equation 5.27a
         A_ITC_ixi = V'*q^-1  *  U * g^-1"""
 
-        try:
-            self.g_hat_inv = np.linalg.inv(np.diag(self.g))
-            self.q_hat_inv = np.linalg.inv(np.diag(self.q))
-            self.A_ITC_ixi = np.dot(
-                np.dot(self.V.transpose(), self.q_hat_inv), np.dot(self.U, self.g_hat_inv))
-        except:
-            raise ValueError('Error: Singular matrix.')
+        g_inv, q_inv = self._diag_inv_gq()
+        self.A_ITC_ixi = _dense(matrix_chain(
+            [self.V.transpose(), q_inv, self.U, g_inv]))
 
         return self.A_ITC_ixi
 
@@ -857,25 +1588,33 @@ class SupplyUseTable(object):
         Equation taken from Miller and Blair (2009), chapter 5, Equation 5.27
         A_ITC_cxc = U * g^-1  *  V'*q^-1 """
 
-        try:
-            self.g_hat_inv = np.linalg.inv(np.diag(self.g))
-            self.q_hat_inv = np.linalg.inv(np.diag(self.q))
-            self.A_ITC_cxc = np.dot(
-                np.dot(self.U, self.g_hat_inv), np.dot(self.V.transpose(), self.q_hat_inv))
-        except:
-            raise ValueError('Error: Singular matrix.')
+        g_inv, q_inv = self._diag_inv_gq()
+        self.A_ITC_cxc = _dense(matrix_chain(
+            [self.U, g_inv, self.V.transpose(), q_inv]))
 
         return self.A_ITC_cxc
 
     def Build_ITC_cxc_S(self):
         """Returns stressor coefficient matrix for the ITC cxc construct."""
-        self.S_ITC_cxc = np.dot(np.dot(self.F, np.linalg.inv(np.diag(self.g))), np.dot(
-            self.V.transpose(), np.linalg.inv(np.diag(self.q))))
+        g_inv, q_inv = self._diag_inv_gq()
+        self.S_ITC_cxc = _dense(matrix_chain(
+            [self.F_alloc, g_inv, self.V.transpose(), q_inv]))
         return self.S_ITC_cxc
 
+    def _diag_inv_gq(self):
+        """ Inverse diagonals g^-1 and q^-1 as sparse matrices, also stored
+        (dense) as self.g_hat_inv and self.q_hat_inv """
+        g, q = np.asarray(self.g, dtype=float), np.asarray(self.q, dtype=float)
+        if np.any(g == 0) or np.any(q == 0):
+            raise ValueError('Error: Singular matrix.')
+        self.g_hat_inv = np.diag(1 / g)
+        self.q_hat_inv = np.diag(1 / q)
+        return sp.diags(1 / g), sp.diags(1 / q)
+
 
     """ Aggregation Constructs"""
 
+    @instrument.instrumented
     def pc_agg(self, keep_size=True, return_flows=True):
         """Performs Partition Aggregation Construct of SuUT inventory
 
@@ -913,11 +1652,10 @@ class SupplyUseTable(object):
             self.__pa_coeff()
 
         # Partitioning of product flows
-        Z = (self.__sU * self.__sPHI).toarray()  # <-- eq:PCagg
-
-        # Partitioning of environmental extensions
-        if self.F is not None:
-            F_con = (self.__sF * self.__sPHI).toarray()  # <-- eq:PCEnvExt
+        # and of environmental extensions, in one product
+        factors = [self.__sPHI]
+        Z, F_con = self.__allocate(factors)  # <-- eq:PCagg, eq:PCEnvExt
+        self.__keep_extensions('pc_agg', factors, self.V)
 
         (A, S, nn_in, nn_out) = matrix_norm(Z, self.V, F_con, keep_size)
 
@@ -925,9 +1663,10 @@ class SupplyUseTable(object):
             Z = np.empty(0)
             F_con = np.empty(0)
 
-        return (A, S, nn_in, nn_out, Z, F_con)
+        return self._emit((A, S, nn_in, nn_out, Z, F_con))
 
 
+    @instrument.instrumented
     def psc_agg(self, keep_size=True, return_flows=False):
         """Performs Product Substitution aggregation Construct
 
@@ -972,25 +1711,26 @@ class SupplyUseTable(object):
         #        Z = ((self.__sU - self.__sXi * self.__sV_tild) * self.__sE_bar.T
         #            ).toarray()
             
-        Z_main = (self.__sU * self.__sE_bar.T
-            ).toarray()    
+        # Allocation of Environmental Extensions along with the main
+        # product flows
+        sE_bar_T = self.__sE_bar.T
+        Z_main, F_con = self.__allocate([sE_bar_T])  #eq:NonProdBalEnvExt
+        self.__keep_extensions('psc_agg', [sE_bar_T], self.V_bar)
             
-        Z_byprod = (self.__sXi * self.__sV_tild * self.__sE_bar.T
-            ).toarray()     
+        Z_byprod = _dense(matrix_chain([self.__sXi, self.__sV_tild, sE_bar_T]))
             
         # ------------- sparse matrix end ---------------------            
             
         Z = Z_main - Z_byprod    
 
 
-        # Allocation of Environmental Extensions
-        if self.F is not None:
-            F_con = (self.__sF * self.__sE_bar.T).toarray()  #eq:NonProdBalEnvExt
-
-        # Normalizing
-        (A, S, nn_in, nn_out)        = matrix_norm(Z, self.V_bar, F_con, keep_size)
-        (A_main, S, nn_in, nn_out)   = matrix_norm(Z_main, self.V_bar, F_con, keep_size)
-        (A_byprod, S, nn_in, nn_out) = matrix_norm(Z_byprod, self.V_bar, F_con, keep_size)
+        # Normalizing (concurrently, in the thread mode)
+        V_bar = self.V_bar
+        ((A, S, nn_in, nn_out),
+         (A_main, S, nn_in, nn_out),
+         (A_byprod, S, nn_in, nn_out)) = parallel.run(
+            *[functools.partial(matrix_norm, X, V_bar, F_con, keep_size)
+              for X in (Z, Z_main, Z_byprod)])
 
         # Return allocated values
         if return_flows:
@@ -1001,9 +1741,10 @@ class SupplyUseTable(object):
             Z = np.empty(0)
             F_con = np.empty(0)
 
-        return (A, A_main, A_byprod, S, nn_in, nn_out, Z, F_con)
+        return self._emit((A, A_main, A_byprod, S, nn_in, nn_out, Z, F_con))
 
 
+    @instrument.instrumented
     def aac_agg(self, nmax=np.Inf, res_tol=0, keep_size=True, return_flows=True):
         """ Alternative Activity aggregation Construct of SuUT inventory
 
@@ -1042,25 +1783,33 @@ class SupplyUseTable(object):
         # Basic variables
 
         # Calculate competing technology requirements
-        A_gamma, F_gamma = self.__alternate_tech(nmax=nmax, res_tol=res_tol)
-
-        # Allocation step
-        sA_gamma = sp.csc_matrix(A_gamma)
+        A_gamma, F_gamma, apply_gamma = self.__alternate_tech(
+            nmax=nmax, res_tol=res_tol, operator=True)
 
-        # Perform construct
+        # Perform construct, for product flows and environmental extensions
+        # in the same products
             #------------------ matrix  notation start ------------------
-        Z = ((self.__sU - sA_gamma * self.__sV_tild) * self.__sE_bar.T
+        # Z = (U - A_gamma V_tild) E_bar', with A_gamma V_tild E_bar' grouped
+        # by matrix_chain
+        sV_tild, sE_bar_T = self.__sV_tild, self.__sE_bar.T
+        Z_in, F_in = self.__allocate([sE_bar_T])
+        Z_out, F_out = stacked_product([A_gamma, F_gamma if self.F is not None
+                                        else None], [sV_tild, sE_bar_T])
             #------------------ matrix  notation end --------------------
-            ).toarray() + A_gamma * self.V_tild.sum(1)  # <-- eq:AACagg
-
+        v_tild = self.V_tild.sum(1)
+        Z = Z_in - Z_out + A_gamma * v_tild  # <-- eq:AACagg
 
         # Partitioning of environmental extensions
         if self.F is not None:
-            sF_gamma = sp.csc_matrix(F_gamma)
-                    #------------------ matrix  notation start ---------------
-            F_con = ((self.__sF - sF_gamma * self.__sV_tild) * self.__sE_bar.T
-                    #------------------ matrix  notation end -----------------
-                    ).toarray() + F_gamma * self.V_tild.sum(1)  # eq:AACEnvExt
+            F_con = F_in - F_out + F_gamma * v_tild  # eq:AACEnvExt
+
+        def allocate_extensions(F):
+            """ eq:AACEnvExt for other extensions F """
+            F_gamma = apply_gamma(_dense(F))
+            F_in, F_out = stacked_product([F], [sE_bar_T])[0], \
+                stacked_product([F_gamma], [sV_tild, sE_bar_T])[0]
+            return F_in - F_out + F_gamma * v_tild
+        self.__keep_extensions('aac_agg', allocate_extensions, self.V)
 
         # Normalize and return
         (A, S, nn_in, nn_out) = matrix_norm(Z, self.V, F_con, keep_size)
@@ -1069,8 +1818,9 @@ class SupplyUseTable(object):
             Z = np.empty(0)
             F_con = np.empty(0)
 
-        return (A, S, nn_in, nn_out, Z, F_con)
+        return self._emit((A, S, nn_in, nn_out, Z, F_con))
 
+    @instrument.instrumented
     def lsc(self, keep_size=True, return_flows=False):
         """ Performs Lump-sum aggregation Construct of SuUT inventory
 
@@ -1107,16 +1857,13 @@ class SupplyUseTable(object):
         S = np.empty(0)
 
         #------------start sparse matrix notation----------------------------
-        # Allocation of Product Flows
-        Z = (self.__sU * self.__sE_bar.T).toarray()  # <-- eq:LSCagg
-
-        # Allocation of Environmental Extensions
-        if self.F is not None:
-            F_con = (self.__sF * self.__sE_bar.T).toarray()  # eq:NonProdBalEnvExt
+        # Allocation of Product Flows and of Environmental Extensions
+        Z, F_con = self.__allocate([self.__sE_bar.T])  # <-- eq:LSCagg
+        V_dd = self.E_bar * self.g  # <-- eq:LSCagg
+        self.__keep_extensions('lsc', [self.__sE_bar.T], V_dd)
         #------------ end sparse matrix notation----------------------------
 
         # Normalizing
-        V_dd = self.E_bar * self.g  # <-- eq:LSCagg
         (A, S, nn_in, nn_out) = matrix_norm(Z, V_dd, F_con, keep_size)
 
         # Return allocated values
@@ -1128,8 +1875,9 @@ class SupplyUseTable(object):
             Z = np.empty(0)
             F_con = np.empty(0)
 
-        return (A, S, nn_in, nn_out, Z, F_con)
+        return self._emit((A, S, nn_in, nn_out, Z, F_con))
 
+    @instrument.instrumented
     def itc(self, keep_size=True, return_flows=True):
         """Performs Industry Technology Construct of SuUT inventory
 
@@ -1159,10 +1907,9 @@ class SupplyUseTable(object):
 
         # ------------- sparse matrix start ---------------------
         V = self.__sV
-        Z = (sp.csc_matrix(self.U * _one_over(self.g)) * V.T).toarray()  # eq:itc
-
-        if self.F is not None:
-            F_con = (sp.csc_matrix(self.F * _one_over(self.g)) * V.T).toarray()
+        g_inv = sp.diags(_one_over(self.g))
+        Z, F_con = self.__allocate([g_inv, V.T])  # eq:itc
+        self.__keep_extensions('itc', [g_inv, V.T], self.V)
         # ------------- sparse matrix end ---------------------
 
         (A, S, nn_in, nn_out) = matrix_norm(Z, self.V, F_con, keep_size)
@@ -1171,9 +1918,10 @@ class SupplyUseTable(object):
             Z = np.empty(0)
             F_con = np.empty(0)
 
-        return (A, S, nn_in, nn_out, Z, F_con)
+        return self._emit((A, S, nn_in, nn_out, Z, F_con))
 
 
+    @instrument.instrumented
     def esc(self, keep_size=True, return_flows=True):
         """ Performs European System Construct on SuUT inventory
 
@@ -1208,12 +1956,9 @@ class SupplyUseTable(object):
         # the diagonal if the supply table is square
 
         # ---------------start sparse matrix -----------------------------
-        # Construct product flows
-        Z = (self.__sU * self.__sE_bar.T).toarray()
-
-        # Construct extension flows
-        if self.F is not None:
-            F_con = (self.__sF * self.__sE_bar.T).toarray()  # eq:ESCEnvExt
+        # Construct product flows and extension flows
+        Z, F_con = self.__allocate([self.__sE_bar.T])  # eq:ESCEnvExt
+        self.__keep_extensions('esc', [self.__sE_bar.T], self.V)
 
         # ---------------end sparse matrix -----------------------------
 
@@ -1224,10 +1969,11 @@ class SupplyUseTable(object):
             Z = np.empty(0)
             F_con = np.empty(0)
 
-        return A, S, nn_in, nn_out, Z, F_con
+        return self._emit((A, S, nn_in, nn_out, Z, F_con))
 
 
 
+    @instrument.instrumented
     def ctc(self, return_flows=True):
         """Performs Commodity Technology Construct of SuUT inventory
 
@@ -1257,11 +2003,14 @@ class SupplyUseTable(object):
         Z = np.empty(0)
         S = np.empty(0)
 
-        inv_V = sl.inv(self.__sV)
-        A = (self.__sU * inv_V).toarray()  # <-- eq:ctc
+        from scipy.sparse import linalg as sl  # only needed here
 
-        if self.F is not None:
-            S = (self.__sF * inv_V).toarray()
+        with instrument.phase('inverse') as ph:
+            inv_V = sl.inv(self.__sV)
+            ph.record(inv_V)
+        A, S = self.__allocate([inv_V])  # <-- eq:ctc
+        # F_con = S q, normalized by q (see self.extensions)
+        self.__keep_extensions('ctc', [inv_V, sp.diags(self.q)], self.V)
 
 
         if return_flows:
@@ -1272,9 +2021,10 @@ class SupplyUseTable(object):
         __, __, nn_in, nn_out = matrix_norm(A, self.V, just_filters=True)
 
 
-        return (A, S, nn_in, nn_out, Z, F_con)
+        return self._emit((A, S, nn_in, nn_out, Z, F_con))
 
 
+    @instrument.instrumented
     def btc(self, keep_size=True, return_flows=True):
         """Performs Byproduct Technology Construct of SuUT inventory
 
@@ -1308,11 +2058,10 @@ class SupplyUseTable(object):
 
         # -------------------sparse matrix ----------------------------
         # The construct
-        Z = ((self.__sU - self.__sV_tild) * self.__sE_bar.T).toarray()
-
-        if self.F is not None:
-            # eq:NonProdBalEnvExt
-            F_con = (self.__sF * self.__sE_bar.T).toarray()
+        # eq:NonProdBalEnvExt
+        Z, F_con = self.__allocate([self.__sE_bar.T],
+                                   U=self.__sU - self.__sV_tild)
+        self.__keep_extensions('btc', [self.__sE_bar.T], self.V_bar)
         # -------------------sparse matrix ----------------------------
 
         (A, S, nn_in, nn_out) = matrix_norm(Z, self.V_bar, F_con, keep_size)
@@ -1321,7 +2070,411 @@ class SupplyUseTable(object):
             Z = np.empty(0)
             F_con = np.empty(0)
 
-        return (A, S, nn_in, nn_out, Z, F_con)
+        return self._emit((A, S, nn_in, nn_out, Z, F_con))
+
+    """ Leontief systems and footprints of constructs"""
+
+    def leontief(self, A, S=None, precision=None):
+        """ Factorized Leontief system of a construct, cached
+
+        Args
+        ----
+        A : Normalized technical requirements [com,com] of a construct,
+            obtained with keep_size=True
+        S : Normalized, constructed emissions [ext, com] (optional)
+        precision : 'double', or 'mixed' to factorize in float32 and refine
+            the solutions in float64 (see pysut.leontief.LeontiefSystem);
+            None keeps the precision of the cached system ('double' if none)
+
+        Returns
+        -------
+        pysut.leontief.LeontiefSystem of A and S, with the product labels
+        l_pro as index if present. Calling this method again with the same A
+        and S objects returns the same system, so that I - A is only
+        factorized once and computed Leontief columns are reused. Asking for
+        another precision factorizes I - A again.
+
+        """
+        from .leontief import LeontiefSystem
+
+        def build():
+            index = self.pro_index if self.l_pro is not None else None
+            return LeontiefSystem(A, S, index=index,
+                                  precision=precision or 'double')
+        system = self._cached('leontief', (A, S, self.l_pro), build)
+        if precision is not None and system.precision != precision:
+            system = build()
+            self._cache['leontief'] = ((A, S, self.l_pro), system)
+        return system
+
+    def footprints(self, A, S, by_region=True, precision=None):
+        """ Consumption-based footprints S (I - A)^-1 Y + FY of the SUT
+
+        Args
+        ----
+        A, S : output of a construct (with keep_size=True)
+        by_region: sum the footprints of all final demand categories of each
+                   consuming region (self.regions)
+        precision: precision of the Leontief system, see self.leontief
+
+        Depends on
+        ----------
+        self.Y :  Final demand [com, fd]
+        self.FY : Extensions of final demand [ext, fd] (optional; C FY
+                  if characterized, see self.FY_alloc)
+
+        Returns
+        -------
+        D : footprints [ext, regions], or [ext, fd] if by_region is False
+
+        """
+        if self.Y is None:
+            raise ValueError(
+                'Error: There is no final demand; footprints cannot be computed.')
+        regions = self.regions if by_region else None
+        return self.leontief(A, S, precision).footprints(self.Y, self.FY_alloc,
+                                                         regions)
+
+    def multipliers(self, A, S, rows=None, C=None):
+        """ Multipliers S (I - A)^-1 of a construct, for selected stressors
+
+        Args
+        ----
+        A, S : output of a construct (with keep_size=True)
+        rows : positions of the stressors of interest, or dict of label
+               criteria on the labels of the rows of S (see
+               self.alloc_index). Default: all.
+        C :    characterization matrix [impact, rows] (optional)
+
+        Returns
+        -------
+        M : multipliers [rows, com], or [impact, com] if C is given
+
+        """
+        if isinstance(rows, dict):
+            rows = self.alloc_index.select(**rows)
+        return self.leontief(A, S).multipliers(rows, C)
+
+    def leontief_columns(self, A, S, products):
+        """ Cradle-to-gate requirements and extensions of selected products
+
+        Args
+        ----
+        A, S :     output of a construct (with keep_size=True)
+        products : product positions or labels (rows of l_pro)
+
+        Returns
+        -------
+        L : columns of (I - A)^-1 of the products [com, products]
+        M : columns of S (I - A)^-1 of the products [ext, products], or
+            None if S is None
+
+        """
+        system = self.leontief(A, S)
+        L = system.leontief_columns(products)
+        M = system.multiplier_columns(products) if system.S is not None \
+            else None
+        return L, M
+
+    def structural_paths(self, A, S, row, y=None, max_paths=100,
+                         cutoff=1e-3, max_depth=None):
+        """ Structural path analysis of a construct, see pysut.spa
+
+        Args
+        ----
+        A, S :     output of a construct (with keep_size=True)
+        row :      position of the stressor (row of S) to analyse
+        y :        final demand [com] (default: self.Y, summed over all
+                   final demand categories)
+        max_paths, cutoff, max_depth : path budget, relative cutoff and
+                   maximum depth, see pysut.spa.structural_paths
+
+        Returns
+        -------
+        paths : list of pysut.spa.Path, by decreasing absolute value
+        total : total footprint of y for this stressor
+
+        """
+        from .spa import structural_paths
+        if y is None:
+            if self.Y is None:
+                raise ValueError('Error: no final demand: give y or set Y.')
+            y = self.Y if self.Y.ndim == 1 else _sums(self.Y, axis=1)
+        m = self.multipliers(A, S, rows=[row])[0]
+        s = _dense(S[row, :]).reshape(-1)
+        return structural_paths(A, s, y, max_paths, cutoff, max_depth, m=m)
+
+    def update_construct(self, construct, A, S, industries, V_old=None):
+        """ Rebuild the columns of a construct affected by changed industries
+
+        After changes to the columns (industries) of U, V or F, only the
+        products whose primary producers changed need to be reconstructed,
+        instead of running the whole construct again. The columns may be
+        edited in place: other cached quantities (V_bar, ...) are dropped. Supported are the
+        constructs that allocate by primary production (E_bar):
+
+            esc, lsc:  Z = U E_bar'
+            btc:       Z = (U - V_tild) E_bar'
+            psc_agg:   Z = (U - Xi V_tild) E_bar'
+
+        If a factorized Leontief system of A and S is cached (self.leontief),
+        it is updated with the new columns (low-rank update, no new
+        factorization) and cached for the new A and S.
+
+        Args
+        ----
+        construct :  'esc', 'lsc', 'btc' or 'psc_agg'
+        A, S :       previous output of the construct, with keep_size=True
+                     (for psc_agg, A is the net A matrix)
+        industries : positions of the changed columns of U, V and F
+        V_old :      previous columns of V of these industries [com, ind]
+                     (dense or sparse); for esc, required if V changed
+
+        Returns
+        -------
+        A : updated A [com, com] (new array)
+        S : updated S [ext, com] (new array, or S if no F)
+        products : positions of the rebuilt columns of A and S
+
+        Only products supplied by the changed industries (primary products,
+        and for esc all products supplied before or after the change, given
+        V_old) are rebuilt: if a change stops all supply of a product, rerun
+        the construct. U, V, F, E_bar and Xi may be dense or sparse.
+
+        """
+        if construct not in ('esc', 'lsc', 'btc', 'psc_agg'):
+            raise ValueError('Error: column updates are not available for'
+                             ' construct {}.'.format(construct))
+        industries = np.asarray(industries, dtype=np.intp).reshape(-1)
+        if self.E_bar is None and (self.V.shape[0] == self.V.shape[1]):
+            logging.warning("Assuming primary production is on diagonal")
+            E_bar = sp.identity(self.V.shape[0], dtype=int, format='csr')
+        else:
+            E_bar = self.E_bar
+
+        # Products whose primary producers changed (and, for esc, whose total
+        # output changed: supplied by the industries before or after)
+        affected = _count_nonzero(_take(E_bar, cols=industries), axis=1) > 0
+        if construct == 'esc':
+            affected |= _count_nonzero(_take(self.V, cols=industries),
+                                       axis=1) > 0
+            if V_old is not None:
+                V_old = _dense(V_old).reshape(self.V.shape[0], -1)
+                if V_old.shape[1] != len(industries):
+                    raise ValueError('Error: V_old has {} columns, for {}'
+                                     ' industries.'.format(V_old.shape[1],
+                                                           len(industries)))
+                affected |= (V_old != 0).any(axis=1)
+        products = np.flatnonzero(affected)
+
+        # All primary producers of these products
+        cols = np.flatnonzero(_count_nonzero(_take(E_bar, rows=products),
+                                             axis=0))
+        E_c = _dense(_take(E_bar, cols=cols))
+        V_c = _dense(_take(self.V, cols=cols))
+        X = _dense(_take(self.U, cols=cols))
+        if construct == 'btc':
+            X = X - (V_c - V_c * E_c)
+        elif construct == 'psc_agg':
+            X = X - _dense(_mul(self.Xi, V_c - V_c * E_c))
+        alloc = E_c[products, :].T  # columns of E_bar' of the products
+
+        # Normalization, as in the respective construct
+        if construct == 'esc':
+            norm = _sums(_take(self.V, rows=products), axis=1)
+        elif construct == 'lsc':
+            norm = np.dot(E_c[products, :], V_c.sum(axis=0))
+        else:
+            norm = (V_c * E_c)[products, :].sum(axis=1)
+        norm_inv = _one_over(np.asarray(norm, dtype=float))
+
+        A_old, S_old = A, S
+        A = np.array(A, dtype=float)
+        A[:, products] = np.dot(X, alloc) * norm_inv
+        if self.F is not None and S is not None and S.size:
+            S = np.array(S, dtype=float)
+            F_c = _dense(self.characterized(_take(self.F, cols=cols)))
+            S[:, products] = np.dot(F_c, alloc) * norm_inv
+
+        # The tables were edited in place: drop what was derived from them
+        self.clear_cache(keep=('leontief',))
+
+        # Carry over a cached Leontief system of A_old, as low-rank update
+        entry = self._cache.get('leontief')
+        if entry is not None and entry[0][0] is A_old and \
+                entry[0][1] is S_old and entry[0][2] is self.l_pro:
+            system = entry[1]
+            system.update(products, A[:, products],
+                          S if system.S is not None else None)
+            self._cache['leontief'] = ((A, S, self.l_pro), system)
+        return A, S, products
+
+    def extensions(self, construct, F=None, keep_size=True,
+                   return_flows=False, **kwargs):
+        """ Extensions S of a construct for other extensions F, without Z or A
+
+        With self.keep_allocations, the allocation of extensions and their
+        normalization are kept from the last run of the construct, as long
+        as the product side of the SUT (U, V, E_bar, Xi, PHI, PSI, Gamma) is
+        not re-assigned, or until self.clear_allocations() is called.
+        Revised satellite accounts are then allocated without reconstructing
+        the product flows. Otherwise, or if there is no such run, the
+        construct is run first, with kwargs.
+
+        Args
+        ----
+        construct : 'btc', 'ctc', 'itc', 'esc', 'lsc', 'pc_agg', 'psc_agg' or
+                    'aac_agg'
+        F :         Unallocated extensions [ext, ind] (default: self.F),
+                    characterized like self.F_alloc
+        keep_size : keep columns of products without production, with zeros
+        return_flows : also return F_con
+
+        Returns
+        -------
+        S : Normalized, constructed extensions [ext, com]
+        F_con : Constructed extensions [ext, com] (empty if not return_flows)
+
+        """
+        if construct not in ('btc', 'ctc', 'itc', 'esc', 'lsc', 'pc_agg',
+                             'psc_agg', 'aac_agg'):
+            raise ValueError('Error: unknown construct {}.'.format(construct))
+        F = self.F_alloc if F is None else self.characterized(F)
+        if F is None:
+            raise ValueError('Error: There are no extensions to allocate.')
+        key = ('extensions', construct)
+        entry = self._cache.get(key)
+        deps = self.__product_side
+        if entry is None or not all(a is b for a, b in zip(entry[0], deps)):
+            keep, self.keep_allocations = self.keep_allocations, True
+            try:
+                getattr(self, construct)(**kwargs)
+            finally:
+                self.keep_allocations = keep
+            entry = self._cache[key] if keep else self._cache.pop(key)
+        allocate, nn_out, q_inv = entry[1]
+
+        F_con = allocate(F)
+        S = F_con[:, nn_out] * q_inv
+        if keep_size:
+            S = restore_size(S, nn_out=nn_out)
+        if not return_flows:
+            F_con = np.empty(0)
+        return self._emit((S, F_con))
+
+    def clear_allocations(self):
+        """ Drop the allocations of extensions kept by the constructs
+
+        Needed after in-place edits of U, V or the mappings, if
+        self.keep_allocations is set (see self.extensions).
+        """
+        for key in list(self._cache):
+            if isinstance(key, tuple) and key[0] == 'extensions':
+                del self._cache[key]
+
+    def append_extensions(self, construct, F, S, FY=None, labels=None):
+        """ Add rows of extensions to the SUT and to S, leaving A untouched
+
+        The new rows are allocated as in self.extensions and appended to
+        self.F (and FY, l_ext). A cached Leontief system of the construct
+        (self.leontief) keeps its factorization and gets the extended S.
+
+        Args
+        ----
+        construct : name of the construct that S was obtained with
+        F :      new extensions [new, ind]
+        S :      current S of the construct [ext, com] (may be empty)
+        FY :     extensions of final demand of the new rows [new, fd]
+                 (default: zeros, if self.FY exists)
+        labels : labels of the new rows, required if self.l_ext exists
+
+        Returns
+        -------
+        S : extended S [ext + new, com]
+
+        """
+        if self.C is not None:
+            raise ValueError('Error: extensions cannot be appended to a'
+                             ' characterized SUT, change C instead.')
+        if self.l_ext is not None and labels is None:
+            raise ValueError('Error: labels of the new extensions are'
+                             ' required, l_ext is defined.')
+        keep_size = not S.size or S.shape[1] == self.V.shape[0]
+        S_new = self.extensions(construct, F, keep_size=keep_size)[0]
+        S_all = np.vstack([S, S_new]) if S.size else S_new
+
+        def stack(X, X_new):
+            if X is None or not X.size:
+                return X_new
+            if sp.issparse(X) or sp.issparse(X_new):
+                return sp.vstack([X, X_new], format=X.format
+                                 if sp.issparse(X) else 'csr')
+            return np.vstack([X, X_new]).astype(X.dtype, copy=False)
+
+        if self.FY is not None and FY is None:
+            FY = np.zeros((F.shape[0], self.FY.shape[1]), dtype=self.FY.dtype)
+        self.F = stack(self.F, F)
+        if FY is not None:
+            self.FY = stack(self.FY, FY)
+        if labels is not None:
+            labels = np.asarray(labels, dtype=object).reshape(F.shape[0], -1)
+            self.l_ext = labels if self.l_ext is None else \
+                np.vstack([np.asarray(self.l_ext, dtype=object).reshape(
+                    -1, labels.shape[1]), labels])
+
+        # Carry over a cached Leontief system of A and S
+        entry = self._cache.get('leontief')
+        if entry is not None and entry[0][1] is S and \
+                entry[0][2] is self.l_pro:
+            system = entry[1]
+            system.set_extensions(S_all)
+            self._cache['leontief'] = ((entry[0][0], S_all, self.l_pro),
+                                       system)
+        return S_all
+
+    def precision_report(self, construct='btc', dtype=np.float32, **kwargs):
+        """ Memory, time and accuracy of a reduced storage precision
+
+        Runs the construct and the footprints (self.footprints) once with
+        the flow tables in float64 and once in dtype, and compares them.
+
+        Args
+        ----
+        construct: name of the construct method, e.g. 'btc' or 'psc_agg'
+        dtype:     reduced precision to evaluate (default np.float32)
+        kwargs:    passed on to the construct
+
+        Returns
+        -------
+        dict with the entries
+            dtype:         name of the evaluated dtype
+            table_bytes:   memory of V, U, Y, F and FY, float64 and dtype
+            time:          seconds for construct and footprints, float64
+                           and dtype
+            max_abs_error: largest absolute difference of the footprints
+            max_rel_error: largest relative difference of the non-zero
+                           footprints
+
+        """
+        runs = []
+        for precision in (np.float64, dtype):
+            sut = self.astype(precision)
+            start = default_timer()
+            result = getattr(sut, construct)(**kwargs)
+            A, S = result[0], result[3 if construct == 'psc_agg' else 1]
+            D = np.asarray(sut.footprints(A, S), dtype=np.float64)
+            runs.append((sum(_nbytes(getattr(sut, name)) for name in
+                             ('V', 'U', 'Y', 'F', 'FY')),
+                         default_timer() - start, D))
+        D0, D = runs[0][2], runs[1][2]
+        error = np.abs(D - D0)
+        nonzero = D0 != 0
+        return {'dtype': np.dtype(dtype).name,
+                'table_bytes': (runs[0][0], runs[1][0]),
+                'time': (runs[0][1], runs[1][1]),
+                'max_abs_error': error.max() if error.size else 0.,
+                'max_rel_error': ((error[nonzero] / np.abs(D0[nonzero])).max()
+                                  if nonzero.any() else 0.)}
 
     """ HELPER/HIDDEN METHODS"""
 
@@ -1353,7 +2506,8 @@ class SupplyUseTable(object):
 
 
 
-    def __alternate_tech(self, nmax=np.Inf, lay=None, res_tol=1e-30):
+    def __alternate_tech(self, nmax=np.Inf, lay=None, res_tol=1e-30,
+                         operator=False):
         """Compilation of Alternate Technologies for use in AAA and AAC models
 
         Args
@@ -1361,6 +2515,8 @@ class SupplyUseTable(object):
         nmax :      maximum number of iterations, as this search for
                     alternative technologies is not garanteed to suceed
         res_tol:    maximum residual acceptable in defining A_gamma (default 0)
+        operator:   also return the function that maps requirements of
+                    industries (U or F) to alternative technologies
 
         Generates
         ---------
@@ -1407,24 +2563,26 @@ class SupplyUseTable(object):
         M = sp.csc_matrix(self.V_tild * _one_over(self.V_bar.sum(0)))
         Gamma = sp.csc_matrix(Gamma)
 
-        # Iteration 0: Prepare summation term used in definition of A_gamma
-        n = 0
-        tier = -1 * Gamma * M
-        tier_n = sp.identity(tier.shape[0])  #=tier**n
-        theSum = Gamma.copy()                #=identity*Gamma = tier_n * Gamma
-        n = n + 1
-        res = theSum.sum()
-
-        # Iterations 1 to nmax
-        while ((res > res_tol) or (res < 0)) and (n <= nmax):
-            tier_n = tier_n * tier
-            term = tier_n * Gamma
-            theSum = theSum + term
-            n += 1
-            res = term.sum()
-            print("residual: {:+.2e}".format(res))
-        #theSum = theSum.toarray()
-        print("number of iterations:{}".format(n))
+        with instrument.phase('alternate_tech') as ph:
+            # Iteration 0: Prepare summation term used in definition of
+            # A_gamma
+            n = 0
+            tier = -1 * Gamma * M
+            tier_n = sp.identity(tier.shape[0])  #=tier**n
+            theSum = Gamma.copy()           #=identity*Gamma = tier_n * Gamma
+            n = n + 1
+            res = theSum.sum()
+
+            # Iterations 1 to nmax
+            while ((res > res_tol) or (res < 0)) and (n <= nmax):
+                tier_n = tier_n * tier
+                term = tier_n * Gamma
+                theSum = theSum + term
+                n += 1
+                res = term.sum()
+                instrument.emit('residual', iteration=n, residual=res)
+            #theSum = theSum.toarray()
+            ph.record(theSum, iterations=n, residual=res)
         #================ Sparse Matrix Section ==========================
 
         def apply_to_requirements(X):
@@ -1447,37 +2605,89 @@ class SupplyUseTable(object):
                     #------------start sparse matrix----------
             return X_gamma
 
-        A_gamma = apply_to_requirements(self.U)
-        if self.F is not None:
-            S_gamma = apply_to_requirements(self.F)
-        else:
+        F = self.F_alloc  # impacts, if characterized
+        # Blocks of rows in parallel, in the thread mode (see pysut.parallel)
+        if F is None:
+            A_gamma = parallel.map_rows(apply_to_requirements, self.U)
             S_gamma = np.empty(0)
+        elif not traceable:
+            # U and F in one pass, split afterwards
+            X_gamma = parallel.map_rows(apply_to_requirements,
+                                        np.vstack([self.U, _dense(F)]))
+            A_gamma, S_gamma = np.split(X_gamma, [self.U.shape[0]])
+        else:
+            A_gamma = apply_to_requirements(self.U)
+            S_gamma = apply_to_requirements(F)
 
+        if operator:
+            return A_gamma, S_gamma, apply_to_requirements
         return A_gamma, S_gamma
 
+    def __allocate(self, factors, U=None):
+        """ Allocates U (or a table in its place) and F_alloc in a single product
+
+        Both tables are stacked and multiplied once by the chain of factors
+        (see stacked_product). Returns dense Z and F_con; F_con is empty if
+        there are no extensions.
+        """
+        Z, F_con = stacked_product([self.U if U is None else U, self.F_alloc],
+                                   factors)
+        return Z, (np.empty(0) if F_con is None else F_con)
+
+    def __keep_extensions(self, construct, allocate, V):
+        """ Cache how a construct allocates and normalizes extensions
+
+        Args
+        ----
+        construct : name of the construct
+        allocate :  chain of factors with F_con = F * factors, or function
+                    returning F_con for a given F
+        V :         production volume with which F_con is normalized (as in
+                    matrix_norm)
+
+        See self.extensions. Only kept if self.keep_allocations, and valid
+        until the product side of the SUT (U, V, E_bar, Xi, PHI, PSI, Gamma)
+        is re-assigned.
+        """
+        if not self.keep_allocations:
+            return
+        if not callable(allocate):
+            factors = allocate
+            allocate = lambda F: stacked_product([F], factors)[0]
+        q = np.sum(V, 1, dtype=_acc_dtype(V))
+        nn_out = q != 0
+        self._cache['extensions', construct] = (
+            self.__product_side, (allocate, nn_out, _one_over(q[nn_out])))
+
+    @property
+    def __product_side(self):
+        """ Tables that the allocation of extensions depends on """
+        return (self.U, self.V, self.E_bar, self.Xi, self.PHI, self.PSI,
+                self.Gamma)
+
     @property
     def __sU(self):
         """ Returns sparse version of self.U """
-        return sp.csc_matrix(self.U)
+        return sp.csc_matrix(self.U, dtype=_acc_dtype(self.U))
 
     @property
     def __sV(self):
-        return sp.csc_matrix(self.V)
+        return sp.csc_matrix(self.V, dtype=_acc_dtype(self.V))
         """ Returns sparse version of self.V """
     @property
     def __sV_bar(self):
         """ Returns sparse version of self.V_bar """
-        return sp.csc_matrix(self.V_bar)
+        return sp.csc_matrix(self.V_bar, dtype=_acc_dtype(self.V_bar))
 
     @property
     def __sV_tild(self):
         """ Returns sparse version of self.V_tild """
-        return sp.csc_matrix(self.V_tild)
+        return sp.csc_matrix(self.V_tild, dtype=_acc_dtype(self.V_tild))
 
     @property
     def __sF(self):
         """ Returns sparse version of self.F """
-        return sp.csc_matrix(self.F)
+        return sp.csc_matrix(self.F, dtype=_acc_dtype(self.F))
 
     @property
     def __sXi(self):
@@ -1518,8 +2728,376 @@ class SupplyUseTable(object):
         y = np.ones(len(x)) / x
         y[y == np.Inf] = 0
         return ddiag(y)
+
+
+class LabelIndex(object):
+
+    """ Hashed index of a label table (l_pro, l_ind or l_ext)
+
+    A label table has one row per product (industry, extension) and one
+    column per label level. By convention, in a multi-regional table the
+    first column holds the region and the second the name of the product
+    (industry, extension), as in l_ind[:, 0:2] = [Country, Industry].
+
+    Each level is stored as a categorical: integer codes into the list of
+    its distinct values, with a dict for O(1) lookup of a value and
+    precomputed arrays of positions for each value (groups). Selections
+    therefore never search the label table itself.
+
+    Attributes
+    ----------
+    labels:     the label table, as a 2-d object array
+    levels:     names of the columns of the label table. Default: 'name'
+                for a single column, else 'region', 'name', 'level2', ...
+    categories: per level, the list of distinct values
+    codes:      integer array [entries, levels], codes[i, j] is the index
+                of labels[i, j] in categories[j]
+
+    """
+
+    def __init__(self, labels, levels=None, name='the label table'):
+        if labels is None:
+            raise ValueError('Error: {} has no labels.'.format(name))
+        labels = np.asarray(labels, dtype=object)
+        if labels.ndim == 1:
+            labels = labels.reshape((-1, 1))
+        n, nlev = labels.shape
+        if levels is None:
+            if nlev == 1:
+                levels = ('name',)
+            else:
+                levels = ('region', 'name') + tuple(
+                    'level{}'.format(j) for j in range(2, nlev))
+        if len(levels) != nlev:
+            raise ValueError('Error: {} level names for {} label columns.'
+                             .format(len(levels), nlev))
+
+        self.labels = labels
+        self.levels = tuple(levels)
+        self.categories = []
+        self.codes = np.empty((n, nlev), dtype=np.intp)
+        self._lookup = []
+        self._groups = []
+        for j in range(nlev):
+            lookup = {}
+            self.codes[:, j] = [lookup.setdefault(v, len(lookup))
+                                for v in labels[:, j]]
+            categories = [None] * len(lookup)
+            for v, c in lookup.items():
+                categories[c] = v
+            # Positions of each category, in increasing order (stable sort)
+            order = np.argsort(self.codes[:, j], kind='mergesort')
+            bounds = np.cumsum(np.bincount(self.codes[:, j],
+                                           minlength=len(lookup)))
+            self.categories.append(categories)
+            self._lookup.append(lookup)
+            self._groups.append(np.split(order, bounds[:-1]))
+
+        # Full label (all levels) to position
+        self._position = {}
+        for i, row in enumerate(labels):
+            self._position.setdefault(tuple(row), i)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __contains__(self, key):
+        return self._key(key) in self._position
+
+    def _key(self, key):
+        if isinstance(key, tuple):
+            return key
+        return (key,)
+
+    def _level(self, level):
+        try:
+            return self.levels.index(level)
+        except ValueError:
+            raise KeyError('Unknown label level {!r}, expected one of {}'
+                           .format(level, self.levels))
+
+    def position(self, key):
+        """ Position of the entry with the full label key (tuple over all
+        levels, or a plain value if there is only one level) """
+        try:
+            return self._position[self._key(key)]
+        except KeyError:
+            raise KeyError('Unknown label {!r}'.format(key))
+
+    def positions(self, keys):
+        """ Positions of a list of full label keys, or pass-through of
+        integer positions """
+        return np.array([k if isinstance(k, (int, np.integer))
+                         else self.position(k) for k in keys], dtype=np.intp)
+
+    def group(self, level, value):
+        """ Sorted positions of all entries with the given value at level """
+        j = self._level(level)
+        try:
+            return self._groups[j][self._lookup[j][value]]
+        except KeyError:
+            raise KeyError('Unknown {} {!r}'.format(level, value))
+
+    def select(self, **criteria):
+        """ Sorted positions of the entries matching all criteria
+
+        Each keyword is a level name, each value is either a single label or
+        a list of labels (any of which matches). Without criteria, all
+        positions are returned.
+        """
+        result = None
+        for level, values in criteria.items():
+            if isinstance(values, (list, tuple, set, np.ndarray)):
+                found = np.unique(np.concatenate(
+                    [self.group(level, v) for v in values] +
+                    [np.empty(0, dtype=np.intp)]))
+            else:
+                found = self.group(level, values)
+            if result is None:
+                result = found
+            else:
+                result = np.intersect1d(result, found, assume_unique=True)
+        if result is None:
+            result = np.arange(len(self))
+        return result
+
+
+class TransformationChain(object):
+
+    """ Lazily recorded aggregation, re-sorting and removal steps of a SUT
+
+    Each step is a linear map of the products, industries, final demand
+    categories and regions (columns of TL) of the table. Instead of
+    rewriting all tables at every step, the steps are only recorded, and
+    composed into one sparse operator per axis. self.apply then transforms
+    each table once:
+
+        V, U  -> P_pro V P_ind'        Y  -> P_pro Y P_fd'
+        F     -> F P_ind'              FY -> FY P_fd'
+        TL    -> P_pro TL P_reg'
+
+    Obtained with SupplyUseTable.transform(), steps can be chained:
+
+        sut.transform().aggregate_products(PA).rearrange_products(PR)\
+            .remove_products_industries(RPV, RIV, drop=True).apply()
+
+    The steps have the same meaning as the SupplyUseTable methods of the
+    same name. Labels, units and the mappings E_bar, Xi, PHI, PSI and Gamma
+    are carried along if the composed operators only select or re-sort
+    (no aggregation), and are otherwise left unchanged, as by the
+    SupplyUseTable methods.
+
+    """
+
+    def __init__(self, sut):
+        self.sut = sut
+        self.steps = []  # names of the recorded steps
+        self._ops = {'products': None, 'industries': None, 'fd': None,
+                     'regions': None}
+        Y = sut.Y
+        self._sizes = {'products': sut.V.shape[0],
+                       'industries': sut.V.shape[1],
+                       'fd': Y.shape[1] if Y is not None and Y.ndim == 2
+                       else None,
+                       'regions': sut.TL.shape[1] if sut.TL is not None
+                       else sut.regions}
+
+    def _compose(self, axis, P):
+        """ Record the map P [new, current] of an axis after the others """
+        P = sp.csr_matrix(P)
+        if P.shape[1] != self._sizes[axis]:
+            raise ValueError('Error: operator with {} columns applied to {}'
+                             ' {}.'.format(P.shape[1], self._sizes[axis], axis))
+        current = self._ops[axis]
+        self._ops[axis] = P if current is None else P * current
+        self._sizes[axis] = P.shape[0]
+
+    def operator(self, axis):
+        """ Composed sparse operator of 'products', 'industries', 'fd' or
+        'regions' [new, original], or None if the axis is unchanged """
+        return self._ops[axis]
+
+    def aggregate_products(self, PA):
+        """ Aggregate products: X_aggregated = PA * X, for U, V, Y and TL """
+        self._compose('products', PA)
+        self.steps.append('aggregate_products')
+        return self
+
+    def rearrange_products(self, PR):
+        """ Re-sort products and industries: PR * X * PR', for U and V
+
+        PR is a sorting matrix, or a position vector (see
+        SupplyUseTable.rearrange_products).
+        """
+        PR = _sorting_matrix(PR)
+        self._compose('products', PR)
+        self._compose('industries', PR)
+        self.steps.append('rearrange_products')
+        return self
+
+    def aggregate_rearrange_products(self, PA, PR):
+        """ Aggregate products with PA, then re-sort with PR """
+        self.aggregate_products(PA)
+        return self.rearrange_products(PR)
+
+    def remove_products_industries(self, RPV, RIV, drop=False):
+        """ Zero (or with drop=True, drop) products and industries """
+        for axis, remove in (('products', RPV), ('industries', RIV)):
+            keep = np.ones(self._sizes[axis], dtype=bool)
+            keep[np.asarray(remove, dtype=np.intp)] = False
+            if drop:
+                pos = np.flatnonzero(keep)
+                P = sp.csr_matrix((np.ones(len(pos)),
+                                   (np.arange(len(pos)), pos)),
+                                  shape=(len(pos), len(keep)))
+            else:
+                P = sp.diags(keep.astype(float))
+            self._compose(axis, P)
+        self.steps.append('remove_products_industries')
+        return self
+
+    def aggregate_regions(self, AV):
+        """ Aggregate regions: region n is merged into region AV[n]
+        (AV contains all natural numbers from 1 to its maximum) """
+        AV = np.asarray(AV, dtype=int)
+        if (np.unique(AV) - np.arange(1, AV.max() + 1)).any():
+            raise ValueError('Error: AV needs to contain all natural numbers'
+                             ' from 1,2,3,... to its maximum value.')
+        pos = sp.csr_matrix((np.ones(len(AV)), (AV - 1, np.arange(len(AV)))),
+                            shape=(AV.max(), len(AV)))
+        for axis in ('products', 'industries', 'fd'):
+            size = self._sizes[axis]
+            if size is None:
+                continue
+            if size % len(AV):
+                raise ValueError('Error: number of {} is not a true multiple'
+                                 ' of the number of regions.'.format(axis))
+            self._compose(axis, sp.kron(pos, sp.identity(size // len(AV))))
+        if self.sut.TL is not None:
+            self._compose('regions', pos)
+        self._sizes['regions'] = AV.max()
+        self.steps.append('aggregate_regions')
+        return self
+
+    def apply(self):
+        """ Transform all tables of the SUT once, return the SUT """
+        sut = self.sut
+        P_pro, P_ind = self._ops['products'], self._ops['industries']
+        P_fd, P_reg = self._ops['fd'], self._ops['regions']
+
+        sut.V = _transform(sut.V, P_pro, P_ind)
+        sut.U = _transform(sut.U, P_pro, P_ind)
+        if sut.Y is not None:
+            sut.Y = _transform(sut.Y, P_pro, P_fd if sut.Y.ndim == 2 else None)
+        sut.F = _transform(sut.F, None, P_ind)
+        sut.FY = _transform(sut.FY, None, P_fd)
+        sut.TL = _transform(sut.TL, P_pro, P_reg)
+        if 'aggregate_regions' in self.steps:
+            sut.regions = self._sizes['regions']
+
+        # Selections and permutations: carry labels and mappings along
+        pro, ind = _selection(P_pro), _selection(P_ind)
+        if pro is not None:
+            sut.l_pro = _take(sut.l_pro, pro) if sut.l_pro is not None else None
+            if np.ndim(sut.unit) > 0:
+                sut.unit = _take(np.asarray(sut.unit), pro)
+        if ind is not None and sut.l_ind is not None:
+            sut.l_ind = _take(sut.l_ind, ind)
+        if pro is not None and ind is not None:
+            for name, rows, cols in (('E_bar', pro, ind), ('Xi', pro, pro),
+                                     ('PHI', ind, pro), ('PSI', pro, ind),
+                                     ('Gamma', ind, pro)):
+                X = getattr(sut, name)
+                if X is not None:
+                    setattr(sut, name, _take(X, rows, cols))
+        sut.clear_cache()
+        return sut
+
+
 #############################################################################
 # Helper functions outside object
+def _sorting_matrix(PR):
+    """ Sparse permutation matrix of a position vector, or PR itself
+
+    PR[m] is the new position of old row m, as in
+    SupplyUseTable.build_Aggregation_Matrix.
+    """
+    if sp.issparse(PR) or np.ndim(PR) != 1:
+        return PR
+    positions = np.asarray(PR, dtype=np.intp)
+    if not _is_permutation(positions, len(positions)):
+        raise ValueError('Error: position vector PR is not a permutation of'
+                         ' 0, 1, ..., {}.'.format(len(positions) - 1))
+    return sp.csr_matrix((np.ones(len(positions)),
+                          (positions, np.arange(len(positions)))),
+                         shape=(len(positions), len(positions)))
+
+
+def _transform(X, P_rows=None, P_cols=None):
+    """ P_rows X P_cols' for dense or sparse X, skipping None operators
+
+    Operators that only select or re-sort (see _selection) are applied by
+    indexing instead of matrix products, and permutations of sparse tables
+    by relabelling their indices (see _relabel).
+    """
+    if X is None:
+        return None
+    rows, cols = _selection(P_rows), _selection(P_cols)
+    if rows is not None and cols is not None:
+        if sp.issparse(X) and _is_permutation(rows, X.shape[0]) and \
+                _is_permutation(cols, X.shape[1]):
+            return _relabel(X, rows, cols)
+        return _take(X, rows, cols)
+    if P_rows is not None:
+        X = P_rows.dot(X)
+    if P_cols is not None:
+        X = P_cols.dot(X.T).T
+    return X
+
+
+def _selection(P):
+    """ Source positions of an operator that only selects or re-sorts
+
+    Returns slice(None) for None (identity), the source position of each
+    row if every row of P holds exactly one 1, and None otherwise.
+    """
+    if P is None:
+        return slice(None)
+    P = sp.csr_matrix(P)
+    if np.all(np.diff(P.indptr) == 1) and np.all(P.data == 1):
+        return P.indices.copy()
+    return None
+
+
+def _is_permutation(idx, n):
+    """ True if idx (array or slice(None)) re-sorts all n positions """
+    if isinstance(idx, slice):
+        return True
+    return len(idx) == n and np.array_equal(np.sort(idx), np.arange(n))
+
+
+def _relabel(X, rows, cols):
+    """ Permute rows and columns of a sparse matrix by relabelling indices
+
+    New row i is old row rows[i] (same for cols). Only the row and column
+    indices are mapped, the data are not gathered by fancy indexing; the
+    conversion back to the format of X (other than coo) copies and sorts
+    the entries.
+    """
+    fmt = X.format
+    X = X.tocoo()
+    row, col = X.row, X.col
+    if not isinstance(rows, slice):
+        inverse = np.empty(len(rows), dtype=np.intp)
+        inverse[rows] = np.arange(len(rows))
+        row = inverse[row]
+    if not isinstance(cols, slice):
+        inverse = np.empty(len(cols), dtype=np.intp)
+        inverse[cols] = np.arange(len(cols))
+        col = inverse[col]
+    return sp.coo_matrix((X.data, (row, col)), shape=X.shape).asformat(fmt)
+
+
 def aggregate_regions_vectorised(X, AV=None, axis=None, regions=None):
     """ In an array X, aggregate regions, along either axis or both
 
@@ -1631,6 +3209,136 @@ def aggregate_within_regions(X, regions, axis=None):
 
     return X
 
+def plan_matrix_chain(factors):
+    """ Cheapest order of evaluation of a product of matrices
+
+    The cost of multiplying A [m, k] by B [k, n] is estimated from their
+    number of non-zeros (all entries, for dense matrices) under uniform
+    density: nnz(A) nnz(B) / k multiplications, giving a product with
+    m n (1 - (1 - d_A d_B)^k) non-zeros. The grouping with the fewest
+    estimated multiplications (then the fewest non-zeros) is found by
+    dynamic programming over all sub-chains.
+
+    Args
+    ----
+    factors: list of dense arrays or sparse matrices, of matching shapes
+
+    Returns
+    -------
+    order: nested tuples of positions of factors, e.g. (0, (1, 2)) for
+           factors[0] * (factors[1] * factors[2])
+    flops: estimated number of multiplications
+    nnz:   estimated number of non-zeros of the product
+
+    """
+    n = len(factors)
+    shapes = [X.shape for X in factors]
+    for (__, k), (k2, __) in zip(shapes[:-1], shapes[1:]):
+        if k != k2:
+            raise ValueError('Error: shapes of the factors do not match.')
+    # best[i, j] = (flops, nnz, order) of factors[i] ... factors[j]
+    best = {}
+    for i, X in enumerate(factors):
+        best[i, i] = (0., float(X.nnz if sp.issparse(X) else np.size(X)), i)
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length - 1
+            m, k_n = shapes[i][0], shapes[j][1]
+            for split in range(i, j):
+                left, right = best[i, split], best[split + 1, j]
+                k = shapes[split][1]
+                flops = left[1] * right[1] / k if k else 0.
+                density = (left[1] / (m * k)) * (right[1] / (k * k_n)) \
+                    if m * k * k_n else 0.
+                nnz = m * k_n * (-np.expm1(k * np.log1p(-density))
+                                 if density < 1 else 1.)
+                candidate = (left[0] + right[0] + flops, nnz,
+                             (left[2], right[2]))
+                if (i, j) not in best or candidate[:2] < best[i, j][:2]:
+                    best[i, j] = candidate
+    flops, nnz, order = best[0, n - 1]
+    return order, flops, nnz
+
+
+def matrix_chain(factors, order=None):
+    """ Product of a chain of dense and/or sparse matrices
+
+    Evaluated in the order given by plan_matrix_chain (or by order, as
+    returned by it), so that large or dense intermediate results are
+    avoided. Sparse products stay sparse; as soon as a dense factor is
+    involved, the result is a dense array.
+    """
+    if order is None:
+        order = plan_matrix_chain(factors)[0]
+
+    def evaluate(node):
+        if not isinstance(node, tuple):
+            return factors[node]
+        return _mul(evaluate(node[0]), evaluate(node[1]))
+
+    return evaluate(order)
+
+
+def _mul(A, B):
+    """ Matrix product of dense or sparse A and B """
+    if sp.issparse(A):
+        return A.dot(B)
+    if sp.issparse(B):
+        return B.T.dot(np.asarray(A).T).T
+    return np.dot(A, B)
+
+
+def _chain_from_left(factors, order):
+    """ Function B -> B * factors[1] * ... in the given order of the chain
+
+    B stands for factors[0] or for a block of its rows. The sub-products
+    that do not involve factors[0] are evaluated once, here.
+    """
+    if not isinstance(order, tuple):
+        return lambda B: B
+    left = _chain_from_left(factors, order[0])
+    right = matrix_chain(factors, order[1])
+    return lambda B: _mul(left(B), right)
+
+
+def stacked_product(blocks, factors):
+    """ Products of several blocks with the same chain of factors, at once
+
+    The blocks (e.g. U and F, or any other industry-indexed tables) are
+    stacked vertically into a single sparse operand, multiplied once by the
+    chain of factors (see matrix_chain) and the result is split back.
+
+    Args
+    ----
+    blocks:  list of dense arrays or sparse matrices with the same number of
+             columns; None entries are skipped
+    factors: list of dense arrays or sparse matrices, the chain of operators
+             applied from the right
+
+    Returns
+    -------
+    list of dense arrays, one per block (None for None blocks)
+
+    """
+    with instrument.phase('sparse') as ph:
+        present = [sp.csr_matrix(B, dtype=_acc_dtype(B)) for B in blocks
+                   if B is not None]
+        if not present:
+            return [None for B in blocks]
+        stacked = present[0] if len(present) == 1 else \
+            sp.vstack(present, format='csr')
+        ph.record(stacked)
+    with instrument.phase('product') as ph:
+        chain = [stacked] + list(factors)
+        product = _chain_from_left(chain, plan_matrix_chain(chain)[0])
+        # Blocks of rows in parallel, in the thread mode (see pysut.parallel)
+        result = parallel.map_rows(lambda B: _dense(product(B)), stacked)
+        ph.record(result)
+    splits = np.cumsum([B.shape[0] for B in present])[:-1]
+    parts = iter(np.split(result, splits, axis=0))
+    return [None if B is None else next(parts) for B in blocks]
+
+
 def matrix_norm(Z, V, F_con=np.empty(0), keep_size=False, just_filters=False):
     """ Normalizes a flow matrices, even if some rows and columns are null
 
@@ -1712,8 +3420,8 @@ def matrix_norm(Z, V, F_con=np.empty(0), keep_size=False, just_filters=False):
     #com2 = np.size(Z, 0)
 
     # Total production (q, q_tr) and intermediate consumptin (u) vectors
-    q = np.sum(V, 1)
-    u = np.sum(Z, 1)
+    q = np.sum(V, 1, dtype=_acc_dtype(V))
+    u = np.sum(Z, 1, dtype=_acc_dtype(Z))
     if np.max(Z.shape) == com * ind:
         q_tr = np.zeros(ind * com)
         for i in range(ind):
@@ -1745,23 +3453,27 @@ def matrix_norm(Z, V, F_con=np.empty(0), keep_size=False, just_filters=False):
     else:
         # Apply filters and normalize
 
-        # remove empty entried, diagonalize, inverse...
-        if np.size(Z, 1) == com:
-            q_inv = _one_over(q[nn_out])
-        else:
-            q_inv = _one_over(q_tr[nn_out])
+        with instrument.phase('normalization') as ph:
+            # remove empty entried, diagonalize, inverse...
+            if np.size(Z, 1) == com:
+                q_inv = _one_over(q[nn_out])
+            else:
+                q_inv = _one_over(q_tr[nn_out])
 
-        # and use to normalize product and stressor flows.
-        A = Z[nn_in, :][:, nn_out] * q_inv
-        if F_con.size:
-            S = F_con[:, nn_out] * q_inv
-        else:
-            S = np.empty(0)
+            # and use to normalize product and stressor flows.
+            A = Z[nn_in, :][:, nn_out] * q_inv
+            if F_con.size:
+                S = F_con[:, nn_out] * q_inv
+            else:
+                S = np.empty(0)
+            ph.record(A, S)
 
         # Restore size if need be
         if keep_size:
-            A = restore_size(A, nn_in, nn_out)
-            S = restore_size(S, nn_out=nn_out)
+            with instrument.phase('restore') as ph:
+                A = restore_size(A, nn_in, nn_out)
+                S = restore_size(S, nn_out=nn_out)
+                ph.record(A, S)
 
     # Return
     return (A, S, nn_in, nn_out)
@@ -1790,6 +3502,125 @@ def restore_size(X, nn_in=None, nn_out=None):
     return X1
 
 
+def _take(X, rows=None, cols=None):
+    """ Select rows and columns of a dense or sparse table
+
+    rows and cols are slices (giving views of dense arrays) or arrays of
+    positions. None selects everything. For 1-d arrays, cols is ignored.
+    """
+    rows = slice(None) if rows is None else rows
+    cols = slice(None) if cols is None else cols
+    if np.ndim(X) == 1:
+        return X[rows]
+    if isinstance(rows, slice) or isinstance(cols, slice):
+        return X[rows, cols]
+    return X[np.ix_(rows, cols)]
+
+
+def _as_slice(idx):
+    """ Turn an array of positions into an equivalent slice, if possible
+
+    Regularly spaced, increasing positions (e.g. one region, or the same
+    product in each region) can be expressed as a slice, which lets numpy
+    return a view instead of a copy. Otherwise the positions are returned
+    unchanged, as an integer array.
+    """
+    idx = np.asarray(idx)
+    if idx.dtype == bool:
+        idx = np.flatnonzero(idx)
+    if idx.size == 0:
+        return idx.astype(np.intp)
+    if idx.size == 1:
+        return slice(int(idx[0]), int(idx[0]) + 1)
+    step = idx[1] - idx[0]
+    if step > 0 and np.all(np.diff(idx) == step):
+        return slice(int(idx[0]), int(idx[-1]) + 1, int(step))
+    return idx
+
+
+def _nbytes(X):
+    """ Memory of the data of a dense or sparse array, 0 for None """
+    if X is None:
+        return 0
+    if sp.issparse(X):
+        X = X.tocsr()
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return np.asarray(X).nbytes
+
+
+def _column_max(rows, cols, values, ncols):
+    """ Largest value in each column, among the given entries of a table
+
+    Returns
+    -------
+    positions : row of the largest value of each column, -1 if none [ncols]
+    amounts :   largest value of each column, 0 if none [ncols]
+    """
+    positions = np.full(ncols, -1, dtype=np.intp)
+    amounts = np.zeros(ncols)
+    if len(values):
+        order = np.lexsort((-values, cols))  # by column, then decreasing
+        first = order[np.r_[True, np.diff(cols[order]) != 0]]
+        positions[cols[first]] = rows[first]
+        amounts[cols[first]] = values[first]
+    return positions, amounts
+
+
+def _dense(X, dtype=None):
+    """ Dense array of a dense or sparse matrix (optionally cast to dtype) """
+    X = X.toarray() if sp.issparse(X) else np.asarray(X)
+    return X if dtype is None else X.astype(dtype, copy=False)
+
+
+def _sums(X, axis):
+    """ Row (axis=1) or column (axis=0) sums of a dense or sparse table, 1-d """
+    return np.asarray(X.sum(axis=axis, dtype=_acc_dtype(X))).reshape(-1)
+
+
+def _count_nonzero(X, axis=None):
+    """ Number of non-zero entries of a dense or sparse table, along axis """
+    if sp.issparse(X):
+        X = sp.csr_matrix(X != 0)  # without explicitly stored zeros
+        if axis is None:
+            return X.nnz
+        return np.asarray(X.getnnz(axis=axis)).reshape(-1)
+    return np.asarray((np.asarray(X) != 0).sum(axis=axis))
+
+
+def _diag_status(q, g, diag):
+    """ Status of the diagonal of a square supply table, per product
+
+    0: non-zero supply by main producer. Normal situation, OK
+    1: no supply by apparent main producer, problem
+    2: product only produced by other sectors, this sector is empty
+    3: product not produced, apparent main sector produces only other
+       products
+    4: product not produced and main sector is empty
+
+    Args
+    ----
+    q: total product output [com], g: total industry output [com],
+    diag: diagonal of V [com]
+    """
+    produced, active = np.asarray(q) != 0, np.asarray(g) != 0
+    return np.select([produced & active & (np.asarray(diag) != 0),
+                      produced & active,
+                      produced,
+                      active],
+                     [0, 1, 2, 3], 4)
+
+
+def _acc_dtype(X):
+    """ float64 for reduced-precision floating point arrays, else None
+
+    Passed as dtype to sums and sparse conversions, so that tables stored
+    in float32 (or float16) are accumulated in float64.
+    """
+    dtype = getattr(X, 'dtype', None)
+    if dtype is not None and dtype.kind == 'f' and dtype.itemsize < 8:
+        return np.float64
+    return None
+
 
 def _one_over(x):
     """Simple function to invert each element of vector. if 0, stays 0, not Inf
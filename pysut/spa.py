@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Structural path analysis (SPA) of constructed input-output models
+
+Finds the supply-chain paths that contribute most to the footprint of a
+final demand, for the A and S matrices returned by the constructs of
+SupplyUseTable (btc, ctc, itc, esc, lsc, pc_agg, psc_agg, aac_agg).
+
+Instead of expanding the power series of the Leontief inverse
+(I + A + A^2 + ...) tier by tier, paths are explored best-first: a priority
+queue always expands the path whose upstream footprint is largest, and a
+path is dropped as soon as its whole upstream footprint (the multiplier of
+its last product times the amount of this product, an upper bound of
+anything found further upstream) falls below the cutoff.
+
+dependencies:
+    numpy >= 1.9
+    scipy >= 0.14
+
+"""
+
+from __future__ import division, print_function
+import heapq
+import logging
+from collections import namedtuple
+import numpy as np
+from scipy import sparse as sp
+
+from .leontief import LeontiefSystem
+
+Path = namedtuple('Path', ['value', 'nodes', 'amount', 'upstream'])
+Path.__doc__ = """ A supply-chain path found by structural path analysis
+
+value :    direct extension of the last product of the path, s_k * amount
+nodes :    products along the path, from the product in final demand to the
+           most upstream supplier
+amount :   output of the last product required along this path
+upstream : total extension upstream of (and including) the last product,
+           m_k * amount, where m are the multipliers S (I - A)^-1
+"""
+
+
+def structural_paths(A, s, y, max_paths=100, cutoff=1e-3, max_depth=None,
+                     m=None, max_expansions=None):
+    """ Dominant supply-chain paths of the footprint s (I - A)^-1 y
+
+    Args
+    ----
+    A :         Normalized technical requirements [com, com], from a
+                construct with keep_size=True
+    s :         Extension coefficients of one stressor or impact [com], e.g.
+                a row of S or of C S
+    y :         Final demand [com]
+    max_paths : path budget, the number of paths to return at most
+    cutoff :    ignore paths whose upstream footprint is smaller than this
+                fraction of the total footprint
+    max_depth : maximum number of supply tiers (default: no limit)
+    m :         Multipliers s (I - A)^-1 [com], computed if None
+    max_expansions : maximum number of paths taken from the queue
+                (default: 100 * max_paths), a safeguard against slowly
+                converging systems
+
+    Returns
+    -------
+    paths : list of Path, by decreasing absolute value
+    total : total footprint s (I - A)^-1 y
+
+    For constructs with negative coefficients (e.g. btc or psc_agg), the
+    upstream footprint of a path is not a strict upper bound of its
+    sub-paths, and the pruning becomes a heuristic.
+
+    """
+    A = sp.csc_matrix(A)
+    s = np.asarray(s, dtype=float).reshape(-1)
+    y = np.asarray(y, dtype=float).reshape(-1)
+    if m is None:
+        system = LeontiefSystem(A, s.reshape((1, -1)))
+        m = system.multipliers()[0]
+    total = m.dot(y)
+    threshold = abs(total) * cutoff
+    if max_expansions is None:
+        max_expansions = 100 * max_paths
+
+    indptr, indices, data = A.indptr, A.indices, A.data
+
+    # Priority queue of (-|upstream footprint|, counter, nodes, amount); the
+    # counter keeps the ordering stable and avoids comparing tuples of nodes
+    queue = []
+    counter = 0
+    for j in np.flatnonzero(y):
+        bound = abs(m[j] * y[j])
+        if bound >= threshold and bound > 0:
+            queue.append((-bound, counter, (int(j),), y[j]))
+            counter += 1
+    heapq.heapify(queue)
+
+    paths = []
+    expansions = 0
+    while queue and len(paths) < max_paths and expansions < max_expansions:
+        __, __, nodes, amount = heapq.heappop(queue)
+        expansions += 1
+        k = nodes[-1]
+        value = s[k] * amount
+        if abs(value) >= threshold and value != 0:
+            paths.append(Path(value, nodes, amount, m[k] * amount))
+
+        if max_depth is not None and len(nodes) > max_depth:
+            continue
+        # Suppliers of product k: non-zero entries of column k of A
+        for p in range(indptr[k], indptr[k + 1]):
+            i = indices[p]
+            child = amount * data[p]
+            bound = abs(m[i] * child)
+            if bound >= threshold and bound > 0:
+                heapq.heappush(queue, (-bound, counter, nodes + (int(i),),
+                                       child))
+                counter += 1
+
+    if queue and expansions >= max_expansions:
+        logging.info("Structural path analysis stopped after {} expansions"
+                     .format(expansions))
+    paths.sort(key=lambda path: -abs(path.value))
+    return paths, total
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic multiregional supply and use tables
+
+Generators of SupplyUseTable instances of any size, for scaling studies,
+benchmarks and stress tests without access to licensed MRIO data:
+
+    + synthetic_sut: a random multiregional SUT with a given number of
+      regions, products and industries per region, density of the use
+      table, rate of coproduction, share of exclusive secondary products
+      and number of extensions
+    + replicate: scale up an existing (e.g. test) SUT by Kronecker
+      replication of its regions, with optional trade between the copies
+
+Both are deterministic for a given seed. The generated tables are market
+balanced (V 1 = U 1 + Y 1) and have productive use tables (I - A is
+invertible for all constructs).
+
+dependencies:
+    numpy >= 1.9
+    scipy >= 0.14
+
+"""
+
+from __future__ import division, print_function
+import numpy as np
+from scipy import sparse as sp
+
+from .pySUT import SupplyUseTable
+
+
+def synthetic_sut(regions=2, products=10, industries=None, density=0.1,
+                  coproduction=0.1, exclusive=0., extensions=5,
+                  final_demand=2, trade=0.3, mappings=True, labels=True,
+                  seed=None):
+    """ Random multiregional supply and use table
+
+    Each industry has one primary product in its own region. If there are
+    more industries than products, several industries share a primary
+    product. Exclusive secondary products have no primary producer in their
+    region: they are only supplied as secondary product of one industry.
+
+    Args
+    ----
+    regions:      number of regions
+    products:     number of products per region
+    industries:   number of industries per region (default: products)
+    density:      share of non-zero entries of the use table U
+    coproduction: share of industries with a secondary product (of their
+                  region), in addition to the suppliers of exclusive
+                  secondary products
+    exclusive:    share of the products of each region that are exclusive
+                  secondary products
+    extensions:   number of extensions (rows of F and FY)
+    final_demand: number of final demand categories per region
+    trade:        share of intermediate and final use that is imported
+                  from other regions (multiregional only)
+    mappings:     also build E_bar, Xi (build_mr_Xi), Gamma (build_mr_Gamma)
+                  and PSI (one random intensive property per product)
+    labels:       set l_pro, l_ind and l_ext, with region and name columns
+    seed:         seed of the random number generator
+
+    Returns
+    -------
+    SupplyUseTable, with V, U, Y, F and FY, dense
+
+    """
+    rng = np.random.RandomState(seed)
+    industries = products if industries is None else industries
+    if not 0 <= exclusive < 1:
+        raise ValueError('Error: the share of exclusive secondary products'
+                         ' must be in [0, 1).')
+    com, ind = regions * products, regions * industries
+
+    # Primary product of each industry, and the exclusive secondary
+    # products of each region
+    n_excl = min(int(round(exclusive * products)), products - 1)
+    E_bar = np.zeros((com, ind), dtype=int)
+    V = np.zeros((com, ind))
+    for r in range(regions):
+        p0, i0 = r * products, r * industries
+        order = rng.permutation(products)
+        excl, primary = order[:n_excl], np.sort(order[n_excl:])
+        for i in range(industries):
+            p = p0 + primary[i % len(primary)]
+            E_bar[p, i0 + i] = 1
+            V[p, i0 + i] = rng.uniform(50., 100.)
+
+        # Secondary production, within the region
+        with_secondary = np.flatnonzero(rng.rand(industries) < coproduction)
+        for i in with_secondary:
+            p = p0 + rng.randint(products)
+            if not E_bar[p, i0 + i]:
+                V[p, i0 + i] = rng.uniform(0.05, 0.3) * V[:, i0 + i].sum()
+        for p in excl:
+            i = i0 + rng.randint(industries)
+            V[p0 + p, i] += rng.uniform(0.05, 0.3) * V[:, i].sum()
+
+    # Use table: random sparse inputs, mostly domestic, up to 60% of the
+    # output of each industry
+    g = V.sum(0)
+    mask = rng.rand(com, ind) < density
+    U = rng.lognormal(size=(com, ind)) * mask
+    if regions > 1:
+        domestic = np.kron(np.eye(regions), np.ones((products, industries)))
+        U *= np.where(domestic, 1. - trade, trade / (regions - 1))
+    U *= rng.uniform(0.2, 0.6, ind) * g / np.maximum(U.sum(0), 1e-300)
+
+    # Balance: keep intermediate use of each product below 80% of its
+    # supply, the rest goes to final demand
+    q = V.sum(1)
+    u = U.sum(1)
+    U *= np.minimum(1., 0.8 * q / np.maximum(u, 1e-300))[:, None]
+    y = q - U.sum(1)
+
+    # Final demand of each product, shared out over the categories of all
+    # regions (more to its own region)
+    fd = regions * final_demand
+    shares = rng.rand(com, fd)
+    if regions > 1:
+        domestic = np.kron(np.eye(regions), np.ones((products, final_demand)))
+        shares *= np.where(domestic, 1. - trade, trade / (regions - 1))
+    Y = shares / shares.sum(1)[:, None] * y[:, None]
+
+    # Extensions, roughly proportional to output
+    F = rng.lognormal(size=(extensions, ind)) * \
+        (rng.rand(extensions, ind) < 0.5) * g
+    FY = rng.lognormal(size=(extensions, fd)) * \
+        (rng.rand(extensions, fd) < 0.2) * Y.sum(0)
+
+    sut = SupplyUseTable(V=V, U=U, Y=Y, F=F, FY=FY, regions=regions,
+                         name='synthetic SUT')
+    if labels:
+        sut.l_pro = _labels(regions, 'P', products)
+        sut.l_ind = _labels(regions, 'I', industries)
+        sut.l_ext = np.array([['E{}'.format(k)] for k in range(extensions)],
+                             dtype=object)
+    if mappings:
+        sut.E_bar = E_bar
+        sut.PSI = np.tile(rng.uniform(0.5, 2., (com, 1)), (1, ind))
+        sut.build_mr_Xi()
+        sut.build_mr_Gamma()
+    return sut
+
+
+def replicate(sut, copies=2, trade=0., noise=0., seed=None):
+    """ Larger SUT made of copies of the regions of sut
+
+    Every table is replicated by a Kronecker product: the regions of the
+    result are copies of the regions of sut, in sut.regions * copies
+    regions. With trade > 0, a share trade of all intermediate and final use
+    is imported from the other copies (without changing the totals, so a
+    balanced SUT stays balanced).
+
+    Args
+    ----
+    sut:    SupplyUseTable, e.g. a test fixture (dense or sparse tables)
+    copies: number of copies
+    trade:  share of use imported from other copies
+    noise:  standard deviation of lognormal factors applied to the
+            non-zero entries of the copies, to break their symmetry (the
+            tables are then no longer exactly balanced)
+    seed:   seed of the random number generator for the noise
+
+    Returns
+    -------
+    SupplyUseTable with copies times as many products, industries and
+    final demand categories, and the same extensions
+
+    """
+    rng = np.random.RandomState(seed)
+    I = np.eye(copies)
+    if copies > 1:
+        M = (1. - trade) * I + trade / (copies - 1) * (1. - I)
+    else:
+        M = I
+    ones = np.ones((1, copies))
+
+    def kron(K, X):
+        if X is None:
+            return None
+        if sp.issparse(X):
+            X = sp.kron(K, X, format=X.format)
+            if noise:
+                X.data = X.data * rng.lognormal(0., noise, X.data.shape)
+            return X
+        X = np.kron(K, X)
+        if noise:
+            X = X * rng.lognormal(0., noise, X.shape)
+        return X
+
+    new = SupplyUseTable(V=kron(I, sut.V), U=kron(M, sut.U),
+                         Y=kron(M, sut.Y), F=kron(ones, sut.F),
+                         FY=kron(ones, sut.FY), TL=None,
+                         unit=sut.unit, version=sut.version, year=sut.year,
+                         name=sut.name, regions=sut.regions * copies,
+                         dtype=sut.dtype)
+    for name in ('E_bar', 'Xi', 'PSI', 'Gamma'):
+        X = getattr(sut, name)
+        if X is not None:
+            setattr(new, name, np.kron(I, X).astype(X.dtype))
+    if sut.PHI is not None:
+        new.PHI = np.kron(I, sut.PHI)
+    new.C = sut.C
+    new.keep_stressors = sut.keep_stressors
+    new.l_ext, new.l_imp = sut.l_ext, sut.l_imp
+    new.l_pro = _replicate_labels(sut.l_pro, copies)
+    new.l_ind = _replicate_labels(sut.l_ind, copies)
+    return new
+
+
+def _labels(regions, prefix, n):
+    """ Label table [region, name] of n products (industries) per region """
+    return np.array([['R{}'.format(r), '{}{}'.format(prefix, i)]
+                     for r in range(regions) for i in range(n)],
+                    dtype=object)
+
+
+def _replicate_labels(labels, copies):
+    """ Labels of the copies: region labels (first column) get a suffix """
+    if labels is None:
+        return None
+    labels = np.asarray(labels, dtype=object)
+    if labels.ndim == 1:
+        labels = labels.reshape((-1, 1))
+    blocks = []
+    for c in range(copies):
+        block = labels.copy()
+        block[:, 0] = ['{}_{}'.format(x, c) for x in labels[:, 0]]
+        blocks.append(block)
+    return np.vstack(blocks)
@@ -1,2 +1,9 @@
 from .test_known_results import KnownResultsTestCase
 from .test_allocations_constructs import TestAllocationsConstructs
+from .test_table_handling import TestTableHandling
+from .test_leontief import TestLeontief
+from .test_montecarlo import TestMonteCarlo
+from .test_synthetic import TestSynthetic
+from .test_instrument import TestInstrument
+from .test_cli import TestCli
+from .test_parallel import TestParallel
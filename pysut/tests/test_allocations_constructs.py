@@ -255,6 +255,13 @@ class TestAllocationsConstructs(unittest.TestCase):
                        [0,   0, 0,  0]])
         npt.assert_array_equal(V0, sut.V_tild)
 
+        # In-place edits of V are not detected until the cache is cleared
+        sut.V[1, 2] = 2.
+        self.assertEqual(sut.V_bar[1, 2], 6.)
+        sut.clear_cache()
+        self.assertEqual(sut.V_bar[1, 2], 2.)
+        self.assertEqual(sut.V_tild[1, 2], 0.)
+
 
 
 
@@ -985,5 +992,126 @@ class TestAllocationsConstructs(unittest.TestCase):
         npt.assert_allclose(np.empty(0), Z, atol=self.atol)
         npt.assert_allclose(np.empty(0), F_con, atol=self.atol)
 
+    def test_matrix_chain(self):
+        """ Planned order of matrix products and identical results"""
+        rng = np.random.RandomState(0)
+        tall = rng.rand(50, 2)
+        wide = rng.rand(2, 50)
+        vector = rng.rand(50, 1)
+        order, flops, nnz = pysut.plan_matrix_chain([tall, wide, vector])
+        self.assertEqual(order, (0, (1, 2)))
+        npt.assert_allclose(flops, 2 * 50 + 50 * 2)
+        npt.assert_allclose(pysut.matrix_chain([tall, wide, vector]),
+                            tall.dot(wide).dot(vector), atol=self.atol)
+
+        # Sparse: a dense first product is avoided, result stays sparse
+        dense_row = pysut.sp.csr_matrix(np.ones((1, 40)))
+        column = pysut.sp.csr_matrix(np.ones((40, 1)))
+        diagonal = pysut.sp.identity(40, format='csr')
+        factors = [column, dense_row, diagonal]
+        self.assertEqual(pysut.plan_matrix_chain(factors)[0], (0, (1, 2)))
+        product = pysut.matrix_chain(factors)
+        self.assertTrue(pysut.sp.issparse(product))
+        npt.assert_allclose(product.toarray(), np.ones((40, 40)))
+
+        # Mixed dense and sparse, explicit order
+        npt.assert_allclose(
+            pysut.matrix_chain([tall, pysut.sp.csr_matrix(wide), vector],
+                               order=((0, 1), 2)),
+            tall.dot(wide).dot(vector), atol=self.atol)
+        self.assertRaises(ValueError, pysut.plan_matrix_chain, [tall, tall])
+
+    def test_stacked_product(self):
+        """ Blocks multiplied at once equal separate products"""
+        rng = np.random.RandomState(1)
+        U = rng.rand(4, 3)
+        F = pysut.sp.csr_matrix(rng.rand(6, 3) * (rng.rand(6, 3) > 0.5))
+        E = rng.rand(3, 3)
+        G = pysut.sp.identity(3, format='csc')
+        Z, none, F_con = pysut.stacked_product([U, None, F], [E, G])
+        self.assertIsNone(none)
+        npt.assert_allclose(Z, U.dot(E), atol=self.atol)
+        npt.assert_allclose(F_con, F.dot(E), atol=self.atol)
+        self.assertEqual(pysut.stacked_product([None], [E]), [None])
+
+    def test_extensions(self):
+        """ Extensions reallocated without the product flows, and appended"""
+        F2 = np.random.RandomState(0).rand(3, 4)
+        F2a = np.random.RandomState(1).rand(3, 3)
+        cases = [
+            ('pc_agg', dict(U=self.Uu, V=self.V, PSI=self.PSI), F2),
+            ('psc_agg', dict(U=self.Uu, V=self.V, E_bar=self.E_bar,
+                             Xi=self.Xi), F2),
+            ('aac_agg', dict(U=self.Uu, V=self.V, E_bar=self.E_bar,
+                             Gamma=self.Gamma), F2),
+            ('lsc', dict(U=self.Uu, V=self.V, E_bar=self.E_bar), F2),
+            ('itc', dict(U=self.Uu, V=self.V), F2),
+            ('esc', dict(U=self.Uu, V=self.V, E_bar=self.E_bar), F2),
+            ('btc', dict(U=self.Ua, V=self.Va), F2a),
+            ('ctc', dict(U=self.Ua, V=self.Va), F2a)]
+        for construct, tables, F_new in cases:
+            F = self.Fa if F_new is F2a else self.F
+            sut = SupplyUseTable(F=F, **tables)
+            result = getattr(sut, construct)()
+            S = result[3 if construct == 'psc_agg' else 1]
+            expected = getattr(SupplyUseTable(F=F_new, **tables), construct)(
+                return_flows=True)
+            S0, F_con0 = expected[3 if construct == 'psc_agg' else 1], \
+                expected[-1]
+            S2, F_con2 = sut.extensions(construct, F_new, return_flows=True)
+            npt.assert_allclose(S2, S0, atol=self.atol)
+            npt.assert_allclose(F_con2, F_con0, atol=self.atol)
+
+            # New rows, A untouched
+            S_all = sut.append_extensions(construct, F_new[:1], S)
+            npt.assert_allclose(S_all, np.vstack([S, S0[:1]]), atol=self.atol)
+            self.assertEqual(sut.F.shape[0], F.shape[0] + 1)
+
+        # Without a previous run, the construct is run first
+        sut = SupplyUseTable(U=self.Uu, V=self.V, E_bar=self.E_bar)
+        npt.assert_allclose(sut.extensions('esc', self.F, keep_size=False)[0],
+                            SupplyUseTable(U=self.Uu, V=self.V, F=self.F,
+                                           E_bar=self.E_bar).esc(False)[1],
+                            atol=self.atol)
+        self.assertRaises(ValueError, sut.extensions, 'esc')
+        self.assertFalse(('extensions', 'esc') in sut._cache)
+
+        # Kept allocations, stale after in-place edits until cleared
+        sut = SupplyUseTable(U=self.Uu, V=self.V.copy(), F=self.F,
+                             E_bar=self.E_bar, keep_allocations=True)
+        S0 = sut.esc()[1]
+        self.assertTrue(('extensions', 'esc') in sut._cache)
+        sut.V *= 2
+        npt.assert_allclose(sut.extensions('esc')[0], S0, atol=self.atol)
+        sut.clear_allocations()
+        self.assertFalse(('extensions', 'esc') in sut._cache)
+        npt.assert_allclose(sut.extensions('esc')[0], S0 / 2, atol=self.atol)
+        sut.l_ext = self.l_ext
+        self.assertRaises(ValueError, sut.append_extensions, 'esc', F2,
+                          np.empty(0))
+
+    def test_characterization(self):
+        """ Constructs allocating impacts C F instead of extensions F"""
+        C = np.array([[1., 25.], [0.5, 0.]])
+        for construct, tables in (
+                ('aac_agg', dict(U=self.Uu, V=self.V, E_bar=self.E_bar,
+                                 Gamma=self.Gamma)),
+                ('esc', dict(U=self.Uu, V=self.V, E_bar=self.E_bar)),
+                ('btc', dict(U=self.Ua, V=self.Va))):
+            F = self.Fa if construct == 'btc' else self.F
+            A0, S0 = getattr(SupplyUseTable(F=F, **tables), construct)()[:2]
+            sut = SupplyUseTable(F=F, C=C, **tables)
+            A, S = getattr(sut, construct)()[:2]
+            npt.assert_allclose(A, A0, atol=self.atol)
+            npt.assert_allclose(S, C.dot(S0), atol=self.atol)
+
+            sut.characterize(pysut.sp.csr_matrix(C), labels=['GWP', 'X'],
+                             keep_stressors=True)
+            S = getattr(sut, construct)()[1]
+            npt.assert_allclose(S, np.vstack([S0, C.dot(S0)]), atol=self.atol)
+            npt.assert_allclose(sut.extensions(construct)[0], S,
+                                atol=self.atol)
+        self.assertRaises(ValueError, sut.characterize, np.ones((2, 3)))
+
 #    if __name__ == '__main__':
 #        unittest.main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the command line interface
+"""
+from __future__ import division
+from .. import SupplyUseTable # remove and import the class manually if this unit test is run as standalone script
+from .. import cli # remove and import the class manually if this unit test is run as standalone script
+import numpy as np
+import numpy.testing as npt
+import os
+import shutil
+import tempfile
+import unittest
+
+###############################################################################
+class TestCli(unittest.TestCase):
+    """ Unit test class for the pysut command"""
+
+    def setUp(self):
+        """ A square SUT with 2 regions, saved to a temporary directory"""
+        self.atol = 1e-08
+        V = np.array([[5., 1., 0.,   0., 0., 0.],
+                      [0., 4., 0.,   0., 0., 0.],
+                      [0., 0., 3.,   0., 0., 0.],
+                      #
+                      [0., 0., 0.,   6., 0., 0.],
+                      [0., 0., 0.,   1., 2., 0.],
+                      [0., 0., 0.,   0., 0., 7.]])
+        U = np.array([[0., 1., 0.,   0.5, 0., 0.],
+                      [1., 0., 0.,   0., 0., 0.],
+                      [0., 0., 0.,   0., 0.5, 0.],
+                      #
+                      [0.5, 0., 0.,  0., 1., 0.],
+                      [0., 0., 0.,   2., 0., 0.],
+                      [0., 0., 0.5,  0., 0., 0.]])
+        Y = np.ones((6, 4))
+        F = np.array([[10., 2., 1.,   8., 3., 1.]])
+        FY = np.array([[1., 0., 2., 0.]])
+        self.sut = SupplyUseTable(V=V, U=U, Y=Y, F=F, FY=FY, regions=2,
+                                  E_bar=np.eye(6, dtype=int))
+        self.directory = tempfile.mkdtemp()
+        self.table = os.path.join(self.directory, 'table.npz')
+        self.sut.save(self.table)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_run(self):
+        """ Constructs, footprints and aggregation, in order"""
+        output = os.path.join(self.directory, 'out.npz')
+        aggregated = os.path.join(self.directory, 'agg.npz')
+        self.assertEqual(cli.main(['run', '-q', self.table, 'btc',
+                                   'footprints', 'aggregate=1,1',
+                                   'save=' + aggregated, 'esc', '-o',
+                                   output]), 0)
+        A, S = self.sut.btc()[:2]
+        with np.load(output) as results:
+            self.assertEqual(sorted(results.files),
+                             ['btc.A', 'btc.S', 'btc.footprints', 'esc.A',
+                              'esc.S'])
+            npt.assert_allclose(results['btc.A'], A, atol=self.atol)
+            npt.assert_allclose(results['btc.footprints'],
+                                self.sut.footprints(A, S), atol=self.atol)
+            self.assertEqual(results['esc.A'].shape, (3, 3))
+        sut = SupplyUseTable.load(aggregated)
+        self.assertEqual(sut.regions, 1)
+        npt.assert_allclose(sut.V.sum(), self.sut.V.sum(), atol=self.atol)
+        npt.assert_array_equal(sut.E_bar, np.eye(3))
+
+        # In the thread mode
+        self.assertEqual(cli.main(['run', '-q', '-j', '2', self.table, 'btc',
+                                   '-o', output]), 0)
+        with np.load(output) as results:
+            npt.assert_allclose(results['btc.A'], A, atol=self.atol)
+
+        # Default output file, flows
+        self.assertEqual(cli.main(['run', '-q', '--flows', self.table,
+                                   'ctc']), 0)
+        with np.load(os.path.join(self.directory,
+                                  'table_results.npz')) as results:
+            self.assertTrue('ctc.F_con' in results.files)
+
+    def test_errors(self):
+        """ Unknown operations and operations in the wrong order"""
+        self.assertRaises(SystemExit, cli.main, ['run', self.table, 'xyz'])
+        self.assertRaises(SystemExit, cli.main, ['run', self.table,
+                                                 'aggregate'])
+        self.assertEqual(cli.main(['run', '-q', self.table, 'footprints']), 1)
+        self.assertEqual(cli.parse_operation('aggregate=1,2'),
+                         ('aggregate', '1,2'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the instrumentation of constructs
+"""
+from __future__ import division
+from .. import SupplyUseTable # remove and import the class manually if this unit test is run as standalone script
+from .. import instrument # remove and import the class manually if this unit test is run as standalone script
+import numpy as np
+import numpy.testing as npt
+import unittest
+
+###############################################################################
+class TestInstrument(unittest.TestCase):
+    """ Unit test class for instrumentation events"""
+
+    def setUp(self):
+        """ SuUT with secondary production and alternate activities"""
+        V = np.array([[2, 0, 0, 0],
+                      [1, 1, 3, 0],
+                      [0, 0, 0, 11]], dtype=float)
+        U = np.array([[0., 0., 0., 0.],
+                      [0., 0., 0., 0.75],
+                      [4., 0.75, 2., 0.]])
+        F = np.array([[10., 4., 15., 18.],
+                      [0., 0., 1., 0.]])
+        E_bar = np.array([[1, 0, 0, 0],
+                          [0, 1, 1, 0],
+                          [0, 0, 0, 1]])
+        Gamma = np.array([[1, 0, 0],
+                          [0, 0, 0],
+                          [0, 1, 0],
+                          [0, 0, 1]])
+        self.sut = SupplyUseTable(U=U, V=V, F=F, E_bar=E_bar, Gamma=Gamma)
+
+    def test_phases(self):
+        """ Time, peak allocation and nnz of each phase of a construct"""
+        with instrument.profile() as prof:
+            A, S = self.sut.esc()[:2]
+        summary = prof.summary()
+        self.assertEqual(list(summary.keys()),
+                         [('esc', 'sparse'), ('esc', 'product'),
+                          ('esc', 'normalization'), ('esc', 'restore'),
+                          ('esc', 'total')])
+        self.assertEqual(summary['esc', 'restore']['nnz'],
+                         np.count_nonzero(A) + np.count_nonzero(S))
+        for row in summary.values():
+            self.assertEqual(row['calls'], 1)
+            self.assertTrue(row['time'] >= 0)
+            self.assertTrue(row['peak'] >= 0)
+        # The total includes its phases
+        self.assertTrue(summary['esc', 'total']['peak'] >=
+                        summary['esc', 'product']['peak'])
+        self.assertTrue('esc' in prof.report())
+        self.assertFalse(instrument.enabled())
+
+    def test_events(self):
+        """ Structured events instead of printed progress"""
+        events = []
+        instrument.add_callback(events.append)
+        try:
+            A0 = self.sut.aac_agg()[0]
+        finally:
+            instrument.remove_callback(events.append)
+        residuals = [e for e in events if e.name == 'residual']
+        self.assertTrue(residuals)
+        self.assertTrue(all(e.construct == 'aac_agg' and e.time is None
+                            for e in residuals))
+        iterations = [e for e in events if e.name == 'alternate_tech'][0]
+        self.assertEqual(iterations.data['iterations'],
+                         residuals[-1].data['iteration'])
+
+        # Nothing recorded without callbacks, same results
+        n = len(events)
+        npt.assert_allclose(self.sut.aac_agg()[0], A0)
+        self.assertEqual(len(events), n)
+
+        # Failing phases are reported too
+        with instrument.profile(memory=False) as prof:
+            with self.assertRaises(ZeroDivisionError):
+                with instrument.phase('fails', construct='test'):
+                    1 / 0
+        self.assertEqual(prof.events[0].data['error'], 'ZeroDivisionError')
+        self.assertEqual(prof.events[0].peak, None)
+
+if __name__ == '__main__':
+    unittest.main()
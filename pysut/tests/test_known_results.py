@@ -313,6 +313,20 @@ class KnownResultsTestCase(unittest.TestCase):
                        [ 78,  80, 168, 172]])
         npt.assert_array_equal(U0, Uout)
 
+    def test_aggregate_regions(self):
+        U = np.arange(54.).reshape((9, 6))
+        Y = np.arange(27.).reshape((9, 3))
+        F = np.arange(12.).reshape((2, 6))
+        av = np.array([1, 2, 2])
+        sut = SupplyUseTable(U=U, V=U + 1, Y=Y, F=F, FY=np.ones((2, 3)),
+                             regions=3)
+
+        sut.aggregate_regions(av)
+        npt.assert_array_equal(sut.U, pysut.aggregate_regions_vectorised(U, av))
+        npt.assert_array_equal(sut.Y, pysut.aggregate_regions_vectorised(Y, av))
+        npt.assert_array_equal(sut.F, pysut.aggregate_regions_vectorised(
+            F, av, axis=1))
+
     def test_aggregation_within_regions(self):
 
         sut = SupplyUseTable(U=np.arange(54).reshape((3*3, 3*2)), regions=3)
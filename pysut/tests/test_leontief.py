@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of Leontief systems, footprints and multipliers of constructs
+"""
+from __future__ import division
+from .. import SupplyUseTable # remove and import the class manually if this unit test is run as standalone script
+from .. import leontief # remove and import the class manually if this unit test is run as standalone script
+from .. import spa # remove and import the class manually if this unit test is run as standalone script
+import numpy as np
+import numpy.testing as npt
+import unittest
+
+###############################################################################
+class TestLeontief(unittest.TestCase):
+    """ Unit test class for Leontief systems of constructs"""
+
+    def setUp(self):
+        """
+        A square, multiregional SUT with 2 regions, 3 products and 3
+        industries per region, 2 final demand categories per region and
+        3 stressors, with secondary production. The reference results are
+        computed with an explicit Leontief inverse.
+        """
+        self.atol = 1e-08
+
+        self.V = np.array([[5., 1., 0.,   0., 0., 0.],
+                           [0., 4., 0.,   0., 0., 0.],
+                           [0., 0., 3.,   0., 0., 0.],
+                           #
+                           [0., 0., 0.,   6., 0., 0.],
+                           [0., 0., 0.,   1., 2., 0.],
+                           [0., 0., 0.,   0., 0., 7.]])
+
+        self.U = np.array([[0., 1., 0.,   0.5, 0., 0.],
+                           [1., 0., 0.,   0., 0., 0.],
+                           [0., 0., 0.,   0., 0.5, 0.],
+                           #
+                           [0.5, 0., 0.,  0., 1., 0.],
+                           [0., 0., 0.,   2., 0., 0.],
+                           [0., 0., 0.5,  0., 0., 0.]])
+
+        self.F = np.array([[10., 2., 1.,   8., 3., 1.],
+                           [0., 1., 0.,    0., 2., 0.],
+                           [1., 1., 1.,    1., 1., 1.]])
+
+        self.Y = np.array([[1., 0.,   2., 0.],
+                           [0., 1.,   0., 0.],
+                           [1., 1.,   0., 1.],
+                           #
+                           [0., 0.,   3., 0.],
+                           [2., 0.,   0., 1.],
+                           [0., 0.,   1., 1.]])
+
+        self.FY = np.array([[1., 0., 2., 0.],
+                            [0., 0., 0., 1.],
+                            [0., 0., 0., 0.]])
+
+        self.sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F,
+                                  FY=self.FY, regions=2)
+        self.A, self.S, __, __, __, __ = self.sut.btc()
+        self.L = np.linalg.inv(np.eye(6) - self.A)
+
+    def test_solve(self):
+        """ Total output for vectors and blocks of final demand"""
+        system = leontief.LeontiefSystem(self.A, self.S, block_size=3)
+        npt.assert_allclose(system.solve(self.Y), self.L.dot(self.Y),
+                            atol=self.atol)
+        npt.assert_allclose(system.solve(self.Y[:, 0]),
+                            self.L.dot(self.Y[:, 0]), atol=self.atol)
+        self.assertRaises(ValueError, leontief.LeontiefSystem, self.A[:, :5])
+
+    def test_footprints(self):
+        """ Footprints per final demand category and per consuming region"""
+        D0 = self.S.dot(self.L).dot(self.Y) + self.FY
+        system = leontief.LeontiefSystem(self.A, self.S, block_size=3)
+        npt.assert_allclose(system.footprints(self.Y, self.FY), D0,
+                            atol=self.atol)
+
+        D0_reg = np.column_stack([D0[:, :2].sum(1), D0[:, 2:].sum(1)])
+        npt.assert_allclose(system.footprints(self.Y, self.FY, regions=2),
+                            D0_reg, atol=self.atol)
+        npt.assert_allclose(self.sut.footprints(self.A, self.S), D0_reg,
+                            atol=self.atol)
+
+        # The same construct output is only factorized once
+        self.assertTrue(self.sut.leontief(self.A, self.S) is
+                        self.sut.leontief(self.A, self.S))
+
+        # Construct output tuple, sparse final demand
+        system = leontief.LeontiefSystem.from_construct(self.sut.btc())
+        D = system.footprints(leontief.sp.csc_matrix(self.Y))
+        npt.assert_allclose(D, D0 - self.FY, atol=self.atol)
+
+    def test_zero_extensions(self):
+        """ All-zero sparse S is kept, empty S means no stressors"""
+        S = leontief.sp.csr_matrix((2, 6))
+        system = leontief.LeontiefSystem(self.A, S)
+        self.assertTrue(system.S is not None)
+        npt.assert_array_equal(system.multipliers(), np.zeros((2, 6)))
+        system.set_extensions(leontief.sp.csr_matrix((3, 6)))
+        self.assertEqual(system.S.shape, (3, 6))
+        self.assertTrue(leontief.LeontiefSystem(self.A, np.empty(0)).S is None)
+
+    def test_multipliers(self):
+        """ Multipliers by transposed solves, per stressor or per impact"""
+        M0 = self.S.dot(self.L)
+        system = leontief.LeontiefSystem(self.A, self.S, block_size=2)
+        npt.assert_allclose(system.multipliers(), M0, atol=self.atol)
+        npt.assert_allclose(system.multipliers(rows=[2, 0]), M0[[2, 0], :],
+                            atol=self.atol)
+
+        # Characterized: GWP of CO2 and CH4, stressor 3 not characterized
+        C = np.array([[1., 25., 0.]])
+        npt.assert_allclose(system.multipliers(C=C), C.dot(M0),
+                            atol=self.atol)
+        npt.assert_allclose(self.sut.multipliers(self.A, self.S, rows=[0, 1],
+                                                 C=C[:, :2]),
+                            C.dot(M0), atol=self.atol)
+
+    def test_leontief_columns(self):
+        """ Selected Leontief columns, by position and by label, with LRU"""
+        system = leontief.LeontiefSystem(self.A, self.S, cache_size=2)
+        npt.assert_allclose(system.leontief_columns([4, 1]), self.L[:, [4, 1]],
+                            atol=self.atol)
+        npt.assert_allclose(system.multiplier_columns([1]),
+                            self.S.dot(self.L[:, [1]]), atol=self.atol)
+        self.assertEqual(list(system._columns), [4, 1])
+
+        # Least recently used column (4) is dropped
+        system.leontief_columns([5])
+        self.assertEqual(list(system._columns), [1, 5])
+
+        # Labels
+        self.sut.l_pro = np.array([[r, p] for r in ['NO', 'SE']
+                                   for p in ['i', 'j', 'k']], dtype=object)
+        L, M = self.sut.leontief_columns(self.A, self.S, [('SE', 'j')])
+        npt.assert_allclose(L, self.L[:, [4]], atol=self.atol)
+        npt.assert_allclose(M, self.S.dot(self.L[:, [4]]), atol=self.atol)
+
+    def test_structural_paths(self):
+        """ Best-first structural path analysis against power series"""
+        A = np.abs(self.A)
+        s = self.S[0, :]
+        y = self.Y.sum(1)
+        paths, total = spa.structural_paths(A, s, y, max_paths=1000,
+                                            cutoff=1e-6)
+        m = s.dot(np.linalg.inv(np.eye(6) - A))
+        npt.assert_allclose(total, m.dot(y), atol=self.atol)
+
+        # Paths by decreasing value, with value s_k * amount along the path
+        values = [p.value for p in paths]
+        self.assertEqual(values, sorted(values, reverse=True))
+        for p in paths[:20]:
+            amount = y[p.nodes[0]]
+            for down, up in zip(p.nodes[:-1], p.nodes[1:]):
+                amount *= A[up, down]
+            npt.assert_allclose(p.amount, amount, atol=self.atol)
+            npt.assert_allclose(p.value, s[p.nodes[-1]] * amount,
+                                atol=self.atol)
+            npt.assert_allclose(p.upstream, m[p.nodes[-1]] * amount,
+                                atol=self.atol)
+
+        # All paths above the cutoff add up to (almost) the total
+        self.assertTrue(abs(sum(values) - total) < 1e-4 * total)
+
+        # Path budget and depth limit
+        paths, __ = spa.structural_paths(A, s, y, max_paths=3)
+        self.assertEqual(len(paths), 3)
+        paths, __ = spa.structural_paths(A, s, y, max_depth=0)
+        self.assertEqual(set(p.nodes for p in paths),
+                         set((j,) for j in np.flatnonzero(y * s)))
+
+        paths, total = self.sut.structural_paths(self.A, self.S, 0,
+                                                 max_paths=5)
+        self.assertEqual(len(paths), 5)
+        npt.assert_allclose(total, self.S.dot(self.L).dot(y)[0],
+                            atol=self.atol)
+        paths_sparse, total_sparse = self.sut.structural_paths(
+            self.A, leontief.sp.csr_matrix(self.S), 0, max_paths=5)
+        self.assertEqual([p.nodes for p in paths_sparse],
+                         [p.nodes for p in paths])
+        npt.assert_allclose(total_sparse, total, atol=self.atol)
+
+        # Without final demand
+        sut = SupplyUseTable(V=self.V, U=self.U, F=self.F)
+        with self.assertRaises(ValueError) as error:
+            sut.structural_paths(self.A, self.S, 0)
+        self.assertTrue('no final demand' in str(error.exception))
+
+    def test_low_rank_update(self):
+        """ Updated columns of A give the same solves as a refactorization"""
+        system = leontief.LeontiefSystem(self.A, self.S, max_rank=2)
+        system.solve(self.Y)  # factorize
+
+        A1 = self.A.copy()
+        A1[:, 1] = [0.1, 0., 0.3, 0., 0.2, 0.]
+        system.update([1], A1[:, [1]])
+        L1 = np.linalg.inv(np.eye(6) - A1)
+        npt.assert_allclose(system.A.toarray(), A1, atol=self.atol)
+        npt.assert_allclose(system.solve(self.Y), L1.dot(self.Y),
+                            atol=self.atol)
+        npt.assert_allclose(system.multipliers(), self.S.dot(L1),
+                            atol=self.atol)
+        npt.assert_allclose(system.leontief_columns([1, 2]), L1[:, [1, 2]],
+                            atol=self.atol)
+        lu = system.lu
+
+        # Second update, merged with the first
+        A1[:, 4] = A1[:, 4] * 0.5
+        system.update([4], A1[:, [4]])
+        L1 = np.linalg.inv(np.eye(6) - A1)
+        npt.assert_allclose(system.solve(self.Y), L1.dot(self.Y),
+                            atol=self.atol)
+        self.assertTrue(system.lu is lu)
+
+        # Beyond max_rank, refactorize
+        A1[:, 0] = 0.
+        system.update([0], A1[:, [0]])
+        self.assertFalse(system.lu is lu)
+        L1 = np.linalg.inv(np.eye(6) - A1)
+        npt.assert_allclose(system.multipliers(), self.S.dot(L1),
+                            atol=self.atol)
+
+    def test_update_construct(self):
+        """ Rebuilding changed columns of a construct equals a full rerun"""
+        for construct in ('btc', 'esc', 'lsc', 'psc_agg'):
+            sut = SupplyUseTable(V=self.V, U=self.U.copy(), Y=self.Y,
+                                 F=self.F.copy(), FY=self.FY, regions=2,
+                                 E_bar=np.eye(6, dtype=int), Xi=np.eye(6))
+            result = getattr(sut, construct)()
+            A, S = result[0], result[3 if construct == 'psc_agg' else 1]
+            D = sut.footprints(A, S)
+
+            sut.U[:, 3] = [0., 0.2, 0., 0.1, 0.4, 0.]
+            sut.F[:, 3] = [3., 0., 2.]
+            A1, S1, products = sut.update_construct(construct, A, S, [3])
+            result = getattr(sut, construct)()
+            A0, S0 = result[0], result[3 if construct == 'psc_agg' else 1]
+            npt.assert_allclose(A1, A0, atol=self.atol)
+            npt.assert_allclose(S1, S0, atol=self.atol)
+            self.assertTrue(3 in products)
+
+            # Cached Leontief system was updated, not refactorized
+            system = sut.leontief(A1, S1)
+            self.assertTrue(system._smw is not None)
+            npt.assert_allclose(sut.footprints(A1, S1),
+                                leontief.footprints(A0, S0, self.Y, self.FY,
+                                                    regions=2),
+                                atol=self.atol)
+            self.assertFalse(np.allclose(D, sut.footprints(A1, S1)))
+
+    def test_update_construct_secondary(self):
+        """ Products no longer supplied by a changed industry are rebuilt"""
+        V = self.V.copy()
+        V[2, 0] = 5.
+        sut = SupplyUseTable(V=V, U=self.U, Y=self.Y, F=self.F, FY=self.FY,
+                             regions=2, E_bar=np.eye(6, dtype=int))
+        A, S = sut.esc()[:2]
+        V_old = sut.V[:, [0]].copy()
+        sut.V[2, 0] = 0.
+        A1, S1, products = sut.update_construct('esc', A, S, [0], V_old)
+        A0, S0 = sut.esc()[:2]
+        npt.assert_allclose(A1, A0, atol=self.atol)
+        npt.assert_allclose(S1, S0, atol=self.atol)
+        self.assertTrue(2 in products)
+        self.assertRaises(ValueError, sut.update_construct, 'esc', A, S,
+                          [0, 1], V_old)
+
+    def test_update_construct_sparse(self):
+        """ Column updates of sparse tables equal those of dense tables"""
+        for construct in ('btc', 'esc', 'psc_agg'):
+            sut = SupplyUseTable(V=self.V, U=self.U.copy(), Y=self.Y,
+                                 F=self.F.copy(), FY=self.FY, regions=2,
+                                 E_bar=np.eye(6, dtype=int), Xi=np.eye(6))
+            result = getattr(sut, construct)()
+            A, S = result[0], result[3 if construct == 'psc_agg' else 1]
+            sut.U[:, 3] = [0., 0.2, 0., 0.1, 0.4, 0.]
+            sut.F[:, 3] = [3., 0., 2.]
+            A0, S0, products0 = sut.update_construct(construct, A, S, [3])
+
+            sparse = SupplyUseTable(V=leontief.sp.csr_matrix(self.V),
+                                    U=leontief.sp.csc_matrix(sut.U),
+                                    F=leontief.sp.csr_matrix(sut.F),
+                                    E_bar=leontief.sp.csr_matrix(np.eye(6)),
+                                    Xi=leontief.sp.csr_matrix(np.eye(6)))
+            A1, S1, products = sparse.update_construct(construct, A, S, [3])
+            npt.assert_array_equal(products, products0)
+            npt.assert_allclose(A1, A0, atol=self.atol)
+            npt.assert_allclose(S1, S0, atol=self.atol)
+
+    def test_append_extensions(self):
+        """ New stressors reuse the factorized Leontief system"""
+        system = self.sut.leontief(self.A, self.S)
+        lu = system.lu
+        M_old = system.multiplier_columns([0])
+        F_new = np.array([[0., 1., 2., 3., 4., 5.]])
+        S = self.sut.append_extensions('btc', F_new, self.S)
+        self.assertEqual(S.shape, (4, 6))
+        self.assertEqual(self.sut.FY.shape, (4, 4))
+        self.assertTrue(self.sut.leontief(self.A, S) is system)
+        self.assertTrue(system.lu is lu)
+        M = system.multiplier_columns([0])
+        npt.assert_allclose(M[:3], M_old, atol=self.atol)
+        npt.assert_allclose(M, S.dot(self.L[:, [0]]), atol=self.atol)
+
+    def test_characterized_footprints(self):
+        """ Footprints of impacts C F and C FY"""
+        C = np.array([[1., 0., 2.], [0., 3., 0.]])
+        D0 = self.sut.footprints(self.A, self.S)
+        sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F,
+                             FY=self.FY, regions=2, C=C)
+        A, S = sut.btc()[:2]
+        self.assertEqual(S.shape, (2, 6))
+        npt.assert_allclose(sut.footprints(A, S), C.dot(D0), atol=self.atol)
+        npt.assert_allclose(sut.Build_BTC_S(), S, atol=self.atol)
+
+        # Rows of the multipliers selected by impact labels
+        M0 = self.S.dot(self.L)
+        sut.characterize(C, labels=np.array([['GWP'], ['X']], dtype=object))
+        npt.assert_allclose(sut.multipliers(A, S, rows={'name': 'X'}),
+                            C[[1]].dot(M0), atol=self.atol)
+        sut.l_ext = np.array([['CO2'], ['CH4'], ['N2O']], dtype=object)
+        sut.characterize(C, labels=sut.l_imp, keep_stressors=True)
+        A, S = sut.btc()[:2]
+        npt.assert_allclose(sut.multipliers(A, S, rows={'name': ['CH4',
+                                                                 'GWP']}),
+                            np.vstack([M0[[1]], C[[0]].dot(M0)]),
+                            atol=self.atol)
+        self.assertRaises(ValueError, SupplyUseTable, V=self.V, U=self.U,
+                          F=self.F, C=np.ones((2, 2)))
+
+    def test_precision(self):
+        """ float32 storage, float64 accumulation, accuracy report"""
+        kwargs = dict(V=self.V, U=self.U, Y=self.Y, F=self.F, FY=self.FY,
+                      regions=2, E_bar=np.eye(6, dtype=int), Xi=np.eye(6))
+        sut = SupplyUseTable(dtype=np.float32, **kwargs)
+        for X in (sut.V, sut.U, sut.Y, sut.F, sut.FY):
+            self.assertEqual(X.dtype, np.float32)
+        self.assertEqual(sut.q.dtype, np.float64)
+
+        for construct in ('btc', 'esc', 'psc_agg'):
+            result = getattr(sut, construct)()
+            result64 = getattr(SupplyUseTable(**kwargs), construct)()
+            for X, X64 in zip(result, result64):
+                if X.dtype.kind == 'f':
+                    self.assertEqual(X.dtype, np.float32)
+                npt.assert_allclose(X, X64, rtol=1e-6, atol=1e-6)
+
+        # Copy in float64 shares the labels, not the tables
+        sut.l_pro = np.arange(6)
+        sut64 = sut.astype(np.float64)
+        self.assertEqual(sut64.V.dtype, np.float64)
+        self.assertEqual(sut.V.dtype, np.float32)
+        self.assertTrue(sut64.l_pro is sut.l_pro)
+        self.assertRaises(ValueError, sut.set_precision, int)
+
+        report = self.sut.precision_report('btc')
+        self.assertEqual(report['dtype'], 'float32')
+        self.assertEqual(report['table_bytes'][1] * 2,
+                         report['table_bytes'][0])
+        self.assertTrue(report['max_rel_error'] < 1e-5)
+        self.assertEqual(self.sut.V.dtype, np.float64)
+
+    def test_mixed_precision(self):
+        """ float32 factorization refined to float64 accuracy, fallback"""
+        system = leontief.LeontiefSystem(self.A, self.S, precision='mixed',
+                                         block_size=3)
+        npt.assert_allclose(system.solve(self.Y), self.L.dot(self.Y),
+                            rtol=1e-12, atol=1e-13)
+        self.assertEqual(system.lu.L.dtype, np.float32)
+        self.assertTrue(system.refinement_steps > 0)
+        npt.assert_allclose(system.multipliers(), self.S.dot(self.L),
+                            rtol=1e-12, atol=1e-13)
+
+        # Low-rank updates are solved with the refined factorization too
+        A1 = self.A.copy()
+        A1[:, 1] = [0.1, 0., 0.3, 0., 0.2, 0.]
+        system.update([1], A1[:, [1]])
+        npt.assert_allclose(system.solve(self.Y),
+                            np.linalg.solve(np.eye(6) - A1, self.Y),
+                            rtol=1e-12, atol=1e-13)
+        self.assertEqual(system.precision, 'mixed')
+
+        # Without refinement steps, fall back to a float64 factorization
+        system = leontief.LeontiefSystem(self.A, self.S, precision='mixed',
+                                         max_refine=0)
+        npt.assert_allclose(system.solve(self.Y), self.L.dot(self.Y),
+                            atol=self.atol)
+        self.assertEqual(system.precision, 'double')
+        self.assertEqual(system.lu.L.dtype, np.float64)
+        self.assertRaises(ValueError, leontief.LeontiefSystem, self.A,
+                          precision='single')
+
+        # From the SUT: the cached system keeps its precision
+        D = self.sut.footprints(self.A, self.S, precision='mixed')
+        system = self.sut.leontief(self.A, self.S)
+        self.assertEqual(system.precision, 'mixed')
+        npt.assert_allclose(D, leontief.footprints(self.A, self.S, self.Y,
+                                                   self.FY, regions=2),
+                            rtol=1e-12, atol=1e-13)
+        self.assertTrue(self.sut.leontief(self.A, self.S) is system)
+        self.assertEqual(self.sut.leontief(self.A, self.S, 'double')
+                         .precision, 'double')
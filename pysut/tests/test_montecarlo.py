@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of Monte Carlo uncertainty propagation through constructs
+"""
+from __future__ import division
+from .. import SupplyUseTable # remove and import the class manually if this unit test is run as standalone script
+from .. import leontief # remove and import the class manually if this unit test is run as standalone script
+from .. import montecarlo # remove and import the class manually if this unit test is run as standalone script
+import numpy as np
+import numpy.testing as npt
+import unittest
+
+###############################################################################
+class TestMonteCarlo(unittest.TestCase):
+    """ Unit test class for Monte Carlo simulations of constructs"""
+
+    def setUp(self):
+        """
+        A square, multiregional SUT with 2 regions, 3 products and 3
+        industries per region, with secondary production (as in
+        test_leontief)
+        """
+        self.atol = 1e-08
+
+        self.V = np.array([[5., 1., 0.,   0., 0., 0.],
+                           [0., 4., 0.,   0., 0., 0.],
+                           [0., 0., 3.,   0., 0., 0.],
+                           #
+                           [0., 0., 0.,   6., 0., 0.],
+                           [0., 0., 0.,   1., 2., 0.],
+                           [0., 0., 0.,   0., 0., 7.]])
+
+        self.U = np.array([[0., 1., 0.,   0.5, 0., 0.],
+                           [1., 0., 0.,   0., 0., 0.],
+                           [0., 0., 0.,   0., 0.5, 0.],
+                           #
+                           [0.5, 0., 0.,  0., 1., 0.],
+                           [0., 0., 0.,   2., 0., 0.],
+                           [0., 0., 0.5,  0., 0., 0.]])
+
+        self.F = np.array([[10., 2., 1.,   8., 3., 1.],
+                           [0., 1., 0.,    0., 2., 0.],
+                           [1., 1., 1.,    1., 1., 1.]])
+
+        self.Y = np.array([[1., 0.,   2., 0.],
+                           [0., 1.,   0., 0.],
+                           [1., 1.,   0., 1.],
+                           #
+                           [0., 0.,   3., 0.],
+                           [2., 0.,   0., 1.],
+                           [0., 0.,   1., 1.]])
+
+        self.FY = np.array([[1., 0., 2., 0.],
+                            [0., 0., 0., 1.],
+                            [0., 0., 0., 0.]])
+
+        Xi = np.eye(6)
+        Xi[0, 4] = 1.  # secondary steel of SE displaces steel of NO
+        Xi[4, 4] = 0.
+        self.sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F,
+                                  FY=self.FY, regions=2,
+                                  E_bar=np.eye(6, dtype=int), Xi=Xi)
+
+    def test_online_statistics(self):
+        """ Running mean, variance and reservoir quantiles by batches"""
+        samples = np.random.RandomState(0).lognormal(size=(200, 2, 3))
+        stats = montecarlo.OnlineStatistics((2, 3), sketch_size=500, seed=1)
+        for batch in np.array_split(samples, 7):
+            stats.update(batch)
+        self.assertEqual(stats.n, 200)
+        npt.assert_allclose(stats.mean, samples.mean(0), atol=self.atol)
+        npt.assert_allclose(stats.variance, samples.var(0, ddof=1),
+                            atol=self.atol)
+        # Exact as long as all samples fit in the reservoir
+        npt.assert_allclose(stats.quantile(0.9),
+                            np.percentile(samples, 90, axis=0),
+                            atol=self.atol)
+
+        # Beyond the reservoir, quantiles are estimated from a subsample
+        stats = montecarlo.OnlineStatistics((2, 3), sketch_size=50, seed=1)
+        stats.update(samples)
+        self.assertTrue(np.all(stats.quantile(0.) >= samples.min(0)))
+        self.assertTrue(np.all(stats.quantile(1.) <= samples.max(0)))
+
+    def test_constructs_without_uncertainty(self):
+        """ Vectorized constructs equal the constructs of the SUT for cv=0"""
+        for construct in ('btc', 'esc', 'lsc', 'psc_agg'):
+            result = getattr(self.sut, construct)()
+            A0, S0 = result[0], result[3 if construct == 'psc_agg' else 1]
+            mc = montecarlo.MonteCarlo(self.sut, construct, cv=0.,
+                                       batch_size=2)
+            samples = list(mc.samples(3))
+            self.assertEqual(len(samples), 3)
+            for A, S in samples:
+                npt.assert_allclose(A.toarray(), A0, atol=self.atol)
+                npt.assert_allclose(S.toarray(), S0, atol=self.atol)
+        self.assertRaises(ValueError, montecarlo.MonteCarlo, self.sut, 'itc')
+
+    def test_sampling(self):
+        """ Perturbations keep the sparsity pattern and have mean one"""
+        mc = montecarlo.MonteCarlo(self.sut, 'btc', cv={'U': 0.2, 'V': 0.},
+                                   seed=3)
+        A_values, S_values = mc.construct_batch(2000)
+        rows, cols = mc.A_pattern
+        A0 = self.sut.btc()[0]
+        # Symbolic pattern of U - V_tild (entry (0, 1) cancels numerically)
+        pattern = (self.U != 0) | (self.V * (1 - np.eye(6)) != 0)
+        self.assertEqual(set(zip(rows, cols)), set(zip(*np.nonzero(pattern))))
+        # Only U is uncertain and V is fixed: A is linear in the factors
+        npt.assert_allclose(A_values.mean(1), A0[rows, cols], atol=0.01)
+        # F is not uncertain
+        npt.assert_allclose(S_values.std(1), 0., atol=self.atol)
+
+        factors = mc._factors('U', 1, 100000)
+        npt.assert_allclose(factors.mean(), 1., rtol=0.01)
+        npt.assert_allclose(factors.std(), 0.2, rtol=0.05)
+
+    def test_characterized(self):
+        """ Stressors are sampled, impacts are C times the sampled stressors"""
+        C = np.array([[1., 25., 0.], [0., 1., 2.]])
+        self.sut.characterize(C, keep_stressors=True)
+        mc = montecarlo.MonteCarlo(self.sut, 'btc', cv={'F': 0.3}, seed=1)
+        for A, S in mc.samples(5):
+            S = S.toarray()
+            self.assertEqual(S.shape, (5, 6))
+            npt.assert_allclose(S[3:], C.dot(S[:3]), atol=self.atol)
+        mc = montecarlo.MonteCarlo(self.sut, 'btc', cv=0.)
+        A, S = next(mc.samples(1))
+        npt.assert_allclose(S.toarray(), self.sut.btc()[1], atol=self.atol)
+
+    def test_run(self):
+        """ Statistics of footprints per region over all samples"""
+        mc = montecarlo.MonteCarlo(self.sut, 'psc_agg', cv=0., batch_size=4)
+        stats = mc.run(10, track_S=True)
+        D0 = leontief.footprints(self.sut.psc_agg()[0], self.sut.psc_agg()[3],
+                                 self.Y, self.FY, regions=2)
+        self.assertEqual(stats['footprints'].n, 10)
+        npt.assert_allclose(stats['footprints'].mean, D0, atol=self.atol)
+        npt.assert_allclose(stats['footprints'].std, 0., atol=self.atol)
+        npt.assert_allclose(stats['S'].mean, self.sut.psc_agg()[3],
+                            atol=self.atol)
+
+        mc = montecarlo.MonteCarlo(self.sut, 'btc', cv=0.1, seed=0)
+        stats = mc.run(50, by_region=False)
+        D = stats['footprints']
+        self.assertEqual(D.mean.shape, (3, 4))
+        self.assertTrue(np.all(D.quantile(0.05) <= D.quantile(0.95)))
+        self.assertTrue(np.all(D.std[:2] > 0))
+
+        # S cannot be tracked without extensions
+        sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, regions=2)
+        mc = montecarlo.MonteCarlo(sut, 'btc', cv=0.1, seed=0)
+        self.assertRaises(ValueError, mc.run, 2, track_S=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the thread mode of constructs
+"""
+from __future__ import division
+from .. import parallel # remove and import the class manually if this unit test is run as standalone script
+from .. import instrument # remove and import the class manually if this unit test is run as standalone script
+from ..synthetic import synthetic_sut # remove and import the class manually if this unit test is run as standalone script
+import numpy as np
+import numpy.testing as npt
+import scipy.sparse as sp
+import os
+import subprocess
+import sys
+import unittest
+import warnings
+
+###############################################################################
+class TestParallel(unittest.TestCase):
+    """ Unit test class for the thread mode"""
+
+    def setUp(self):
+        """ Synthetic multiregional SUT with all mappings"""
+        self.sut = synthetic_sut(regions=3, products=6, extensions=4, seed=1)
+
+    def test_constructs(self):
+        """ Same results in the thread mode as without"""
+        for name in ('btc', 'esc', 'lsc', 'psc_agg', 'aac_agg'):
+            expected = getattr(self.sut, name)()
+            with parallel.threads(3):
+                self.assertTrue(parallel.enabled())
+                self.assertEqual(parallel.workers(), 3)
+                result = getattr(self.sut, name)()
+            self.assertFalse(parallel.enabled())
+            self.assertEqual(len(result), len(expected))
+            for X, X0 in zip(result, expected):
+                npt.assert_allclose(X, X0, rtol=1e-12, atol=1e-12)
+
+    def test_map_rows(self):
+        """ Blocks of rows of dense and sparse arrays, in order"""
+        X = sp.random(50, 20, density=0.2, format='csr', random_state=0)
+        B = np.arange(60.).reshape((20, 3))
+        with parallel.threads(4):
+            npt.assert_allclose(parallel.map_rows(lambda x: x.dot(B), X),
+                                X.dot(B))
+            R = parallel.map_rows(lambda x: x * 2, X)
+            self.assertTrue(sp.isspmatrix_csr(R))
+            npt.assert_array_equal(R.toarray(), 2 * X.toarray())
+            # Fewer rows than workers
+            npt.assert_array_equal(parallel.map_rows(lambda x: x + 1,
+                                                     np.ones((2, 3))),
+                                   2 * np.ones((2, 3)))
+        # Without the thread mode, a single call
+        calls = []
+        parallel.map_rows(calls.append, X)
+        self.assertEqual(len(calls), 1)
+
+    def test_workers(self):
+        """ Phases of the workers, no nested parallelism, errors"""
+        def nested():
+            return parallel.enabled()
+        with instrument.profile(memory=False) as prof:
+            with parallel.threads(2):
+                self.assertEqual(parallel.run(nested, nested), [False, False])
+                self.sut.psc_agg()
+        summary = prof.summary()
+        self.assertTrue(summary['psc_agg', 'worker']['calls'] >= 3)
+
+        def fail():
+            raise ArithmeticError('worker')
+        with parallel.threads(2):
+            self.assertRaises(ArithmeticError, parallel.run, fail, nested)
+        self.assertRaises(ValueError, parallel.threads, 0)
+        # Without threadpoolctl, a requested limit cannot be applied
+        missing = parallel.blas_control() is None
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with parallel.threads(1, blas_threads=1) as mode:
+                self.assertEqual(mode.blas_threads, 1)
+                self.assertFalse(parallel.enabled())
+            with parallel.threads(2):
+                pass
+        self.assertEqual([w.category for w in caught],
+                         [RuntimeWarning] if missing else [])
+
+    def test_light_import(self):
+        """ The thread pool and tracemalloc are not loaded with the class"""
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        code = ('import sys; from pysut import SupplyUseTable; '
+                'SupplyUseTable; print(sorted(set(sys.modules) & {'
+                '"concurrent.futures", "multiprocessing", "tracemalloc", '
+                '"threadpoolctl"}))')
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=root)
+        self.assertEqual(output.decode().strip(), '[]')
+
+if __name__ == '__main__':
+    unittest.main()
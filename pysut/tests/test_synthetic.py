@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the synthetic SUT generators
+"""
+from __future__ import division
+from .. import SupplyUseTable # remove and import the class manually if this unit test is run as standalone script
+from .. import synthetic # remove and import the class manually if this unit test is run as standalone script
+import numpy as np
+import numpy.testing as npt
+import unittest
+
+###############################################################################
+class TestSynthetic(unittest.TestCase):
+    """ Unit test class for synthetic supply and use tables"""
+
+    def setUp(self):
+        """ A small square SUT with secondary production"""
+        self.atol = 1e-08
+        self.V = np.array([[5., 1., 0.],
+                           [0., 4., 0.],
+                           [0., 0., 3.]])
+        self.U = np.array([[0., 1., 0.],
+                           [1., 0., 0.5],
+                           [0.5, 0., 0.]])
+        self.Y = np.array([[3., 2.],
+                           [1., 1.5],
+                           [1., 1.5]])
+        self.F = np.array([[10., 2., 1.]])
+        self.FY = np.array([[1., 0.]])
+
+    def test_synthetic_sut(self):
+        """ Dimensions, balance, mappings and determinism"""
+        sut = synthetic.synthetic_sut(regions=3, products=8, industries=10,
+                                      exclusive=0.25, extensions=4, seed=1)
+        self.assertEqual(sut.V.shape, (24, 30))
+        self.assertEqual(sut.U.shape, (24, 30))
+        self.assertEqual(sut.Y.shape, (24, 6))
+        self.assertEqual(sut.F.shape, (4, 30))
+        self.assertEqual(sut.l_pro.shape, (24, 2))
+        npt.assert_allclose(sut.market_balance(), 0., atol=self.atol)
+
+        # Each industry has one primary product, 2 per region have none
+        npt.assert_array_equal(sut.E_bar.sum(0), 1)
+        self.assertEqual((sut.E_bar.sum(1) == 0).sum(), 6)
+        self.assertTrue(np.all(sut.q > 0))
+        self.assertEqual(sut.Xi.shape, (24, 24))
+        self.assertEqual(sut.Gamma.shape, (30, 24))
+
+        # Productive: the construct has a Leontief inverse
+        A = sut.btc()[0]
+        self.assertTrue(np.abs(np.linalg.eigvals(A)).max() < 1)
+
+        same = synthetic.synthetic_sut(regions=3, products=8, industries=10,
+                                       exclusive=0.25, extensions=4, seed=1)
+        npt.assert_array_equal(sut.U, same.U)
+        other = synthetic.synthetic_sut(regions=3, products=8, industries=10,
+                                        exclusive=0.25, extensions=4, seed=2)
+        self.assertFalse(np.array_equal(sut.U, other.U))
+
+        # Density and coproduction
+        sut = synthetic.synthetic_sut(regions=1, products=50, density=0.,
+                                      coproduction=0., seed=0)
+        self.assertEqual(np.count_nonzero(sut.U), 0)
+        self.assertEqual(np.count_nonzero(sut.V), 50)
+        self.assertRaises(ValueError, synthetic.synthetic_sut, exclusive=1.)
+
+    def test_replicate(self):
+        """ Kronecker replication of a small fixture"""
+        sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F,
+                             FY=self.FY, E_bar=np.eye(3, dtype=int))
+        sut.l_pro = np.array([['NO', 'a'], ['NO', 'b'], ['NO', 'c']],
+                             dtype=object)
+        A, S = sut.btc()[:2]
+
+        big = synthetic.replicate(sut, copies=3)
+        self.assertEqual(big.V.shape, (9, 9))
+        self.assertEqual(big.regions, 3)
+        self.assertEqual(list(big.l_pro[3]), ['NO_1', 'a'])
+        A3, S3 = big.btc()[:2]
+        npt.assert_allclose(A3, np.kron(np.eye(3), A), atol=self.atol)
+        npt.assert_allclose(S3, np.kron(np.ones((1, 3)), S), atol=self.atol)
+
+        # Trade between copies keeps the balance and the totals
+        big = synthetic.replicate(sut, copies=3, trade=0.2)
+        npt.assert_allclose(big.market_balance(), 0., atol=self.atol)
+        npt.assert_allclose(big.U.sum(), 3 * self.U.sum(), atol=self.atol)
+
+        noisy = synthetic.replicate(sut, copies=2, noise=0.1, seed=0)
+        self.assertEqual(np.count_nonzero(noisy.U), 2 * np.count_nonzero(self.U))
+        self.assertFalse(np.allclose(noisy.U[:3, :3], noisy.U[3:, 3:]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of label handling, selection and restructuring of supply and use tables
+"""
+from __future__ import division
+from .. import SupplyUseTable # remove and import the class manually if this unit test is run as standalone script
+from .. import pysut # remove and import the class manually if this unit test is run as standalone script
+import numpy as np
+import numpy.testing as npt
+import unittest
+
+###############################################################################
+class TestTableHandling(unittest.TestCase):
+    """ Unit test class for labels, selections and restructuring of SUT"""
+
+    def setUp(self):
+        """
+        A multiregional SUT with 2 regions (NO, SE), 3 products (steel, iron,
+        wood) and 3 industries per region, and 2 final demand categories
+        (households, government) per region.
+        """
+        regions = ['NO', 'SE']
+        products = ['steel', 'iron', 'wood']
+        industries = ['Steelworks', 'Mining', 'Forestry']
+
+        self.l_pro = np.array([[r, p] for r in regions for p in products],
+                              dtype=object)
+        self.l_ind = np.array([[r, i] for r in regions for i in industries],
+                              dtype=object)
+        self.l_ext = np.array([['CO2'], ['CH4']], dtype=object)
+
+        self.V = np.array([[5., 1., 0.,   0., 0., 0.],
+                           [0., 4., 0.,   0., 0., 0.],
+                           [0., 0., 3.,   0., 0., 0.],
+                           #
+                           [0., 0., 0.,   6., 0., 0.],
+                           [0., 0., 0.,   1., 2., 0.],
+                           [0., 0., 0.,   0., 0., 7.]])
+
+        self.U = np.array([[0., 1., 0.,   0.5, 0., 0.],
+                           [1., 0., 0.,   0., 0., 0.],
+                           [0., 0., 0.,   0., 0.5, 0.],
+                           #
+                           [0.5, 0., 0.,  0., 1., 0.],
+                           [0., 0., 0.,   2., 0., 0.],
+                           [0., 0., 0.5,  0., 0., 0.]])
+
+        self.Y = np.arange(24, dtype=float).reshape((6, 4))
+        self.F = np.array([[10., 2., 1.,   8., 3., 1.],
+                           [0., 1., 0.,    0., 2., 0.]])
+        self.FY = np.array([[1., 0., 2., 0.],
+                            [0., 0., 0., 1.]])
+
+        self.sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F,
+                                  FY=self.FY, regions=2)
+        self.sut.l_pro = self.l_pro
+        self.sut.l_ind = self.l_ind
+        self.sut.l_ext = self.l_ext
+
+    def test_label_index(self):
+        """ Integer codes, lookups and groups of a label table"""
+        index = self.sut.pro_index
+        self.assertEqual(index.levels, ('region', 'name'))
+        self.assertEqual(index.categories[0], ['NO', 'SE'])
+        npt.assert_array_equal(index.codes[:, 1], [0, 1, 2, 0, 1, 2])
+        self.assertEqual(index.position(('SE', 'iron')), 4)
+        self.assertTrue(('NO', 'wood') in index)
+        npt.assert_array_equal(index.group('name', 'steel'), [0, 3])
+        self.assertRaises(KeyError, index.position, ('DK', 'steel'))
+        self.assertRaises(KeyError, index.select, country='NO')
+
+        # Built once, rebuilt when labels are re-assigned
+        self.assertTrue(self.sut.pro_index is index)
+        self.sut.l_pro = self.l_pro.copy()
+        self.assertFalse(self.sut.pro_index is index)
+
+        # Single-level label tables
+        self.assertEqual(self.sut.ext_index.position('CH4'), 1)
+
+    def test_select(self):
+        """ Label-based selection of products and industries"""
+        npt.assert_array_equal(
+            self.sut.select_products(region='NO', name='steel'), [0])
+        npt.assert_array_equal(
+            self.sut.select_products(name=['steel', 'wood']), [0, 2, 3, 5])
+        npt.assert_array_equal(
+            self.sut.select_industries(region='SE'), [3, 4, 5])
+        npt.assert_array_equal(self.sut.select_extensions(), [0, 1])
+
+    def test_sub_table_views(self):
+        """ Regular selections are views of the tables, others are copies"""
+        block = self.sut.sub_table('V', rows={'region': 'SE'},
+                                   cols={'region': 'SE'})
+        npt.assert_array_equal(block, self.V[3:, 3:])
+        self.assertTrue(np.shares_memory(block, self.sut.V))
+
+        steel = self.sut.sub_table('U', rows={'name': 'steel'})
+        npt.assert_array_equal(steel, self.U[[0, 3], :])
+        self.assertTrue(np.shares_memory(steel, self.sut.U))
+
+        mixed = self.sut.sub_table('Y', rows=[0, 1, 5], cols=[1, 3])
+        npt.assert_array_equal(mixed, self.Y[np.ix_([0, 1, 5], [1, 3])])
+        self.assertFalse(np.shares_memory(mixed, self.sut.Y))
+
+        co2 = self.sut.sub_table('F', rows={'name': 'CO2'},
+                                 cols={'name': 'Mining'})
+        npt.assert_array_equal(co2, [[2., 3.]])
+
+    def test_sub_table_unlabelled(self):
+        """ Positional selections without labels, clear error for labels"""
+        sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F, regions=2)
+        npt.assert_array_equal(sut.sub_table('V', rows=[0, 1]), self.V[:2])
+        npt.assert_array_equal(sut.sub_table('F', cols=[2, 5]),
+                               self.F[:, [2, 5]])
+        with self.assertRaises(ValueError) as error:
+            sut.sub_table('U', rows={'region': 'NO'})
+        self.assertTrue('l_pro has no labels' in str(error.exception))
+        self.assertRaises(ValueError, sut.select_industries, region='NO')
+
+    def test_region_view(self):
+        """ A region view holds views of the parent tables"""
+        self.sut.E_bar = np.eye(6, dtype=int)
+        V_bar = self.sut.V_bar
+
+        view = self.sut.region_view(1)
+        self.assertEqual(view.regions, 1)
+        npt.assert_array_equal(view.V, self.V[3:, 3:])
+        npt.assert_array_equal(view.Y, self.Y[3:, 2:])
+        npt.assert_array_equal(view.F, self.F[:, 3:])
+        npt.assert_array_equal(view.FY, self.FY[:, 2:])
+        npt.assert_array_equal(view.l_pro[:, 0], ['SE', 'SE', 'SE'])
+        for X, parent in ((view.V, self.sut.V), (view.U, self.sut.U),
+                          (view.Y, self.sut.Y), (view.F, self.sut.F)):
+            self.assertTrue(np.shares_memory(X, parent))
+
+        # V_bar of the view is taken from the parent's cache
+        self.assertTrue(np.shares_memory(view.V_bar, V_bar))
+        npt.assert_array_equal(view.V_tild, [[0, 0, 0], [1, 0, 0], [0, 0, 0]])
+
+        # Modifications of the view propagate to the parent
+        view.U[0, 0] = 3.
+        self.assertEqual(self.sut.U[3, 3], 3.)
+
+    def test_region_view_settings(self):
+        """ A region view is characterized and stored like its parent"""
+        C = np.array([[1., 25.]])
+        sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F,
+                             FY=self.FY, regions=2, C=C, dtype=np.float32,
+                             keep_allocations=True)
+        sut.l_imp = np.array([['GWP']], dtype=object)
+        view = sut.region_view(1)
+        self.assertTrue(view.C is C)
+        self.assertTrue(view.l_imp is sut.l_imp)
+        self.assertTrue(view.keep_allocations)
+        self.assertEqual(view.dtype, np.float32)
+        self.assertTrue(np.shares_memory(view.V, sut.V))
+
+        # Same as a characterized SUT of the slice of the parent
+        A, S = view.esc()[:2]
+        block = SupplyUseTable(V=self.V[3:, 3:], U=self.U[3:, 3:],
+                               F=self.F[:, 3:], C=C, dtype=np.float32)
+        A0, S0 = block.esc()[:2]
+        self.assertEqual(S.shape, (1, 3))
+        self.assertEqual(S.dtype, np.float32)
+        npt.assert_allclose(A, A0)
+        npt.assert_allclose(S, S0)
+
+    def test_region_view_sparse_and_scattered(self):
+        """ Scattered region selections and sparse tables are copied"""
+        sut = SupplyUseTable(V=np.kron(np.eye(3), self.V[:3, :3]),
+                             U=pysut.sp.csc_matrix(np.kron(np.eye(3),
+                                                           self.U[:3, :3])),
+                             regions=3)
+        view = sut.region_view([0, 2])
+        npt.assert_array_equal(view.V, np.kron(np.eye(2), self.V[:3, :3]))
+        npt.assert_array_equal(view.U.toarray(),
+                               np.kron(np.eye(2), self.U[:3, :3]))
+        self.assertFalse(np.shares_memory(view.V, sut.V))
+        self.assertRaises(ValueError, SupplyUseTable(V=self.V, regions=4)
+                          .region_view, 0)
+
+    def test_diagnostics(self):
+        """ Vectorized diagnostics agree for dense and sparse tables"""
+        V = self.V.copy()
+        V[2, 2] = 0.   # product 2 not produced, industry 2 empty
+        V[1, 1] = 0.
+        V[1, 0] = 4.   # product 1 only supplied by industry 0
+        U = self.U.copy()
+        U[3, 0] = -0.5
+        F = self.F.copy()
+        F[1, 1] = np.nan
+        dense = SupplyUseTable(V=V, U=U, Y=self.Y, F=F, FY=self.FY,
+                               TL=np.ones((6, 3)), regions=2)
+        sparse = SupplyUseTable(V=pysut.sp.csr_matrix(V),
+                                U=pysut.sp.csc_matrix(U), Y=self.Y,
+                                F=pysut.sp.csr_matrix(F), FY=self.FY,
+                                TL=np.ones((6, 3)), regions=2)
+
+        npt.assert_array_equal(sparse.supply_diag_check(),
+                               dense.supply_diag_check())
+        npt.assert_array_equal(dense.supply_diag_check()[:, :5].argmax(1),
+                               [0, 1, 4, 0, 0, 0])
+        self.assertEqual(sparse.dimension_check(), dense.dimension_check())
+        report = dense.dimension_check()[0]
+        self.assertTrue('Industry extensions are present with 2 rows'
+                        ' (stressors) and 6 columns (industries).<br>' in report)
+        self.assertTrue('Trade link is present with 6 rows (products) and 3'
+                        ' columns (regions).<br>' in report)
+        self.assertTrue('FD extensions are not present.<br>' in
+                        SupplyUseTable(V=V, U=U).dimension_check()[0])
+        npt.assert_allclose(sparse.market_balance(), dense.market_balance())
+
+        for sut in (dense, sparse):
+            diag = sut.diagnostics()
+            tables = diag['tables']
+            self.assertEqual(list(tables['table']),
+                             ['V', 'U', 'Y', 'F', 'FY', 'TL'])
+            npt.assert_array_equal(tables['consistent'],
+                                   [True] * 5 + [False])
+            npt.assert_array_equal(tables['nan'], [0, 0, 0, 1, 0, 0])
+            npt.assert_array_equal(tables['negative'], [0, 1, 0, 0, 0, 0])
+            npt.assert_array_equal(tables['nnz'][:2], [7, 8])
+
+            products = diag['products']
+            npt.assert_allclose(products['balance'], dense.market_balance())
+            npt.assert_array_equal(products['diag_status'],
+                                   [0, 1, 4, 0, 0, 0])
+            npt.assert_array_equal(products['producers'],
+                                   [2, 1, 0, 1, 2, 1])
+            npt.assert_array_equal(diag['industries']['products'],
+                                   [2, 1, 0, 2, 1, 1])
+            npt.assert_array_equal(diag['industries']['secondary'],
+                                   [1, 1, 0, 1, 0, 0])
+
+    def test_secondary_production(self):
+        """ Industries whose secondary production exceeds their primary one"""
+        V = self.V.copy()
+        V[0, 1] = 5.   # Mining of NO supplies more steel than iron
+        V[2, 2] = 0.   # Forestry of NO has no production at all
+        expected = [(1, 1, 4., 0, 5.)]
+        for V_ in (V, pysut.sp.csc_matrix(V)):
+            sut = SupplyUseTable(V=V_, U=self.U, regions=2)
+            sut.l_pro, sut.l_ind = self.l_pro, self.l_ind
+            strange = sut._check_secondary_prod(full_debug=True)
+            self.assertEqual(strange.tolist(), expected)
+
+        # Explicit E_bar: steel declared primary product of Mining of NO
+        E_bar = np.eye(6, dtype=int)
+        E_bar[:, 1] = [1, 0, 0, 0, 0, 0]
+        sut = SupplyUseTable(V=V, U=self.U, E_bar=E_bar, regions=2)
+        strange = sut._check_secondary_prod()
+        self.assertEqual(len(strange), 0)
+
+        V[3, 4] = 3.   # Mining of SE supplies more steel than iron
+        sut = SupplyUseTable(V=V, U=self.U, E_bar=E_bar, regions=2)
+        strange = sut._check_secondary_prod()
+        npt.assert_array_equal(strange['industry'], [4])
+        npt.assert_array_equal(strange['max_product'], [3])
+
+    def test_diagonal_operations(self):
+        """ Diagonal forms of V and diagonal clean-up, dense and sparse"""
+        V = self.V.copy()
+        V[2, 2] = 0.
+        V[0, 2] = 2.   # industry 2 only has secondary production
+        dense = SupplyUseTable(V=V.copy(), U=self.U.copy())
+        sparse = SupplyUseTable(V=pysut.sp.csr_matrix(V),
+                                U=pysut.sp.csc_matrix(self.U))
+
+        d = np.diag(V)
+        for sut in (dense, sparse):
+            npt.assert_array_equal(sut.return_diag_V(), np.diag(d))
+            npt.assert_array_equal(sut.return_diag_V(form='vector'), d)
+            dia = sut.return_diag_V(form='dia')
+            self.assertEqual(dia.format, 'dia')
+            npt.assert_array_equal(dia.toarray(), np.diag(d))
+            offdiag = sut.return_offdiag_V()
+            self.assertEqual(pysut.sp.issparse(offdiag),
+                             pysut.sp.issparse(sut.V))
+            npt.assert_array_equal(pysut.sp.csr_matrix(offdiag).toarray(),
+                                   V - np.diag(d))
+        self.assertRaises(ValueError, dense.return_diag_V, form='diag')
+
+        # In place: the diagonal is removed from V itself
+        V0 = dense.V
+        self.assertTrue(dense.return_offdiag_V(inplace=True) is V0)
+        npt.assert_array_equal(dense.V, V - np.diag(d))
+        sparse.return_offdiag_V(inplace=True)
+        self.assertEqual(sparse.V.format, 'csr')
+        self.assertEqual(sparse.V.nnz, 3)
+
+        # Clearing industries without main product, then filling diagonal
+        dense = SupplyUseTable(V=V.copy(), U=self.U.copy())
+        sparse = SupplyUseTable(V=pysut.sp.csr_matrix(V),
+                                U=pysut.sp.csc_matrix(self.U))
+        for sut in (dense, sparse):
+            sut.clear_non_diag_supply()
+            sut.add_ones_to_diagonal()
+        V1 = V.copy()
+        V1[:, 2] = 0.
+        V1[2, 2] = 1.
+        U1 = self.U.copy()
+        U1[:, 2] = 0.
+        npt.assert_array_equal(dense.V, V1)
+        npt.assert_array_equal(dense.U, U1)
+        npt.assert_array_equal(sparse.V.toarray(), V1)
+        npt.assert_array_equal(sparse.U.toarray(), U1)
+        self.assertEqual((sparse.V.format, sparse.U.format), ('csr', 'csc'))
+
+    def test_drop_products_industries(self):
+        """ Dropping products and industries shrinks tables and labels"""
+        kwargs = dict(V=self.V, U=self.U, Y=self.Y, F=self.F, FY=self.FY,
+                      regions=2, E_bar=np.eye(6, dtype=int), Xi=np.eye(6))
+        zeroed = SupplyUseTable(**dict(kwargs, V=self.V.copy(),
+                                       U=self.U.copy(), Y=self.Y.copy(),
+                                       F=self.F.copy()))
+        zeroed.remove_products_industries([2], [2])
+
+        sut = SupplyUseTable(**kwargs)
+        sut.l_pro, sut.l_ind = self.l_pro, self.l_ind
+        sut.remove_products_industries([2], [2], drop=True)
+        self.assertEqual(sut.V.shape, (5, 5))
+        self.assertEqual(sut.Y.shape, (5, 4))
+        self.assertEqual(sut.F.shape, (2, 5))
+        self.assertEqual(sut.Xi.shape, (5, 5))
+        self.assertEqual(sut.l_pro[:, 1].tolist(),
+                         ['steel', 'iron', 'steel', 'iron', 'wood'])
+        npt.assert_array_equal(sut.kept_products,
+                               [True, True, False, True, True, True])
+        self.assertEqual(sut.select_products(name='wood').tolist(), [4])
+
+        # Constructs of the smaller table, restored, equal the zeroed table
+        A, S = sut.esc()[:2]
+        A0, S0 = zeroed.esc()[:2]
+        npt.assert_allclose(sut.restore_removed(A, 'products', 'products'),
+                            A0)
+        npt.assert_allclose(sut.restore_removed(S, cols='products'), S0)
+
+        # A second drop composes with the first; sparse tables too
+        sut.V = pysut.sp.csr_matrix(sut.V)
+        sut.remove_products_industries([0], [0, 1], drop=True)
+        self.assertEqual(sut.V.shape, (4, 3))
+        self.assertTrue(pysut.sp.issparse(sut.V))
+        npt.assert_array_equal(np.flatnonzero(sut.kept_products), [1, 3, 4, 5])
+        npt.assert_array_equal(np.flatnonzero(sut.kept_industries), [3, 4, 5])
+
+    def test_transformation_chain(self):
+        """ Lazily composed steps equal the same steps applied one by one"""
+        TL = np.arange(12, dtype=float).reshape((6, 2))
+        PA = np.delete(np.eye(6), 5, axis=0)
+        PA[4, 5] = 1.  # merge wood of SE into iron of SE
+        PR = np.eye(5)[[1, 0, 2, 4, 3], :]
+
+        def new_sut():
+            sut = SupplyUseTable(V=self.V.copy(), U=self.U.copy(),
+                                 Y=self.Y.copy(), F=self.F.copy(),
+                                 FY=self.FY.copy(), TL=TL.copy(), regions=2)
+            return sut
+
+        # Products only: aggregate, re-sort
+        eager = new_sut()
+        eager.aggregate_products(PA)
+        eager.V, eager.U = eager.V[:, :5], eager.U[:, :5]
+        eager.F = eager.F[:, :5]
+        eager.rearrange_products(PR)
+        lazy = new_sut()
+        chain = lazy.transform().aggregate_products(PA)\
+            .remove_products_industries([], [5], drop=True)\
+            .rearrange_products(PR)
+        self.assertEqual(chain.steps, ['aggregate_products',
+                                       'remove_products_industries',
+                                       'rearrange_products'])
+        self.assertEqual(chain.operator('products').shape, (5, 6))
+        chain.apply()
+        for name in ('V', 'U', 'Y', 'F', 'FY', 'TL'):
+            npt.assert_allclose(getattr(lazy, name), getattr(eager, name))
+
+        # Selections by PA carry labels and mappings, aggregations do not
+        sut = new_sut()
+        sut.l_pro, sut.E_bar = self.l_pro, np.eye(6, dtype=int)
+        sut.aggregate_products(np.eye(6)[[1, 0, 2, 3, 4], :])
+        self.assertEqual(sut.l_pro[:, 1].tolist(),
+                         ['iron', 'steel', 'wood', 'steel', 'iron'])
+        npt.assert_array_equal(sut.E_bar, np.eye(6)[[1, 0, 2, 3, 4], :])
+        sut = new_sut()
+        sut.l_pro, sut.E_bar = self.l_pro, np.eye(6, dtype=int)
+        sut.aggregate_products(PA)
+        self.assertTrue(sut.l_pro is self.l_pro)
+        npt.assert_array_equal(sut.E_bar, np.eye(6))
+
+        # Regions: same as aggregate_regions_vectorised, region count updated
+        AV = np.array([1, 1])
+        lazy = new_sut()
+        lazy.transform().aggregate_regions(AV).apply()
+        for name, axis in (('V', None), ('U', None), ('Y', None),
+                           ('F', 1), ('FY', 1)):
+            npt.assert_allclose(getattr(lazy, name),
+                                pysut.aggregate_regions_vectorised(
+                                    getattr(self, name), AV, axis=axis))
+        npt.assert_allclose(lazy.TL, pysut.aggregate_regions_vectorised(
+            TL, AV, axis=0).sum(1, keepdims=True))
+        self.assertEqual(lazy.regions, 1)
+
+        # Selection and re-sorting carry labels and mappings; sparse tables
+        sut = new_sut()
+        sut.V = pysut.sp.csr_matrix(sut.V)
+        sut.l_pro, sut.l_ind = self.l_pro, self.l_ind
+        sut.E_bar = np.eye(6, dtype=int)
+        sut.transform().remove_products_industries([0], [0], drop=True)\
+            .rearrange_products(PR).apply()
+        self.assertTrue(pysut.sp.issparse(sut.V))
+        self.assertEqual(sut.l_pro[:, 1].tolist(),
+                         ['wood', 'iron', 'steel', 'wood', 'iron'])
+        npt.assert_array_equal(sut.E_bar, np.eye(5))
+        npt.assert_allclose(sut.V.toarray(),
+                            PR.dot(self.V[1:, 1:]).dot(PR.T))
+        self.assertRaises(ValueError, sut.transform().aggregate_regions,
+                          [1, 3])
+
+    def test_rearrange_permutation(self):
+        """ Re-sorting by index vector or permutation matrix, with labels"""
+        order = np.array([3, 4, 5, 0, 1, 2])  # SE first, then NO
+        PR = np.eye(6)[order, :]
+        expected = {'V': PR.dot(self.V).dot(PR.T),
+                    'U': PR.dot(self.U).dot(PR.T),
+                    'Y': PR.dot(self.Y), 'F': self.F.dot(PR.T)}
+        for perm in (order, PR):
+            sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, F=self.F,
+                                 FY=self.FY, regions=2,
+                                 E_bar=np.eye(6, dtype=int))
+            sut.l_pro, sut.l_ind = self.l_pro, self.l_ind
+            sut.rearrange_products(perm)
+            for name, X in expected.items():
+                npt.assert_array_equal(getattr(sut, name), X)
+            npt.assert_array_equal(sut.FY, self.FY)
+            self.assertEqual(sut.l_pro[0].tolist(), ['SE', 'steel'])
+            self.assertEqual(sut.l_ind[3].tolist(), ['NO', 'Steelworks'])
+            npt.assert_array_equal(sut.E_bar, np.eye(6))
+        # Original tables untouched (no in-place re-sorting)
+        self.assertEqual(self.l_pro[0].tolist(), ['NO', 'steel'])
+
+        # Sparse: indices are relabelled, the data array is reused
+        V = pysut.sp.coo_matrix(self.V)
+        sut = SupplyUseTable(V=V, U=pysut.sp.csr_matrix(self.U))
+        sut.rearrange_products(order)
+        self.assertEqual((sut.V.format, sut.U.format), ('coo', 'csr'))
+        self.assertTrue(sut.V.data is V.data)
+        npt.assert_array_equal(sut.V.toarray(), expected['V'])
+        npt.assert_array_equal(sut.U.toarray(), expected['U'])
+        self.assertRaises(ValueError, sut.rearrange_products, [0, 0, 1, 2, 3, 4])
+
+        # Position vectors as for build_Aggregation_Matrix: PV[m] is the new
+        # position of old product m
+        PV = np.array([1, 2, 0, 5, 3, 4])
+        PR = self.sut.build_Aggregation_Matrix(PV)
+        for perm in (PV, PR):
+            sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y, regions=2)
+            sut.rearrange_products(perm)
+            npt.assert_array_equal(sut.V, PR.dot(self.V).dot(PR.T))
+            npt.assert_array_equal(sut.Y, PR.dot(self.Y))
+        npt.assert_array_equal(np.diag(sut.V), [3., 5., 4., 2., 7., 6.])
+
+    def test_save_load(self):
+        """ Tables, sparse tables, labels and metadata saved as npz"""
+        import os
+        import shutil
+        import tempfile
+        directory = tempfile.mkdtemp()
+        try:
+            sut = self.sut
+            sut.U = pysut.sp.csc_matrix(self.U)
+            sut.E_bar = np.eye(6, dtype=int)
+            sut.year = 2011
+            sut.set_precision(np.float32)
+            path = os.path.join(directory, 'sut')
+            sut.save(path)
+            other = SupplyUseTable.load(path + '.npz')
+
+            self.assertEqual(other.regions, 2)
+            self.assertEqual(other.year, 2011)
+            self.assertEqual(other.name, 'SUT')
+            self.assertEqual(other.dtype, np.float32)
+            self.assertEqual(other.V.dtype, np.float32)
+            self.assertEqual(other.U.format, 'csc')
+            npt.assert_array_equal(other.U.toarray(), self.U)
+            npt.assert_array_equal(other.FY, self.FY)
+            npt.assert_array_equal(other.E_bar, np.eye(6))
+            self.assertTrue(other.Xi is None and other.TL is None)
+            self.assertEqual(other.l_pro.tolist(), self.l_pro.tolist())
+            self.assertEqual(other.pro_index.position(('SE', 'iron')), 4)
+
+            # Numeric, 1-d and mixed labels
+            sut.l_ind = np.array([[r, 2000 + i] for r in ('NO', 'SE')
+                                  for i in range(3)], dtype=object)
+            sut.l_ext = np.array(['CO2', 'CH4'], dtype=object)
+            sut.l_imp = [(1, 'GWP'), (2.5, None)]
+            sut.save(path, compressed=False)
+            other = SupplyUseTable.load(path + '.npz')
+            self.assertEqual(other.l_ind.dtype, object)
+            self.assertEqual(other.l_ind.tolist(), sut.l_ind.tolist())
+            self.assertTrue(type(other.l_ind[0, 1]) is int)
+            self.assertEqual(other.ind_index.position(('SE', 2001)), 4)
+            self.assertEqual(other.l_ext.tolist(), ['CO2', 'CH4'])
+            # Columns of mixed types (or with None) are stored as strings
+            self.assertEqual(other.l_imp.tolist(), [['1', 'GWP'],
+                                                    ['2.5', 'None']])
+
+            # Without extensions: empty label tables
+            sut = SupplyUseTable(V=self.V, U=self.U, Y=self.Y,
+                                 F=np.empty((0, 6)), regions=2)
+            sut.l_pro = self.l_pro
+            sut.l_ext = np.empty((0, 2), dtype=object)
+            sut.l_imp = np.empty(0, dtype=object)
+            sut.save(path)
+            other = SupplyUseTable.load(path + '.npz')
+            self.assertEqual(other.F.shape, (0, 6))
+            self.assertEqual(other.l_ext.shape, (0, 2))
+            self.assertEqual(other.l_imp.shape, (0,))
+            self.assertEqual(other.l_pro.tolist(), self.l_pro.tolist())
+            self.assertTrue(other.FY is None and other.l_ind is None)
+        finally:
+            shutil.rmtree(directory)
@@ -9,6 +9,8 @@ setup(
     author_email="stefan.pauliuk@ntnu.no",
     license=open('LICENSE.txt').read(),
     install_requires=["numpy","scipy"],
+    extras_require={"threads": ["threadpoolctl"]},
+    entry_points={"console_scripts": ["pysut = pysut.cli:main"]},
     long_description=open('README.md').read(),
     url="https://github.com/stefanpauliuk/pySUT",
     download_url = "https://github.com/stefanpauliuk/pySUT/tarball/1.1",